@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measures the framework overhead of running a single fuzz test case
+
+Runs fuzz test cases that send no requests (so only the cost of creating,
+running and reporting each case is measured), first through a
+``unittest.TestSuite`` as the runner used to, then through
+:func:`syntribos.tests.fuzz.base_fuzz.FuzzCase.run`, and prints the time
+per case for each. Usage::
+
+    $ python scripts/bench_executor.py [number of cases]
+"""
+from __future__ import print_function
+import sys
+import timeit
+import unittest
+
+from syntribos.result import IssueTestResult
+from syntribos.tests.fuzz import base_fuzz
+
+
+class NullFuzzTestCase(base_fuzz.BaseFuzzTestCase):
+    """Fuzz test that passes without sending a request."""
+
+    def setUp(self):
+        pass
+
+    def test_case(self):
+        pass
+
+
+def run_with_suite(cases, result):
+    for case in cases:
+        suite = unittest.TestSuite()
+        suite.addTest(case("run_test_case"))
+        suite.run(result)
+
+
+def run_with_executor(cases, result):
+    for case in cases:
+        case.run(result)
+
+
+def main():
+    num_cases = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    cases = [NullFuzzTestCase.extend_class(
+        "bench.template_NULL_{0}".format(i), "payload", "param",
+        {"request": None}) for i in range(num_cases)]
+    for name, run in (("TestSuite", run_with_suite),
+                      ("FuzzCase.run", run_with_executor)):
+        result = IssueTestResult(None, False, 0)
+        elapsed = min(timeit.repeat(
+            lambda: run(cases, result), repeat=3, number=1))
+        print("{0:<15}{1:>10.2f} us/case".format(
+            name, elapsed / num_cases * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""The ``bench`` sub-command
+
+Starts a :class:`syntribos.bench.server.BenchServer`, and runs syntribos
+against it in a child process, with the same arguments as ``bench`` was
+given, but pointed at the server and the benchmark templates. The child's
+CPU time is measured separately from the server's, and the requests it sent
+are counted by the server. As each fuzz test case sends one request, the CPU
+time per request is the overhead of each test case.
+
+Response times are read from a cassette recorded by a second, untimed run,
+so that the cost of recording it isn't counted as overhead.
+"""
+import json
+import math
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from oslo_config import cfg
+
+import syntribos
+from syntribos._i18n import _
+from syntribos.bench.server import BenchServer
+from syntribos.clients.http import cassette
+
+CONF = cfg.CONF
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
+
+
+def percentile(values, pct):
+    """Returns the `pct` percentile of `values` (nearest rank)
+
+    :param list values: Numbers, in any order
+    :param float pct: Percentile, between 0 and 100
+    :returns: The percentile, or None if `values` is empty
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = int(math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+def get_run_args(argv, server_url, work_dir, record=False):
+    """Returns the arguments of a ``run`` of the benchmark
+
+    :param list argv: Arguments ``bench`` was given
+    :param str server_url: URL of the benchmark server
+    :param str work_dir: Directory for the cassette and results
+    :param bool record: Whether to record a cassette of the run
+    :rtype: list
+    """
+    argv = list(argv)
+    # "bench" takes no arguments of its own, so it's the last one given
+    del argv[len(argv) - 1 - argv[::-1].index("bench")]
+    argv += [
+        "--syntribos-endpoint", server_url,
+        "--syntribos-templates", CONF.bench.templates or TEMPLATES_DIR]
+    if record:
+        argv += [
+            "--syntribos-cassette", os.path.join(work_dir, "bench.cassette"),
+            "--syntribos-cassette_mode", "record"]
+    return argv + [
+        "--outfile", os.path.join(work_dir, "results.json"), "run"]
+
+
+def _run_child(args, log_path):
+    """Runs syntribos with `args` in a child process, logging to `log_path`
+
+    :rtype: tuple
+    :returns: (exit status, output, wall time, CPU time)
+    """
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.time()
+    with open(log_path, "w") as log:
+        status = subprocess.call(
+            [sys.executable, "-m", "syntribos.runner"] + args,
+            stdout=log, stderr=subprocess.STDOUT)
+    wall_time = time.time() - start
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    with open(log_path) as log:
+        output = log.read()
+    cpu_time = (after.ru_utime - before.ru_utime +
+                after.ru_stime - before.ru_stime)
+    return status, output, wall_time, cpu_time
+
+
+def _count_issues(results_path):
+    try:
+        with open(results_path) as results_file:
+            severity = json.load(results_file)["stats"]["severity"]
+    except (IOError, ValueError, KeyError):
+        return None
+    return sum(severity.values())
+
+
+def run(argv):
+    """Runs the benchmark, and prints (and saves) its report
+
+    :param list argv: Arguments syntribos was given
+    :rtype: int
+    :returns: Exit status
+    """
+    server = BenchServer(
+        latency=CONF.bench.latency,
+        distribution=CONF.bench.latency_distribution,
+        body_size=CONF.bench.body_size, error_rate=CONF.bench.error_rate,
+        vulnerable=CONF.bench.vulnerable, long_input=CONF.bench.long_input,
+        slow_delay=CONF.bench.slow_delay, seed=CONF.bench.seed)
+    server.start()
+    work_dir = tempfile.mkdtemp(prefix="syntribos-bench-")
+    try:
+        log_path = os.path.join(work_dir, "run.log")
+        print(_("Benchmarking against %(url)s...") % {"url": server.url})
+        status, output, wall_time, cpu_time = _run_child(
+            get_run_args(argv, server.url, work_dir), log_path)
+        responses = dict(server.counts)
+        issues = _count_issues(os.path.join(work_dir, "results.json"))
+        if status == 0:
+            print(_("Recording response times..."))
+            status, output, _wall, _cpu = _run_child(
+                get_run_args(argv, server.url, work_dir, record=True),
+                log_path)
+        if status != 0:
+            print(output)
+            print(_("Benchmark run failed with status %d") % status)
+            return status
+
+        records = list(cassette.Cassette(
+            os.path.join(work_dir, "bench.cassette"),
+            cassette.REPLAY).iter_records())
+        latencies = [record["elapsed"] for record in records
+                     if "error" not in record]
+        requests = sum(responses.values())
+        report = {
+            "templates": CONF.bench.templates or TEMPLATES_DIR,
+            "requests": requests,
+            "request_errors": len(records) - len(latencies),
+            "issues": issues,
+            "wall_time": wall_time,
+            "requests_per_second": requests / wall_time,
+            "cpu_time": cpu_time,
+            "cpu_per_request": cpu_time / requests if requests else None,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p99": percentile(latencies, 99),
+            "server_responses": responses
+        }
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(report)
+    if CONF.outfile:
+        with open(CONF.outfile, "w") as outfile:
+            json.dump(report, outfile, indent=2, sort_keys=True)
+    return 0
+
+
+def print_report(report):
+    """Prints the report of a benchmark run."""
+    def millis(seconds):
+        return seconds * 1000.0 if seconds is not None else 0.0
+
+    print(syntribos.SEP)
+    print("Templates..........: {0}".format(report["templates"]))
+    print("Requests...........: {0} ({1} failed)".format(
+        report["requests"], report["request_errors"]))
+    print("Issues found.......: {0}".format(report["issues"]))
+    print("Wall time..........: {0:.3f}s".format(report["wall_time"]))
+    print("Requests/s.........: {0:.1f}".format(
+        report["requests_per_second"]))
+    print("CPU time...........: {0:.3f}s".format(report["cpu_time"]))
+    print("CPU per request....: {0:.3f}ms".format(
+        millis(report["cpu_per_request"])))
+    print("Latency p50/p99....: {0:.2f}ms / {1:.2f}ms".format(
+        millis(report["latency_p50"]), millis(report["latency_p99"])))
+    print("Server responses...: {0}".format(", ".join(
+        "{0}: {1}".format(kind, count) for kind, count in sorted(
+            report["server_responses"].items()))))
+    print(syntribos.SEP)
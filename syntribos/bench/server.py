@@ -0,0 +1,189 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A local stand-in for an API under test, for benchmarks
+
+:class:`BenchServer` answers any request with a JSON body after a random
+delay, and can be made to behave like a vulnerable API, so that the checks
+of the fuzz tests have something to find:
+
+* the path, query and body of each request are echoed back
+* requests containing a quote get a MySQL syntax error (SQL injection)
+* requests containing a NUL byte or a shell metacharacter get a Python
+  stacktrace
+* requests containing a long run of one character are answered slowly, as
+  if a regex backtracked over them (ReDoS)
+* requests longer than ``long_input`` bytes get a 500 error
+"""
+import collections
+import json
+import random
+import threading
+import time
+
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+from six.moves.urllib.parse import unquote_plus
+
+SQL_ERROR = ("You have an error in your SQL syntax; check the manual that "
+             "corresponds to your MySQL server version for the right syntax "
+             "to use near '{0}'")
+STACKTRACE = ("Traceback (most recent call last):\n"
+              "  File \"/srv/api/handlers.py\", line 42, in dispatch\n"
+              "    return self.run(args)\n"
+              "ValueError: invalid argument {0!r}")
+SHELL_CHARACTERS = ("\x00", ";", "|", "`", "$(")
+# Number of times a character must repeat in a row to be answered slowly
+SLOW_RUN_LENGTH = 16
+
+
+def _longest_run(text):
+    longest = run = 0
+    previous = None
+    for char in text:
+        run = run + 1 if char == previous else 1
+        previous = char
+        longest = max(longest, run)
+    return longest
+
+
+class BenchRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers requests as configured on its :class:`BenchServer`."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, so without this every
+    # response on a keep-alive connection waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        text = unquote_plus(self.path) + body.decode("utf-8", "replace")
+        status, _, content = self.server.respond(self.command, text)
+        out = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(out)
+
+    do_DELETE = do_GET = do_HEAD = do_PATCH = do_POST = do_PUT = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+class BenchServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Threaded HTTP server standing in for an API, see the module docstring
+
+    :param tuple address: (host, port) to listen on; port 0 picks a free one
+    :param float latency: Mean delay before each response, in seconds
+    :param str distribution: Distribution of delays: ``"constant"``,
+        ``"uniform"`` (between 0 and twice the mean) or ``"exponential"``
+    :param int body_size: Size to pad response bodies to, in bytes
+    :param float error_rate: Fraction of requests answered with a 503
+    :param bool vulnerable: Whether to echo, fail and slow down on fuzzed
+        input (see the module docstring)
+    :param int long_input: Length of requests answered with a 500
+    :param float slow_delay: Extra delay of slow (ReDoS) responses
+    :param int seed: Seed of the random delays and errors
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency=0.0,
+                 distribution="exponential", body_size=0, error_rate=0.0,
+                 vulnerable=True, long_input=2048, slow_delay=0.05, seed=0):
+        BaseHTTPServer.HTTPServer.__init__(self, address, BenchRequestHandler)
+        self.latency = latency
+        self.distribution = distribution
+        self.body_size = body_size
+        self.error_rate = error_rate
+        self.vulnerable = vulnerable
+        self.long_input = long_input
+        self.slow_delay = slow_delay
+        self.counts = collections.Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        """URL of the server, e.g. ``http://127.0.0.1:8080``"""
+        host, port = self.server_address[:2]
+        return "http://{0}:{1}".format(host, port)
+
+    def start(self):
+        """Starts serving requests from a daemon thread."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops serving requests and closes the server socket."""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+        self.server_close()
+
+    def _draw(self):
+        with self._lock:
+            error = self._random.random() < self.error_rate
+            if self.distribution == "constant" or not self.latency:
+                delay = self.latency
+            elif self.distribution == "uniform":
+                delay = self._random.uniform(0, 2 * self.latency)
+            else:
+                delay = self._random.expovariate(1.0 / self.latency)
+        return error, delay
+
+    def respond(self, method, text):
+        """Returns the status, kind and content of the response to a request
+
+        Also waits for the response's delay.
+
+        :param str method: HTTP method of the request
+        :param str text: Decoded path, query and body of the request
+        :rtype: tuple
+        """
+        error, delay = self._draw()
+        status, kind = 200, "ok"
+        content = {"method": method}
+        if error:
+            status, kind = 503, "error"
+        elif self.vulnerable:
+            content["echo"] = text
+            if len(text) > self.long_input:
+                status, kind = 500, "long_input"
+                del content["echo"]
+            elif "'" in text:
+                status, kind = 500, "sql_error"
+                content["error"] = SQL_ERROR.format(text[text.index("'"):])
+            elif any(char in text for char in SHELL_CHARACTERS):
+                status, kind = 500, "stacktrace"
+                content["error"] = STACKTRACE.format(text)
+            elif _longest_run(text) >= SLOW_RUN_LENGTH:
+                kind = "slow"
+                delay += self.slow_delay
+        if self.body_size:
+            padding = self.body_size - len(json.dumps(
+                dict(content, padding="")))
+            if padding > 0:
+                content["padding"] = "x" * padding
+        with self._lock:
+            self.counts[kind] += 1
+        if delay:
+            time.sleep(delay)
+        return status, kind, content
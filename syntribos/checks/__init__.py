@@ -18,3 +18,5 @@ from syntribos.checks.ssl import https_check as https_check
 from syntribos.checks.string import has_string as has_string
 from syntribos.checks.time import percentage_difference as time_diff
 from syntribos.checks.time import absolute_time as time_abs
+from syntribos.checks.time import ttfb_percentage_difference as ttfb_diff
+from syntribos.checks.time import ttfb_absolute_time as ttfb_abs
@@ -13,6 +13,7 @@
 # limitations under the License.
 from oslo_config import cfg
 
+from syntribos.clients.http.body import get_body_length
 import syntribos.signal
 
 CONF = cfg.CONF
@@ -35,8 +36,8 @@ def percentage_difference(test):
         "resp2": test.test_resp,
         "req1_len": len(test.init_req.body or ""),
         "req2_len": len(test.test_req.body or ""),
-        "resp1_len": len(test.init_resp.content or ""),
-        "resp2_len": len(test.test_resp.content or ""),
+        "resp1_len": get_body_length(test.init_resp),
+        "resp2_len": get_body_length(test.test_resp),
     }
     data["req_diff"] = data["req2_len"] - data["req1_len"]
     data["resp_diff"] = data["resp2_len"] - data["resp1_len"]
@@ -92,7 +93,7 @@ def max_body_length(test):
         "req": resp.request,
         "resp": resp,
         "req_len": len(resp.request.body or ""),
-        "resp_len": len(resp.content or ""),
+        "resp_len": get_body_length(resp),
     }
     text = ("Length:\n"
             "\tRequest length: {0}\n"
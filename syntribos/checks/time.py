@@ -18,28 +18,109 @@ import syntribos.signal
 CONF = cfg.CONF
 
 
-def percentage_difference(test):
+def get_timing_basis(response, basis=None):
+    """Returns the basis :func:`get_response_time` uses for `response`
+
+    This is `basis`, unless it's ``"ttfb"`` and `response` wasn't timed, in
+    which case it's ``"elapsed"``.
+
+    :param response: A response
+    :type response: :class:`requests.Response`
+    :param str basis: ``"elapsed"`` or ``"ttfb"``; defaults to
+        ``CONF.test.timing_basis``
+    :rtype: str
+    """
+    basis = basis or CONF.test.timing_basis
+    timing = getattr(response, "timing", None)
+    if basis == "ttfb" and (timing is None or timing.ttfb is None):
+        return "elapsed"
+    return basis
+
+
+def get_response_time(response, basis=None):
+    """Returns the response time of `response`, in seconds
+
+    With the ``"elapsed"`` basis, this is the time from sending the request
+    to receiving the response headers. With the ``"ttfb"`` basis, it's only
+    the time to first byte once the request was sent (see
+    :mod:`syntribos.clients.http.timing`), which leaves out the time spent
+    opening the connection and sending the request. Responses that weren't
+    timed fall back to the elapsed time (see :func:`get_timing_basis`).
+
+    :param response: A response
+    :type response: :class:`requests.Response`
+    :param str basis: ``"elapsed"`` or ``"ttfb"``; defaults to
+        ``CONF.test.timing_basis``
+    :rtype: float
+    """
+    if get_timing_basis(response, basis) == "ttfb":
+        return response.timing.seconds("ttfb")
+    return response.elapsed.total_seconds()
+
+
+def _get_common_basis(resp1, resp2, basis=None):
+    """Returns a basis both responses can be timed on, to compare them."""
+    return get_timing_basis(resp2, get_timing_basis(resp1, basis))
+
+
+def get_percent_diff(resp1_time, resp2_time):
+    """Returns how much longer (or shorter) `resp2_time` is than
+    `resp1_time`, in percent
+
+    :rtype: float
+    """
+    # CCNEILL: This is hacky. Exact match != 100% (due to +1)
+    return abs(float(resp2_time - resp1_time) / (resp1_time + 1)) * 100
+
+
+def is_time_diff_over(resp1, resp2, basis=None):
+    """Returns whether `resp2` took over ``time_diff_percent`` percent
+    longer than `resp1`, as :func:`percentage_difference` would signal
+
+    :param str basis: Response time to compare (see
+        :func:`get_response_time`)
+    :rtype: bool
+    """
+    basis = _get_common_basis(resp1, resp2, basis)
+    resp1_time = get_response_time(resp1, basis)
+    resp2_time = get_response_time(resp2, basis)
+    return resp1_time < resp2_time and (
+        get_percent_diff(resp1_time, resp2_time) >=
+        CONF.test.time_diff_percent)
+
+
+def percentage_difference(test, basis=None):
     """Validates time taken for two responses
 
-    Compares the elapsed time of a fuzzed response with a response to the
+    Compares the response time of a fuzzed response with a response to the
     baseline request. If the response takes longer than expected, returns
     a `TimePercentageDiffSignal`
 
+    :param str basis: Response time to compare (see
+        :func:`get_response_time`)
     :returns: SynSignal or None
     """
-    check_name = "TIME_DIFF"
+    return _percentage_difference(test, "TIME_DIFF", basis)
+
+
+def _percentage_difference(test, check_name, basis=None):
+    """Checks the time taken for two responses, as `check_name`
+
+    See :func:`percentage_difference`.
+    """
+    basis = _get_common_basis(test.init_resp, test.test_resp, basis)
     data = {
         "req1": test.init_req,
         "req2": test.test_req,
         "resp1": test.init_resp,
         "resp2": test.test_resp,
-        "resp1_time": test.init_resp.elapsed.total_seconds(),
-        "resp2_time": test.test_resp.elapsed.total_seconds()
+        "resp1_time": get_response_time(test.init_resp, basis),
+        "resp2_time": get_response_time(test.test_resp, basis),
+        "basis": basis
     }
     data["time_diff"] = data["resp2_time"] - data["resp1_time"]
-    # CCNEILL: This is hacky. Exact match != 100% (due to +1)
-    data["percent_diff"] = abs(
-        float(data["time_diff"]) / (data["resp1_time"] + 1)) * 100
+    data["percent_diff"] = get_percent_diff(
+        data["resp1_time"], data["resp2_time"])
     data["dir"] = "UNDER"
     if data["resp1_time"] < data["resp2_time"]:
         data["dir"] = "OVER"
@@ -49,14 +130,15 @@ def percentage_difference(test):
         return None
 
     text = ("Validate Time Differential:\n"
-            "\tResponse 1 elapsed time: {0}\n"
-            "\tResponse 2 elapsed time: {1}\n"
+            "\tResponse 1 {6} time: {0}\n"
+            "\tResponse 2 {6} time: {1}\n"
             "\tResponse difference: {2}\n"
             "\tPercent difference: {3}%\n"
             "\tDifference direction: {4}"
             "\tConfig percent: {5}\n").format(
                 data["resp1_time"], data["resp2_time"], data["time_diff"],
-                data["percent_diff"], data["dir"], CONF.test.time_diff_percent)
+                data["percent_diff"], data["dir"], CONF.test.time_diff_percent,
+                basis)
 
     slug = "TIME_DIFF_{dir}".format(dir=data["dir"])
 
@@ -64,23 +146,35 @@ def percentage_difference(test):
         text=text, slug=slug, strength=1.0, data=data, check_name=check_name)
 
 
-def absolute_time(test):
+def absolute_time(test, basis=None):
     """Checks response takes less than `config.max_time` seconds
 
+    :param str basis: Response time to check (see
+        :func:`get_response_time`)
     :returns: SynSignal or None
     """
-    check_name = "ABSOLUTE_TIME"
+    return _absolute_time(test, "ABSOLUTE_TIME", basis)
+
 
+def _absolute_time(test, check_name, basis=None):
+    """Checks the time taken for a response, as `check_name`
+
+    The baseline response is checked until a signal named `check_name` is
+    found for it, so each variant of the check needs its own name. See
+    :func:`absolute_time`.
+    """
     if not test.init_signals.ran_check(check_name):
         resp = test.init_resp
     else:
         resp = test.test_resp
+    basis = get_timing_basis(resp, basis)
 
     data = {
         "request": resp.request,
         "response": resp,
-        "elapsed": resp.elapsed.total_seconds(),
-        "max_time": CONF.test.max_time
+        "elapsed": get_response_time(resp, basis),
+        "max_time": CONF.test.max_time,
+        "basis": basis
     }
 
     if data["elapsed"] < data["max_time"]:
@@ -100,3 +194,21 @@ def absolute_time(test):
         tags=tags,
         data=data,
         check_name=check_name)
+
+
+def ttfb_percentage_difference(test):
+    """Like :func:`percentage_difference`, but only compares the time to
+    first byte of the responses, whatever ``timing_basis`` is set to
+
+    :returns: SynSignal or None
+    """
+    return _percentage_difference(test, "TTFB_TIME_DIFF", basis="ttfb")
+
+
+def ttfb_absolute_time(test):
+    """Like :func:`absolute_time`, but only checks the time to first byte
+    of the response, whatever ``timing_basis`` is set to
+
+    :returns: SynSignal or None
+    """
+    return _absolute_time(test, "TTFB_ABSOLUTE_TIME", basis="ttfb")
@@ -0,0 +1,539 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""asyncio transport for :class:`syntribos.clients.http.HTTPClient`
+
+Requests are sent over plain asyncio streams from a single event loop
+running in a background thread, so any number of them can be in flight at
+once without a thread each. Connections are kept alive, and up to
+``pool_maxsize`` (or the host's ``host_pool_maxsizes``) idle ones to each
+host are reused by later requests. Responses are returned as
+:class:`requests.Response` objects, and failures are raised as the same
+:mod:`requests.exceptions` the synchronous transport raises, so the rest of
+syntribos can't tell the two apart.
+
+This module requires Python 3.5 or newer.
+"""
+import asyncio
+import datetime
+import http.client
+import io
+import os
+import socket
+import ssl
+import threading
+from urllib.parse import urljoin
+from urllib.parse import urlsplit
+
+from oslo_config import cfg
+import requests
+from requests.cookies import extract_cookies_to_jar
+import requests.exceptions as rex
+from requests.models import DEFAULT_REDIRECT_LIMIT
+from requests.structures import CaseInsensitiveDict
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+from requests.utils import get_encoding_from_headers
+from requests.utils import requote_uri
+
+from syntribos.clients.http.body import BodyReader
+from syntribos.clients.http.body import CHUNK_SIZE
+from syntribos.clients.http import resolver
+from syntribos.clients.http.timing import clock
+from syntribos.clients.http.timing import Timing
+from syntribos.clients.http import tls
+from syntribos.clients.http.wire import ACCEPT_ENCODING
+from syntribos.clients.http.wire import CookieSource
+from syntribos.clients.http.wire import ContentDecoder
+from syntribos.utils import stats
+
+CONF = cfg.CONF
+
+_transport = None
+_transport_pid = None
+_transport_lock = threading.Lock()
+
+
+class AsyncTransport(object):
+    """Sends HTTP/1.1 requests from an event loop in a background thread
+
+    :func:`submit` and :func:`request` can be called from any thread;
+    :func:`send` is a coroutine to be run on :attr:`loop`.
+    """
+
+    def __init__(self):
+        # Only used to build requests the same way `requests.request` does
+        self.session = requests.Session()
+        self._ssl_contexts = {}
+        # Idle keep-alive connections, by origin, and those that were reused
+        self._idle = {}
+        self._reused = set()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="syntribos-asyncio")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, method, url, delay=0, **kwargs):
+        """Schedules a request on the event loop without waiting for it
+
+        Takes the same arguments as :func:`send`, plus the number of seconds
+        to wait before sending the request (e.g. for a rate limit).
+
+        :rtype: :class:`concurrent.futures.Future`
+        :returns: Future of a :class:`requests.Response`
+        """
+        coro = self.send(method, url, **kwargs)
+        if delay:
+            coro = self._send_later(delay, coro)
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def _send_later(self, delay, coro):
+        await asyncio.sleep(delay)
+        return await coro
+
+    def request(self, method, url, **kwargs):
+        """Sends a request on the event loop and waits for the response
+
+        Takes the same arguments as :func:`send`.
+
+        :rtype: :class:`requests.Response`
+        """
+        return self.submit(method, url, **kwargs).result()
+
+    async def send(self, method, url, headers=None, params=None, data=None,
+                   json=None, files=None, auth=None, cookies=None,
+                   verify=False, timeout=None, allow_redirects=True,
+                   stop_on=None):
+        """Sends a request, following redirects like `requests.request`
+
+        The response body is read in chunks, up to the size limit (see
+        :class:`syntribos.clients.http.body.BodyReader`).
+
+        :param str method: Request method
+        :param str url: URL to request
+        :param verify: Whether to verify TLS certificates, or the path of a
+            CA bundle to verify them with
+        :param timeout: Seconds to wait for the connection and for each read,
+            or a (connect, read) tuple
+        :param list stop_on: Strings to stop reading the body at
+        :rtype: :class:`requests.Response`
+        """
+        prepared = self.session.prepare_request(requests.Request(
+            method=method.upper(), url=url, headers=headers, files=files,
+            data=data or {}, json=json, params=params or {}, auth=auth,
+            cookies=cookies))
+        if prepared.headers.get("Accept-Encoding") == DEFAULT_ACCEPT_ENCODING:
+            prepared.headers["Accept-Encoding"] = ACCEPT_ENCODING
+
+        history = []
+        response = await self._send(prepared, timeout, verify, stop_on)
+        while allow_redirects and response.is_redirect:
+            if len(history) >= DEFAULT_REDIRECT_LIMIT:
+                raise rex.TooManyRedirects(
+                    "Exceeded {0} redirects.".format(DEFAULT_REDIRECT_LIMIT),
+                    response=response)
+            history.append(response)
+            prepared = self._redirect(prepared, response)
+            response = await self._send(prepared, timeout, verify, stop_on)
+        response.history = history
+        return response
+
+    def _redirect(self, prepared, response):
+        """Builds the request to send when following a redirect response."""
+        location = self.session.get_redirect_target(response)
+        redirect = prepared.copy()
+        redirect.url = requote_uri(urljoin(response.url, location))
+        self.session.rebuild_method(redirect, response)
+        if response.status_code not in (307, 308):
+            for header in ("Content-Length", "Content-Type",
+                           "Transfer-Encoding"):
+                redirect.headers.pop(header, None)
+            redirect.body = None
+        return redirect
+
+    def _get_ssl_context(self, verify):
+        """Returns a (cached) SSL context for the given `verify` value."""
+        if not verify:
+            # Shared with the other transports, to resume their sessions
+            return tls.get_context()
+        if verify not in self._ssl_contexts:
+            self._ssl_contexts[verify] = tls.create_context(verify)
+        return self._ssl_contexts[verify]
+
+    async def _send(self, prepared, timeout, verify, stop_on=None):
+        """Sends a single prepared request, over an idle connection if any
+
+        A request that fails before any response is read from a reused
+        connection (i.e. the server closed it while it was idle) is sent
+        again over a new connection.
+        """
+        if isinstance(timeout, tuple):
+            connect_timeout, read_timeout = timeout
+        else:
+            connect_timeout = read_timeout = timeout
+
+        parts, port = self._check_url(prepared)
+        ssl_context = None
+        if parts.scheme == "https":
+            ssl_context = self._get_ssl_context(verify)
+        origin = (parts.scheme, parts.hostname, port,
+                  verify if ssl_context else None)
+
+        while True:
+            timing = Timing()
+            conn = self._get_idle(origin)
+            if conn is None:
+                stats.increment("Connection pool misses ({0}:{1})".format(
+                    parts.hostname, port))
+                conn = await self._connect(
+                    prepared, parts, port, ssl_context, connect_timeout,
+                    timing)
+            reader, writer = conn
+            reused = writer in self._reused
+            try:
+                start = clock()
+                writer.write(self._serialize(prepared, parts))
+                await asyncio.wait_for(writer.drain(), read_timeout)
+                sent = clock()
+                status, reason, msg, will_close = await self._read_head(
+                    reader, read_timeout)
+                break
+            except (OSError, asyncio.IncompleteReadError,
+                    http.client.HTTPException) as exc:
+                self._discard(writer)
+                if reused and not isinstance(exc, ssl.SSLError):
+                    continue
+                self._raise(exc, prepared, parts, read_timeout)
+            except Exception as exc:
+                self._discard(writer)
+                self._raise(exc, prepared, parts, read_timeout)
+
+        end = clock()
+        try:
+            if ssl_context is not None and not reused:
+                tls.save_session(writer.get_extra_info("ssl_object"))
+            timing.send = sent - start
+            timing.ttfb = end - sent
+            headers = self._get_headers(msg)
+            body = BodyReader(stop_on)
+            complete, until_close = await self._read_body(
+                reader, prepared.method, status, headers, read_timeout, body,
+                ContentDecoder(headers.get("Content-Encoding", ""), prepared))
+            timing.transfer = clock() - end
+        except rex.RequestException:
+            self._discard(writer)
+            raise
+        except Exception as exc:
+            self._discard(writer)
+            self._raise(exc, prepared, parts, read_timeout)
+        # The rest of an unread body would be read by the next request
+        if will_close or until_close or not complete:
+            self._discard(writer)
+        else:
+            self._put_idle(origin, parts, reader, writer)
+        return self._build_response(
+            prepared, status, reason, msg, body, end - start, timing)
+
+    @staticmethod
+    def _raise(exc, prepared, parts, read_timeout):
+        """Raises `exc` as the exception requests would raise instead."""
+        if isinstance(exc, asyncio.TimeoutError):
+            raise rex.ReadTimeout(
+                "Read from {0} timed out. (read timeout={1})".format(
+                    parts.netloc, read_timeout), request=prepared)
+        elif isinstance(exc, ssl.SSLError):
+            raise rex.SSLError(exc, request=prepared)
+        elif isinstance(exc, (OSError, ValueError,
+                              asyncio.IncompleteReadError,
+                              asyncio.LimitOverrunError,
+                              http.client.HTTPException)):
+            raise rex.ConnectionError(exc, request=prepared)
+        raise exc
+
+    def _get_idle(self, origin):
+        """Returns an idle connection to `origin`, or None if there's none
+
+        :rtype: tuple
+        :returns: (:class:`asyncio.StreamReader`,
+            :class:`asyncio.StreamWriter`)
+        """
+        idle = self._idle.get(origin)
+        while idle:
+            reader, writer = idle.pop()
+            # Drop connections the server closed while they were idle
+            if reader.at_eof() or writer.is_closing():
+                self._discard(writer)
+                continue
+            stats.increment("Connection pool hits ({0}:{1})".format(
+                origin[1], origin[2]))
+            return reader, writer
+        return None
+
+    def _put_idle(self, origin, parts, reader, writer):
+        """Keeps a connection for later requests, if the pool isn't full."""
+        maxsize = int(CONF.syntribos.host_pool_maxsizes.get(
+            parts.hostname, CONF.syntribos.pool_maxsize))
+        idle = self._idle.setdefault(origin, [])
+        if len(idle) < maxsize:
+            self._reused.add(writer)
+            idle.append((reader, writer))
+        else:
+            self._discard(writer)
+
+    def _discard(self, writer):
+        self._reused.discard(writer)
+        writer.close()
+
+    def close(self):
+        """Closes every idle connection (from any thread)."""
+        async def close():
+            for idle in self._idle.values():
+                for reader, writer in idle:
+                    self._discard(writer)
+            self._idle.clear()
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result()
+
+    @staticmethod
+    def _check_url(prepared):
+        """Returns the split URL of `prepared`, and the port to connect to
+
+        Raises the same exceptions as requests for URLs it can't send.
+        """
+        parts = urlsplit(prepared.url)
+        if parts.scheme not in ("http", "https"):
+            raise rex.InvalidSchema(
+                "No connection adapters were found for '{0}'".format(
+                    prepared.url), request=prepared)
+        if not parts.hostname:
+            raise rex.InvalidURL(
+                "Invalid URL '{0}': No host supplied".format(prepared.url),
+                request=prepared)
+        return parts, parts.port or (443 if parts.scheme == "https" else 80)
+
+    async def _connect(self, prepared, parts, port, ssl_context, timeout,
+                       timing):
+        """Opens a connection for `prepared`, or raises what requests would
+
+        :rtype: tuple
+        :returns: (:class:`asyncio.StreamReader`,
+            :class:`asyncio.StreamWriter`)
+        """
+        try:
+            return await asyncio.wait_for(
+                self._open_connection(
+                    parts.hostname, port, ssl_context, timing), timeout)
+        except asyncio.TimeoutError:
+            raise rex.ConnectTimeout(
+                "Connection to {0} timed out. (connect timeout={1})".format(
+                    parts.netloc, timeout), request=prepared)
+        except ssl.SSLError as exc:
+            raise rex.SSLError(exc, request=prepared)
+        except OSError as exc:
+            raise rex.ConnectionError(exc, request=prepared)
+
+    @staticmethod
+    def _get_headers(msg):
+        """Returns the headers in `msg`, joining repeated ones
+
+        :param msg: Response headers
+        :type msg: :class:`http.client.HTTPMessage`
+        :rtype: :class:`requests.structures.CaseInsensitiveDict`
+        """
+        headers = CaseInsensitiveDict()
+        for name, value in msg.items():
+            if name in headers:
+                headers[name] = "{0}, {1}".format(headers[name], value)
+            else:
+                headers[name] = value
+        return headers
+
+    @staticmethod
+    def _build_response(prepared, status, reason, msg, body, elapsed,
+                        timing):
+        """Returns a :class:`requests.Response` to `prepared`
+
+        :param msg: Response headers
+        :type msg: :class:`http.client.HTTPMessage`
+        :param body: Reader the (decoded) response body was fed to
+        :type body: :class:`syntribos.clients.http.body.BodyReader`
+        :param int elapsed: Nanoseconds from sending the request to reading
+            the response headers
+        """
+        headers = AsyncTransport._get_headers(msg)
+        response = requests.Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = headers
+        body.finish(response)
+        response.encoding = get_encoding_from_headers(headers)
+        response.url = prepared.url
+        response.request = prepared
+        response.elapsed = datetime.timedelta(seconds=elapsed / 1e9)
+        response.timing = timing
+        extract_cookies_to_jar(response.cookies, prepared, CookieSource(msg))
+        return response
+
+    @staticmethod
+    async def _open_connection(host, port, ssl_context, timing):
+        """Opens a connection, timing name resolution and connection
+
+        The TLS handshake, if any, is timed as part of the connection.
+        """
+        loop = asyncio.get_event_loop()
+        start = clock()
+        addresses = await loop.run_in_executor(
+            None, resolver.getaddrinfo, host, port, 0, socket.SOCK_STREAM)
+        timing.dns = clock() - start
+        start = clock()
+        for index, address in enumerate(addresses):
+            try:
+                streams = await asyncio.open_connection(
+                    address[4][0], port, ssl=ssl_context,
+                    server_hostname=host if ssl_context else None)
+                break
+            except OSError:
+                if index == len(addresses) - 1:
+                    raise
+        timing.connect = clock() - start
+        return streams
+
+    @staticmethod
+    def _serialize(prepared, parts):
+        """Returns the bytes of the request line, headers and body."""
+        headers = CaseInsensitiveDict(prepared.headers)
+        if "Host" not in headers:
+            headers["Host"] = parts.netloc.rpartition("@")[2]
+
+        body = prepared.body
+        if hasattr(body, "read"):
+            body = body.read()
+        if isinstance(body, str):
+            # Same as http.client, which requests uses to send str bodies
+            body = body.encode("iso-8859-1")
+        if (body is not None and "Content-Length" not in headers and
+                "Transfer-Encoding" not in headers):
+            headers["Content-Length"] = str(len(body))
+
+        lines = ["{0} {1} HTTP/1.1".format(
+            prepared.method, prepared.path_url).encode("iso-8859-1")]
+        for name, value in headers.items():
+            if isinstance(value, str):
+                value = value.encode("iso-8859-1")
+            lines.append(name.encode("ascii") + b": " + value)
+        return b"\r\n".join(lines) + b"\r\n\r\n" + (body or b"")
+
+    @staticmethod
+    async def _read_head(reader, timeout):
+        """Reads the status line and headers, skipping any 1XX responses
+
+        :returns: (status code, reason, headers, whether the server closes
+            the connection after the response)
+        """
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if not line:
+                raise http.client.RemoteDisconnected(
+                    "Remote end closed connection without response")
+            fields = line.decode("iso-8859-1").rstrip("\r\n").split(None, 2)
+            if len(fields) < 2 or not fields[0].startswith("HTTP/"):
+                raise http.client.BadStatusLine(line)
+            version = fields[0]
+            status = int(fields[1])
+            reason = fields[2] if len(fields) > 2 else ""
+
+            header_lines = []
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                header_lines.append(line)
+            if not 100 <= status < 200:
+                break
+        msg = http.client.parse_headers(
+            io.BytesIO(b"".join(header_lines) + b"\r\n"))
+        connection = [token.strip().lower() for token in
+                      msg.get("Connection", "").split(",")]
+        if version == "HTTP/1.1":
+            will_close = "close" in connection
+        else:
+            will_close = "keep-alive" not in connection
+        return status, reason, msg, will_close
+
+    @staticmethod
+    async def _read_body(reader, method, status, headers, timeout, body,
+                         decoder):
+        """Reads the response body according to its framing, in chunks
+
+        Each chunk is decoded by `decoder` and fed to `body`, so at most
+        ``max_response_size`` bytes of it are kept.
+
+        :type body: :class:`syntribos.clients.http.body.BodyReader`
+        :type decoder: :class:`syntribos.clients.http.wire.ContentDecoder`
+        :returns: (whether the whole body was read, whether it was read up
+            to the end of the connection)
+        """
+        if method == "HEAD" or status in (204, 304):
+            return True, False
+        if "chunked" in headers.get("Transfer-Encoding", "").lower():
+            until_close = False
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout)
+                size = int(line.split(b";")[0].strip(), 16)
+                if size == 0:
+                    # Skip any trailers
+                    while line not in (b"\r\n", b"\n", b""):
+                        line = await asyncio.wait_for(
+                            reader.readline(), timeout)
+                    break
+                while size:
+                    data = await asyncio.wait_for(
+                        reader.readexactly(min(size, CHUNK_SIZE)), timeout)
+                    size -= len(data)
+                    if body.feed(decoder.decode(data)):
+                        return False, False
+                await asyncio.wait_for(reader.readexactly(2), timeout)
+        elif "Content-Length" in headers:
+            until_close = False
+            size = int(headers["Content-Length"])
+            while size:
+                data = await asyncio.wait_for(
+                    reader.readexactly(min(size, CHUNK_SIZE)), timeout)
+                size -= len(data)
+                if body.feed(decoder.decode(data)):
+                    return False, False
+        else:
+            until_close = True
+            while True:
+                data = await asyncio.wait_for(
+                    reader.read(CHUNK_SIZE), timeout)
+                if not data:
+                    break
+                if body.feed(decoder.decode(data)):
+                    return False, True
+        body.feed(decoder.flush())
+        return True, until_close
+
+
+def get_transport():
+    """Returns the :class:`AsyncTransport` for the current process
+
+    The transport's event loop thread doesn't survive a fork, so a process
+    forked after it was created (e.g. by ``--processes``) gets a new one.
+    """
+    global _transport, _transport_pid
+
+    with _transport_lock:
+        if _transport is None or _transport_pid != os.getpid():
+            _transport = AsyncTransport()
+            _transport_pid = os.getpid()
+    return _transport
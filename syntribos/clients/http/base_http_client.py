@@ -11,20 +11,88 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from concurrent import futures
 import logging
 
+from oslo_config import cfg
 import requests
+import requests.exceptions as rex
 from requests.packages import urllib3
+import six
 
+from syntribos._i18n import _
+from syntribos.clients.http.body import CHUNK_SIZE
+from syntribos.clients.http.body import read_body
+from syntribos.clients.http import cassette
 from syntribos.clients.http.debug_logger import log_http_transaction
+from syntribos.clients.http.debug_logger import log_http_transaction_async
+from syntribos.clients.http.limiter import get_bucket
+from syntribos.clients.http.session import get_session
+from syntribos.clients.http.timing import clock
 
 urllib3.disable_warnings()
+CONF = cfg.CONF
+
+
+def get_async_transport():
+    """Returns the asyncio (or HTTP/2) transport, which is only available on
+    Python 3
+
+    :rtype: :class:`syntribos.clients.http.async_client.AsyncTransport`
+    """
+    if six.PY2:
+        raise Exception(_("The {0} transport requires Python 3.5 or "
+                          "newer").format(CONF.syntribos.transport))
+    # Imported here since the modules aren't valid Python 2
+    if CONF.syntribos.transport == "http2":
+        from syntribos.clients.http import http2
+        return http2.get_transport()
+    from syntribos.clients.http import async_client
+    return async_client.get_transport()
+
+
+def chain_future(future, func):
+    """Returns a future of ``func(future.result())``
+
+    :param future: Future to chain from
+    :type future: :class:`concurrent.futures.Future`
+    :param func: Callable taking the result of `future`
+    :rtype: :class:`concurrent.futures.Future`
+    """
+    chained = futures.Future()
+    chained.set_running_or_notify_cancel()
+
+    def _done(future):
+        try:
+            chained.set_result(func(future.result()))
+        except Exception as exc:
+            chained.set_exception(exc)
+
+    future.add_done_callback(_done)
+    return chained
+
+
+def _recorded(send):
+    """Returns ``send()``, recording its result if recording a cassette"""
+    recorder = cassette.get_cassette()
+    if recorder is None:
+        return send()
+    try:
+        response = send()
+    except rex.RequestException as exc:
+        recorder.record_error(exc)
+        raise
+    recorder.record(response)
+    return response
 
 
 class HTTPClient(object):
 
     """Allows clients to inherit requests.request.
 
+    Requests are sent through a pooled, keep-alive session shared by every
+    client in the process (see :mod:`syntribos.clients.http.session`).
+
     @summary: Redefines request() so that keyword args are passed.
               The parameters are passed through a named dictionary
               instead of kwargs. Client methods can then take parameters
@@ -42,8 +110,143 @@ class HTTPClient(object):
 
     @log_http_transaction(log=LOG)
     def request(self, method, url, headers=None, params=None, data=None,
-                sanitize=False, requestslib_kwargs=None):
+                sanitize=False, requestslib_kwargs=None, stop_on=None):
+        """Sends a request, and keeps a bounded part of its response body
+
+        At most ``max_response_size`` bytes of the body are kept (see
+        :func:`syntribos.clients.http.body.read_body`), unless
+        `requestslib_kwargs` asks for the response to be streamed.
+
+        If replaying a cassette, the recorded response is returned instead
+        (see :mod:`syntribos.clients.http.cassette`).
 
+        :param list stop_on: Strings to stop reading the body at
+        """
+        method, url, requestslib_kwargs = self._build_request(
+            method, url, headers, params, data, requestslib_kwargs)
+        if cassette.is_replaying():
+            return cassette.get_cassette().replay(
+                self._prepare_request(method, url, requestslib_kwargs))
+        bucket = get_bucket(url)
+        if bucket is not None:
+            bucket.wait()
+        return _recorded(lambda: self._send(
+            method, url, requestslib_kwargs, stop_on))
+
+    def _send(self, method, url, requestslib_kwargs, stop_on):
+        """Sends a request through the configured transport."""
+        if CONF.syntribos.transport != "sync":
+            # The transport reads the body up to the limit itself
+            return get_async_transport().request(
+                method, url, stop_on=stop_on, **requestslib_kwargs)
+        if requestslib_kwargs.pop("stream", False):
+            return get_session().request(
+                method, url, stream=True, **requestslib_kwargs)
+        return self._read_body(get_session().request(
+            method, url, stream=True, **requestslib_kwargs), stop_on)
+
+    @staticmethod
+    def _read_body(response, stop_on):
+        """Reads the body of a streamed response, up to the size limit."""
+        start = clock()
+        if not read_body(response, response.iter_content(CHUNK_SIZE),
+                         stop_on):
+            # Don't leave the rest of the body for the next request to read
+            response.close()
+        if getattr(response, "timing", None) is not None:
+            response.timing.transfer = clock() - start
+        return response
+
+    @log_http_transaction_async(log=LOG)
+    def request_async(self, method, url, headers=None, params=None,
+                      data=None, sanitize=False, requestslib_kwargs=None,
+                      stop_on=None):
+        """Sends a request from the asyncio event loop without blocking
+
+        Takes the same arguments as :func:`request`, whatever the configured
+        transport, and returns a :class:`concurrent.futures.Future` of its
+        result.
+        """
+        method, url, requestslib_kwargs = self._build_request(
+            method, url, headers, params, data, requestslib_kwargs)
+        if cassette.is_replaying():
+            future = futures.Future()
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(cassette.get_cassette().replay(
+                    self._prepare_request(method, url, requestslib_kwargs)))
+            except Exception as exc:
+                future.set_exception(exc)
+            return future
+        bucket = get_bucket(url)
+        delay = bucket.reserve() if bucket is not None else 0
+        submitted = get_async_transport().submit(
+            method, url, delay=delay, stop_on=stop_on, **requestslib_kwargs)
+        if cassette.get_cassette() is None:
+            return submitted
+        recorded = futures.Future()
+        recorded.set_running_or_notify_cancel()
+
+        def _done(future):
+            try:
+                recorded.set_result(_recorded(future.result))
+            except Exception as exc:
+                recorded.set_exception(exc)
+
+        submitted.add_done_callback(_done)
+        return recorded
+
+    @log_http_transaction(log=LOG)
+    def request_wire(self, template, data, sanitize=False, timeout=None,
+                     stop_on=None):
+        """Sends a payload spliced into a wire template
+
+        Redirects are followed the way requests would follow them, without
+        sending the payload again.
+
+        :param template: Template of the request to send
+        :type template: :class:`syntribos.clients.http.wire.WireTemplate`
+        :param bytes data: Payload, encoded by
+            :func:`syntribos.clients.http.wire.WireTemplate.splice`
+        :param float timeout: Seconds to wait for the connection and for
+            each read
+        :param list stop_on: Strings to stop reading the body at
+        """
+        bucket = get_bucket(template.url)
+        if bucket is not None:
+            bucket.wait()
+        return _recorded(lambda: self._follow_redirects(
+            template.send(data, timeout=timeout, stop_on=stop_on),
+            timeout, stop_on))
+
+    def _follow_redirects(self, response, timeout, stop_on):
+        """Follows `response` through the session if it's a redirect."""
+        if not response.is_redirect:
+            return response
+        history = [response]
+        history.extend(get_session().resolve_redirects(
+            response, response.request, stream=True, timeout=timeout,
+            verify=False))
+        response = history.pop()
+        response.history = history
+        return self._read_body(response, stop_on)
+
+    @staticmethod
+    def _prepare_request(method, url, requestslib_kwargs):
+        """Returns the request the session would send, without sending it."""
+        return get_session().prepare_request(requests.Request(
+            method=method.upper(), url=url,
+            headers=requestslib_kwargs.get("headers"),
+            files=requestslib_kwargs.get("files"),
+            data=requestslib_kwargs.get("data") or {},
+            json=requestslib_kwargs.get("json"),
+            params=requestslib_kwargs.get("params") or {},
+            auth=requestslib_kwargs.get("auth"),
+            cookies=requestslib_kwargs.get("cookies")))
+
+    def _build_request(self, method, url, headers, params, data,
+                       requestslib_kwargs):
+        """Returns the method, URL and kwargs to pass to requests."""
         # set requestslib_kwargs to an empty dict if None
         requestslib_kwargs = requestslib_kwargs if (
             requestslib_kwargs is not None) else {}
@@ -51,7 +254,6 @@ class HTTPClient(object):
         # Set defaults
         params = params if params is not None else {}
         verify = False
-        sanitize = sanitize
 
         # If headers are provided by both, headers "wins" over default_headers
         headers = dict(self.default_headers, **(headers or {}))
@@ -78,6 +280,4 @@ class HTTPClient(object):
         requestslib_kwargs = dict(
             {'headers': headers, 'params': params, 'verify': verify,
              'data': data}, **requestslib_kwargs)
-
-        # Make the request
-        return requests.request(method, url, **requestslib_kwargs)
+        return method, url, requestslib_kwargs
@@ -0,0 +1,145 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Bounded reads of response bodies
+
+Response bodies are read in chunks, and at most ``max_response_size`` bytes
+of each one are kept, so an endpoint that answers a fuzzed request with a
+huge error dump can't exhaust memory. The rest of the body is still read, and
+counted, so its length is known and the connection can be reused. Reading
+may also stop as soon as a given string has been read, for callers whose
+checks can't be changed by the rest of the body.
+
+The length checks should use :func:`get_body_length` rather than the length
+of the (possibly truncated) content.
+"""
+from oslo_config import cfg
+import six
+
+from syntribos.utils import stats
+
+CONF = cfg.CONF
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BodyReader(object):
+    """Reads the body of a response chunk by chunk, up to the size limit
+
+    :func:`read_body` reads a body from an iterable of chunks; transports
+    that receive it piece by piece (e.g. from an event loop) feed each chunk
+    to a reader instead, then call :func:`finish`.
+
+    :param list stop_on: Strings to stop reading at, once any is read
+    """
+
+    def __init__(self, stop_on=None):
+        self.max_size = CONF.syntribos.max_response_size
+        self.keys = [
+            key.encode("utf-8") if isinstance(key, six.text_type) else key
+            for key in stop_on or () if key]
+        # Keep enough of the last chunk to find keys split across two chunks
+        self.overlap = max(len(key) for key in self.keys) - 1 if (
+            self.keys) else 0
+        self.parts = []
+        self.kept = 0
+        self.size = 0
+        self.tail = b""
+        self.stopped = False
+
+    def feed(self, chunk):
+        """Reads the next chunk of the body
+
+        :param bytes chunk: The next chunk of the (decoded) body
+        :rtype: bool
+        :returns: True if one of the `stop_on` strings has been read, so
+            the rest of the body needn't be
+        """
+        self.size += len(chunk)
+        if self.max_size and self.kept + len(chunk) > self.max_size:
+            # Past the limit, the body is only counted
+            if self.kept < self.max_size:
+                self.parts.append(chunk[:self.max_size - self.kept])
+                self.kept = self.max_size
+            return False
+        self.parts.append(chunk)
+        self.kept += len(chunk)
+        if self.keys:
+            window = self.tail + chunk
+            if any(key in window for key in self.keys):
+                self.stopped = True
+                return True
+            self.tail = window[-self.overlap:] if self.overlap else b""
+        return False
+
+    def finish(self, response):
+        """Sets the body read so far as the content of `response`
+
+        If not all of the body was kept, `response.body_truncated` is set.
+        `response.body_length` is the length of the whole body, unless
+        reading stopped at a `stop_on` string: it is then the length the
+        response declared, if any, or the number of bytes read.
+
+        :param response: The response to read the body of
+        :type response: :class:`requests.Response`
+        :rtype: bool
+        :returns: True if the whole body was read
+        """
+        response._content = b"".join(self.parts)
+        response._content_consumed = True
+        response.body_truncated = self.stopped or self.kept < self.size
+        response.body_length = self.size
+        if self.kept < self.size:
+            stats.increment("Response bodies truncated")
+        if self.stopped:
+            stats.increment("Response bodies read partially")
+            declared = response.headers.get("Content-Length", "")
+            # Content-Length is the size of the encoded body, if it was
+            # encoded
+            if declared.isdigit() and (
+                    "Content-Encoding" not in response.headers):
+                response.body_length = max(self.size, int(declared))
+        return not self.stopped
+
+
+def read_body(response, chunks, stop_on=None):
+    """Reads the body of `response` from `chunks`, up to the size limit
+
+    The bytes kept become the content of `response`; see
+    :class:`BodyReader`.
+
+    :param response: The response to read the body of
+    :type response: :class:`requests.Response`
+    :param chunks: Iterable of the (decoded) body, in chunks of bytes
+    :param list stop_on: Strings to stop reading at, once any is read
+    :rtype: bool
+    :returns: True if the whole body was read
+    """
+    reader = BodyReader(stop_on)
+    for chunk in chunks:
+        if reader.feed(chunk):
+            break
+    return reader.finish(response)
+
+
+def get_body_length(response):
+    """Returns the length of the body of `response`, even if truncated
+
+    :param response: A response, read by :func:`read_body` or not
+    :type response: :class:`requests.Response`
+    :rtype: int
+    """
+    length = getattr(response, "body_length", None)
+    if length is None:
+        return len(response.content or "")
+    return length
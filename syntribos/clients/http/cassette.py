@@ -0,0 +1,270 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Records responses to a cassette file, and replays them from it
+
+When recording, the response to every request sent by
+:class:`syntribos.clients.http.HTTPClient` (or the exception raised instead)
+is appended to the cassette, with its response time and timing breakdown.
+When replaying, requests aren't sent at all: the recorded response to the
+same request is returned, so a scan can be evaluated again (e.g. with other
+check settings) in seconds and without network access.
+
+Each record is a header line, holding the key of its request and the length
+of the record, followed by the zlib compressed JSON record. Every record is
+written with a single ``write`` to a file opened with ``O_APPEND``, so several
+processes can record to the same cassette. A replaying cassette only reads
+the header lines up front, to index the records by request, and reads each
+record when it's replayed.
+"""
+import base64
+import datetime
+import hashlib
+import json
+import os
+import threading
+import zlib
+
+from oslo_config import cfg
+import requests
+import requests.exceptions as rex
+from requests.structures import CaseInsensitiveDict
+import six
+
+from syntribos.clients.http.timing import Timing
+from syntribos.utils import stats
+
+CONF = cfg.CONF
+
+RECORD = "record"
+REPLAY = "replay"
+
+# Headers that differ between transports, and so aren't part of request keys
+IGNORED_HEADERS = ("accept-encoding", "connection", "content-length", "host")
+
+_cassette = None
+_cassette_pid = None
+_cassette_lock = threading.Lock()
+
+
+class CassetteMiss(rex.RequestException):
+    """No response to the request was recorded in the cassette."""
+
+
+def get_request_key(request):
+    """Returns the key of a request in a cassette
+
+    Requests with the same method, URL, headers (except
+    :data:`IGNORED_HEADERS`) and body have the same key.
+
+    :param request: A prepared request
+    :type request: :class:`requests.PreparedRequest`
+    :rtype: str
+    """
+    body = request.body
+    if body is None or hasattr(body, "read"):
+        body = b""
+    elif isinstance(body, six.text_type):
+        body = body.encode("utf-8")
+    headers = sorted(
+        "{0}: {1}".format(name.lower(), value)
+        for name, value in request.headers.items()
+        if name.lower() not in IGNORED_HEADERS)
+    digest = hashlib.sha1()
+    for part in [request.method, request.url] + headers:
+        digest.update(part.encode("utf-8") + b"\n")
+    digest.update(b"\n" + body)
+    return digest.hexdigest()
+
+
+class Cassette(object):
+    """A cassette file, recorded to or replayed from
+
+    :ivar str path: Path of the cassette file
+    :ivar str mode: :data:`RECORD` or :data:`REPLAY`
+    """
+
+    def __init__(self, path, mode):
+        self.path = path
+        self.mode = mode
+        self._index = {}
+        self._replayed = {}
+        self._file = None
+        self._fd = None
+        self._lock = threading.Lock()
+        if mode == REPLAY:
+            self._load_index()
+
+    def _load_index(self):
+        self._file = open(self.path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        while True:
+            line = self._file.readline()
+            try:
+                key, length = line.decode("ascii").split()
+                length = int(length)
+            except ValueError:
+                break
+            offset = self._file.tell()
+            # The last record may have been cut short by a crash
+            if offset + length > size:
+                break
+            self._index.setdefault(key, []).append((offset, length))
+            self._file.seek(length, os.SEEK_CUR)
+
+    def _append(self, request, record):
+        blob = zlib.compress(json.dumps(record).encode("utf-8"))
+        header = "{0} {1}\n".format(get_request_key(request), len(blob))
+        with self._lock:
+            if self._fd is None:
+                self._fd = os.open(
+                    self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            os.write(self._fd, header.encode("ascii") + blob)
+        stats.increment("Cassette records written")
+
+    def record(self, response):
+        """Records a response, and the time it took
+
+        :param response: A response to a request
+        :type response: :class:`requests.Response`
+        """
+        # Replays are looked up by the request sent before any redirects
+        first = response.history[0] if response.history else response
+        timing = getattr(response, "timing", None)
+        self._append(first.request, {
+            "status": response.status_code,
+            "reason": response.reason,
+            "url": response.url,
+            "headers": list(response.headers.items()),
+            "encoding": response.encoding,
+            "content": base64.b64encode(
+                response.content or b"").decode("ascii"),
+            "elapsed": response.elapsed.total_seconds(),
+            "timing": timing.to_dict() if timing is not None else None,
+            "body_length": getattr(response, "body_length", None),
+            "body_truncated": getattr(response, "body_truncated", False)
+        })
+
+    def record_error(self, exc):
+        """Records an exception raised instead of returning a response
+
+        :param exc: The exception raised by requests (or a transport)
+        :type exc: :class:`requests.exceptions.RequestException`
+        """
+        if exc.request is not None:
+            self._append(exc.request, {
+                "error": type(exc).__name__,
+                "message": str(exc)
+            })
+
+    def iter_records(self):
+        """Yields every record in a replaying cassette, as a dict
+
+        Records of responses hold their ``status`` and ``elapsed`` time
+        (among others), records of exceptions their ``error``.
+        """
+        offsets = sorted(offset for records in self._index.values()
+                         for offset in records)
+        for offset, length in offsets:
+            with self._lock:
+                self._file.seek(offset)
+                blob = self._file.read(length)
+            yield json.loads(zlib.decompress(blob).decode("utf-8"))
+
+    def replay(self, request):
+        """Returns the response recorded for `request`
+
+        A request sent several times gets its recorded responses in the
+        order they were recorded, then the last one again.
+
+        :param request: A prepared request
+        :type request: :class:`requests.PreparedRequest`
+        :rtype: :class:`requests.Response`
+        :raises CassetteMiss: if no response to `request` was recorded
+        """
+        key = get_request_key(request)
+        with self._lock:
+            records = self._index.get(key)
+            if not records:
+                stats.increment("Cassette misses")
+                raise CassetteMiss(
+                    "No response to {0} {1} in cassette {2}".format(
+                        request.method, request.url, self.path),
+                    request=request)
+            count = self._replayed.get(key, 0)
+            self._replayed[key] = count + 1
+            offset, length = records[min(count, len(records) - 1)]
+            self._file.seek(offset)
+            blob = self._file.read(length)
+        record = json.loads(zlib.decompress(blob).decode("utf-8"))
+        stats.increment("Cassette responses replayed")
+
+        if "error" in record:
+            exc_class = getattr(rex, record["error"], rex.RequestException)
+            raise exc_class(record["message"], request=request)
+        response = requests.Response()
+        response.status_code = record["status"]
+        response.reason = record["reason"]
+        response.url = record["url"]
+        response.headers = CaseInsensitiveDict(record["headers"])
+        response.encoding = record["encoding"]
+        response._content = base64.b64decode(record["content"])
+        response._content_consumed = True
+        response.elapsed = datetime.timedelta(seconds=record["elapsed"])
+        if record.get("timing") is not None:
+            response.timing = Timing(**record["timing"])
+        response.request = request
+        if record["body_length"] is not None:
+            response.body_length = record["body_length"]
+            response.body_truncated = record["body_truncated"]
+        return response
+
+
+def start():
+    """Starts a new, empty cassette, if ``cassette`` is set for recording
+
+    Should be called once per run, before any process records to it.
+    """
+    if CONF.syntribos.cassette and CONF.syntribos.cassette_mode == RECORD:
+        open(CONF.syntribos.cassette, "wb").close()
+
+
+def is_replaying():
+    """Returns True if requests are replayed from a cassette, not sent
+
+    :rtype: bool
+    """
+    return bool(CONF.syntribos.cassette and
+                CONF.syntribos.cassette_mode == REPLAY)
+
+
+def get_cassette():
+    """Returns the :class:`Cassette` for the current process, if any
+
+    Each process opens the cassette for itself, as the offset of a file
+    shared over a fork would be shared too.
+
+    :returns: The cassette, or None if ``cassette`` isn't set
+    """
+    global _cassette, _cassette_pid
+
+    path = CONF.syntribos.cassette
+    if not path:
+        return None
+    with _cassette_lock:
+        if (_cassette is None or _cassette_pid != os.getpid() or
+                _cassette.path != path or
+                _cassette.mode != CONF.syntribos.cassette_mode):
+            _cassette = Cassette(path, CONF.syntribos.cassette_mode)
+            _cassette_pid = os.getpid()
+    return _cassette
@@ -11,8 +11,13 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from concurrent import futures
+
 import syntribos.checks.http as http_checks
+from syntribos.clients.http.base_http_client import chain_future
 from syntribos.clients.http.base_http_client import HTTPClient
+from syntribos.clients.http.limiter import get_limiter
+from syntribos.utils import stats
 
 
 class SynHTTPClient(HTTPClient):
@@ -21,11 +26,12 @@ class SynHTTPClient(HTTPClient):
 
     It aliases `send_request` to `request` so logging/exception handling is
     done in one place, for all requests. Also checks for bad HTTP status codes
-    and adds a signal if one is found.
+    and adds a signal if one is found. Requests to each host are limited by
+    a :class:`syntribos.clients.http.limiter.AdaptiveLimiter`, if enabled.
     """
 
     def request(self, method, url, headers=None, params=None, data=None,
-                sanitize=False, requestslib_kwargs=None):
+                sanitize=False, requestslib_kwargs=None, stop_on=None):
         """Sends a request (passes to `requests.request`)
 
         :param str method: Request method
@@ -34,25 +40,97 @@ class SynHTTPClient(HTTPClient):
         :param dict params: Dictionary of params in name:value format
         :param dict data: Data to send as part of request body
         :param dict requestslib_kwargs: Keyword arguments to pass to requests
+        :param list stop_on: Strings to stop reading the response body at
         :returns: tuple of (response, signals)
         """
+        limiter = get_limiter(url)
+        if limiter is not None:
+            limiter.acquire()
+        response = signals = None
+        try:
+            response, signals = self._check_response(
+                super(SynHTTPClient, self).request(
+                    method, url, headers=headers, params=params, data=data,
+                    sanitize=sanitize,
+                    requestslib_kwargs=self._set_timeout(requestslib_kwargs),
+                    stop_on=stop_on))
+        finally:
+            if limiter is not None:
+                limiter.release(response, signals)
+
+        return (response, signals)
+
+    def request_async(self, method, url, headers=None, params=None,
+                      data=None, sanitize=False, requestslib_kwargs=None,
+                      stop_on=None):
+        """Sends a request from the asyncio event loop without blocking
+
+        Takes the same arguments as :func:`request`.
+
+        :returns: :class:`concurrent.futures.Future` of a tuple of
+            (response, signals)
+        """
+        requestslib_kwargs = self._set_timeout(requestslib_kwargs)
+        limiter = get_limiter(url)
+        if limiter is None:
+            future = super(SynHTTPClient, self).request_async(
+                method, url, headers=headers, params=params, data=data,
+                sanitize=sanitize, requestslib_kwargs=requestslib_kwargs,
+                stop_on=stop_on)
+            return chain_future(future, self._check_response)
+
+        outcome = futures.Future()
+        outcome.set_running_or_notify_cancel()
+
+        def _send():
+            try:
+                future = super(SynHTTPClient, self).request_async(
+                    method, url, headers=headers, params=params, data=data,
+                    sanitize=sanitize, requestslib_kwargs=requestslib_kwargs,
+                    stop_on=stop_on)
+            except Exception as exc:
+                limiter.release()
+                outcome.set_exception(exc)
+            else:
+                future.add_done_callback(_done)
+
+        def _done(future):
+            try:
+                response, signals = self._check_response(future.result())
+            except Exception as exc:
+                limiter.release()
+                outcome.set_exception(exc)
+            else:
+                limiter.release(response, signals)
+                outcome.set_result((response, signals))
+
+        limiter.submit(_send)
+        return outcome
+
+    @staticmethod
+    def _set_timeout(requestslib_kwargs):
+        """Sets a default timeout of 10 seconds in `requestslib_kwargs`."""
         if not requestslib_kwargs:
             requestslib_kwargs = {"timeout": 10}
         elif not requestslib_kwargs.get("timeout", None):
             requestslib_kwargs["timeout"] = 10
+        return requestslib_kwargs
 
-        response, signals = super(SynHTTPClient, self).request(
-            method, url, headers=headers, params=params, data=data,
-            sanitize=sanitize,
-            requestslib_kwargs=requestslib_kwargs)
+    @staticmethod
+    def _check_response(transaction):
+        """Adds signals for the status code and content type of a response
 
+        :param tuple transaction: tuple of (response, signals)
+        :returns: tuple of (response, signals)
+        """
+        response, signals = transaction
         if response is not None:
             signals.register(http_checks.check_status_code(response))
             signals.register(http_checks.check_content_type(response))
 
         return (response, signals)
 
-    def send_request(self, request_obj):
+    def send_request(self, request_obj, stop_on=None):
         """This sends a request based on a RequestOjbect.
 
         RequestObjects are generated by a parser (e.g.
@@ -61,11 +139,64 @@ class SynHTTPClient(HTTPClient):
 
         :param request_obj: A RequestObject generated by a parser
         :type request_obj: :class:`syntribos.clients.http.parser.RequestObject`
+        :param list stop_on: Strings to stop reading the response body at
         :returns: tuple of (response, signals)
         """
         response, signals = self.request(
             request_obj.method, request_obj.url,
             headers=request_obj.headers, params=request_obj.params,
-            data=request_obj.data, sanitize=request_obj.sanitize)
+            data=request_obj.data, sanitize=request_obj.sanitize,
+            stop_on=stop_on)
 
         return (response, signals)
+
+    def send_wire_request(self, template, payload, request_obj,
+                          stop_on=None):
+        """Sends a fuzzed request by splicing its payload into a template
+
+        The request is sent with :func:`send_request` instead if `payload`
+        can't be spliced into `template` exactly as requests would encode
+        it. Redirects are followed from the response to the spliced request.
+
+        :param template: Template of the fuzzed request
+        :type template: :class:`syntribos.clients.http.wire.WireTemplate`
+        :param str payload: Payload to splice into the template
+        :param request_obj: The fuzzed request, as sent by `template`
+        :type request_obj: :class:`syntribos.clients.http.parser.RequestObject`
+        :param list stop_on: Strings to stop reading the response body at
+        :returns: tuple of (response, signals)
+        """
+        data = template.splice(payload)
+        if data is None:
+            stats.increment("Wire template fallbacks")
+            return self.send_request(request_obj, stop_on)
+
+        limiter = get_limiter(template.url)
+        if limiter is not None:
+            limiter.acquire()
+        response = signals = None
+        try:
+            response, signals = self._check_response(self.request_wire(
+                template, data, sanitize=request_obj.sanitize, timeout=10,
+                stop_on=stop_on))
+        finally:
+            if limiter is not None:
+                limiter.release(response, signals)
+
+        stats.increment("Requests sent from wire templates")
+        return (response, signals)
+
+    def send_request_async(self, request_obj):
+        """Sends a request based on a RequestObject without blocking
+
+        See :func:`send_request` and :func:`request_async`.
+
+        :param request_obj: A RequestObject generated by a parser
+        :type request_obj: :class:`syntribos.clients.http.parser.RequestObject`
+        :returns: :class:`concurrent.futures.Future` of a tuple of
+            (response, signals)
+        """
+        return self.request_async(
+            request_obj.method, request_obj.url,
+            headers=request_obj.headers, params=request_obj.params,
+            data=request_obj.data, sanitize=request_obj.sanitize)
@@ -15,40 +15,180 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from concurrent import futures
 from copy import deepcopy
 import logging
-from time import time
 
 import requests
 import six
 
 import syntribos.checks.http as http_checks
 from syntribos._i18n import _, _LC, _LI   # noqa
+from syntribos.clients.http.timing import clock
 import syntribos.signal
 from syntribos.utils import string_utils
 
 
-def log_http_transaction(log, level=logging.DEBUG):
-    """Decorator used for logging requests/response in clients.
+def _safe_decode(text, incoming='utf-8', errors='replace'):
+    """Decodes incoming text/bytes using `incoming` if not already unicode.
 
-    Takes a python Logger object and an optional logging level.
+    :param incoming: Text's current encoding
+    :param errors: Errors handling policy. See here for valid
+    values http://docs.python.org/2/library/codecs.html
+
+    :returns: text or a unicode `incoming` encoded
+    representation of it.
     """
 
-    def _safe_decode(text, incoming='utf-8', errors='replace'):
-        """Decodes incoming text/bytes using `incoming` if not already unicode.
+    if isinstance(text, six.text_type):
+        return text
 
-        :param incoming: Text's current encoding
-        :param errors: Errors handling policy. See here for valid
-        values http://docs.python.org/2/library/codecs.html
+    return text.decode(incoming, errors)
 
-        :returns: text or a unicode `incoming` encoded
-        representation of it.
-        """
 
-        if isinstance(text, six.text_type):
-            return text
+def _log_call(log, args, kwargs):
+    """Logs the args and kwargs sent to the request() method.
+
+    :returns: copy of `kwargs`, sanitized if requested
+    """
+    kwargs_copy = deepcopy(kwargs)
+    if kwargs_copy.get("sanitize"):
+        kwargs_copy = string_utils.sanitize_secrets(kwargs_copy)
+    logline = '{0} {1}'.format(args, string_utils.compress(
+        kwargs_copy))
+
+    try:
+        log.debug(_safe_decode(logline))
+    except Exception as exception:
+        # Ignore all exceptions that happen in logging, then log them
+        log.info(
+            _LI(
+                'Exception occurred while logging signature of calling'
+                'method in http client'))
+        log.exception(exception)
+    return kwargs_copy
+
+
+def _get_response(log, level, send, kwargs_copy, start=None):
+    """Gets a response from `send`, then logs the request and response.
+
+    :param send: Callable that returns a requests response
+    :param dict kwargs_copy: Logged copy of the request() kwargs
+    :param int start: :func:`syntribos.clients.http.timing.clock` time
+        the request was sent, if before `send` is called
+    :returns: tuple of (response, signals)
+    """
+    response = None
+    no_resp_time = None
+    signals = syntribos.signal.SignalHolder()
+    try:
+        start = start or clock()
+        response = send()
+    except requests.exceptions.RequestException as exc:
+        signals.register(http_checks.check_fail(exc))
+        log.log(level, _("A call to request() failed."))
+        log.exception(exc)
+        log.log(level, "=" * 80)
+    except Exception as exc:
+        log.critical(_LC(
+            'Call to Requests failed due to exception'))
+        log.exception(exc)
+        signals.register(syntribos.signal.from_generic_exception(exc))
+        raise exc
+
+    if len(signals) > 0 and response is None:
+        no_resp_time = (clock() - start) / 1e9
+        log.log(level,
+                _(
+                    'Request failed, elapsed time....: %.6f sec.\n'
+                ), no_resp_time)
+        return (response, signals)
+
+    _log_transaction(log, level, response, kwargs_copy)
+    return (response, signals)
+
+
+def _log_transaction(log, level, response, kwargs_copy):
+    """Logs the request sent and the response received."""
+    # requests lib 1.0.0 renamed body to data in the request object
+    request_body = ''
+    if 'body' in dir(response.request):
+        request_body = response.request.body
+    elif 'data' in dir(response.request):
+        request_body = response.request.data
+    else:
+        log.info(
+            _LI(
+                "Unable to log request body, neither a 'data' nor a "
+                "'body' object could be found"))
+
+    # requests lib 1.0.4 removed params from response.request
+    request_params = ''
+    request_url = response.request.url
+    if 'params' in dir(response.request):
+        request_params = response.request.params
+    elif '?' in request_url:
+        request_url, request_params = request_url.split('?')
+
+    req_body_len = 0
+    req_header_len = 0
+    if response.request.headers:
+        req_header_len = len(response.request.headers)
+        request_headers = response.request.headers
+    if response.request.body:
+        req_body_len = len(response.request.body)
+    response_content = response.content
+    if kwargs_copy.get("sanitize"):
+        response_content = string_utils.sanitize_secrets(
+            response_content)
+        request_params = string_utils.sanitize_secrets(request_params)
+        request_headers = string_utils.sanitize_secrets(
+            request_headers)
+        request_body = string_utils.sanitize_secrets(request_body)
+    logline = ''.join([
+        '\n{0}\nREQUEST SENT\n{0}\n'.format('-' * 12),
+        'request method.......: {0}\n'.format(response.request.method),
+        'request url..........: {0}\n'.format(string_utils.compress(
+            request_url)),
+        'request params.......: {0}\n'.format(string_utils.compress
+                                              (request_params)),
+        'request headers size.: {0}\n'.format(req_header_len),
+        'request headers......: {0}\n'.format(string_utils.compress(
+            request_headers)),
+        'request body size....: {0}\n'.format(req_body_len),
+        'request body.........: {0}\n'.format(string_utils.compress
+                                              (request_body))])
+
+    try:
+        log.log(level, _safe_decode(logline))
+    except Exception as exception:
+        # Ignore all exceptions that happen in logging, then log them
+        log.log(level, '\n{0}\nREQUEST INFO\n{0}\n'.format('-' * 12))
+        log.exception(exception)
+
+    logline = ''.join([
+        '\n{0}\nRESPONSE RECEIVED\n{0}\n'.format('-' * 17),
+        'response status..: {0}\n'.format(response),
+        'response headers.: {0}\n'.format(response.headers),
+        'response time....: {0}\n'.format
+        (response.elapsed.total_seconds()),
+        'response timing..: {0}\n'.format(getattr(response, "timing", None)),
+        'response size....: {0}\n'.format(len(response.content)),
+        'response body....: {0}\n'.format(response_content),
+        '-' * 79])
+    try:
+        log.log(level, _safe_decode(logline))
+    except Exception as exception:
+        # Ignore all exceptions that happen in logging, then log them
+        log.log(level, '\n{0}\nRESPONSE INFO\n{0}\n'.format('-' * 13))
+        log.exception(exception)
 
-        return text.decode(incoming, errors)
+
+def log_http_transaction(log, level=logging.DEBUG):
+    """Decorator used for logging requests/response in clients.
+
+    Takes a python Logger object and an optional logging level.
+    """
 
     def _decorator(func):
         """Accepts a function and returns wrapped version of that function."""
@@ -59,120 +199,44 @@ def log_http_transaction(log, level=logging.DEBUG):
             sent to the request() method, to the provided log at the provided
             log level.
             """
-            kwargs_copy = deepcopy(kwargs)
-            if kwargs_copy.get("sanitize"):
-                kwargs_copy = string_utils.sanitize_secrets(kwargs_copy)
-            logline = '{0} {1}'.format(args, string_utils.compress(
-                kwargs_copy))
-
-            try:
-                log.debug(_safe_decode(logline))
-            except Exception as exception:
-                # Ignore all exceptions that happen in logging, then log them
-                log.info(
-                    _LI(
-                        'Exception occurred while logging signature of calling'
-                        'method in http client'))
-                log.exception(exception)
-
+            kwargs_copy = _log_call(log, args, kwargs)
             # Make the request and time its execution
-            response = None
-            no_resp_time = None
-            signals = syntribos.signal.SignalHolder()
-            try:
-                start = time()
-                response = func(*args, **kwargs)
-            except requests.exceptions.RequestException as exc:
-                signals.register(http_checks.check_fail(exc))
-                log.log(level, _("A call to request() failed."))
-                log.exception(exc)
-                log.log(level, "=" * 80)
-            except Exception as exc:
-                log.critical(_LC(
-                    'Call to Requests failed due to exception'))
-                log.exception(exc)
-                signals.register(syntribos.signal.from_generic_exception(exc))
-                raise exc
-
-            if len(signals) > 0 and response is None:
-                no_resp_time = time() - start
-                log.log(level,
-                        _(
-                            'Request failed, elapsed time....: %.6f sec.\n'
-                        ), no_resp_time)
-                return (response, signals)
-
-            # requests lib 1.0.0 renamed body to data in the request object
-            request_body = ''
-            if 'body' in dir(response.request):
-                request_body = response.request.body
-            elif 'data' in dir(response.request):
-                request_body = response.request.data
-            else:
-                log.info(
-                    _LI(
-                        "Unable to log request body, neither a 'data' nor a "
-                        "'body' object could be found"))
-
-            # requests lib 1.0.4 removed params from response.request
-            request_params = ''
-            request_url = response.request.url
-            if 'params' in dir(response.request):
-                request_params = response.request.params
-            elif '?' in request_url:
-                request_url, request_params = request_url.split('?')
-
-            req_body_len = 0
-            req_header_len = 0
-            if response.request.headers:
-                req_header_len = len(response.request.headers)
-                request_headers = response.request.headers
-            if response.request.body:
-                req_body_len = len(response.request.body)
-            response_content = response.content
-            if kwargs_copy.get("sanitize"):
-                response_content = string_utils.sanitize_secrets(
-                    response_content)
-                request_params = string_utils.sanitize_secrets(request_params)
-                request_headers = string_utils.sanitize_secrets(
-                    request_headers)
-                request_body = string_utils.sanitize_secrets(request_body)
-            logline = ''.join([
-                '\n{0}\nREQUEST SENT\n{0}\n'.format('-' * 12),
-                'request method.......: {0}\n'.format(response.request.method),
-                'request url..........: {0}\n'.format(string_utils.compress(
-                    request_url)),
-                'request params.......: {0}\n'.format(string_utils.compress
-                                                      (request_params)),
-                'request headers size.: {0}\n'.format(req_header_len),
-                'request headers......: {0}\n'.format(string_utils.compress(
-                    request_headers)),
-                'request body size....: {0}\n'.format(req_body_len),
-                'request body.........: {0}\n'.format(string_utils.compress
-                                                      (request_body))])
-
-            try:
-                log.log(level, _safe_decode(logline))
-            except Exception as exception:
-                # Ignore all exceptions that happen in logging, then log them
-                log.log(level, '\n{0}\nREQUEST INFO\n{0}\n'.format('-' * 12))
-                log.exception(exception)
-
-            logline = ''.join([
-                '\n{0}\nRESPONSE RECEIVED\n{0}\n'.format('-' * 17),
-                'response status..: {0}\n'.format(response),
-                'response headers.: {0}\n'.format(response.headers),
-                'response time....: {0}\n'.format
-                (response.elapsed.total_seconds()),
-                'response size....: {0}\n'.format(len(response.content)),
-                'response body....: {0}\n'.format(response_content),
-                '-' * 79])
-            try:
-                log.log(level, _safe_decode(logline))
-            except Exception as exception:
-                # Ignore all exceptions that happen in logging, then log them
-                log.log(level, '\n{0}\nRESPONSE INFO\n{0}\n'.format('-' * 13))
-                log.exception(exception)
-            return (response, signals)
+            return _get_response(
+                log, level, lambda: func(*args, **kwargs), kwargs_copy)
+        return _wrapper
+    return _decorator
+
+
+def log_http_transaction_async(log, level=logging.DEBUG):
+    """Decorator used for logging requests/response sent without blocking.
+
+    Like :func:`log_http_transaction`, but for client methods that return a
+    :class:`concurrent.futures.Future` of a requests response. The wrapped
+    method returns a future of a (response, signals) tuple instead.
+    """
+
+    def _decorator(func):
+        """Accepts a function and returns wrapped version of that function."""
+        def _wrapper(*args, **kwargs):
+            """Logging wrapper for any method that returns a future response.
+
+            The transaction is logged, and its signals gathered, once the
+            response (or the exception raised) is available.
+            """
+            kwargs_copy = _log_call(log, args, kwargs)
+            outcome = futures.Future()
+            outcome.set_running_or_notify_cancel()
+            start = clock()
+            pending = func(*args, **kwargs)
+
+            def _done(pending):
+                try:
+                    outcome.set_result(_get_response(
+                        log, level, pending.result, kwargs_copy, start))
+                except Exception as exc:
+                    outcome.set_exception(exc)
+
+            pending.add_done_callback(_done)
+            return outcome
         return _wrapper
     return _decorator
@@ -0,0 +1,524 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""HTTP/2 transport for :class:`syntribos.clients.http.HTTPClient`
+
+Requests to each host are sent as concurrent streams over a single HTTP/2
+connection, from an asyncio event loop in a background thread (see
+:mod:`syntribos.clients.http.async_client`), so that any number of workers
+share one connection instead of a pool of HTTP/1.1 connections. Up to
+``http2_max_streams`` streams (or fewer, if the server says so) are open at
+once on each connection; requests over the limit wait for a stream to end.
+
+HTTPS hosts are asked for HTTP/2 with ALPN, and plain HTTP hosts are sent
+HTTP/2 with prior knowledge. Hosts that don't speak HTTP/2 are sent HTTP/1.1
+requests by the asyncio transport instead, for the rest of the run.
+
+Requests are sent as they are: header names are lowercased, as HTTP/2
+requires, but neither names nor values are validated or normalized, so
+fuzzed headers reach the server as they would over HTTP/1.1. Responses are
+returned as :class:`requests.Response` objects, so the same checks apply.
+
+This module requires Python 3.5 or newer, and the h2 package.
+"""
+import asyncio
+import http.client
+import logging
+import os
+import threading
+
+from oslo_config import cfg
+import requests.exceptions as rex
+
+from syntribos._i18n import _
+from syntribos.clients.http.async_client import AsyncTransport
+from syntribos.clients.http.body import BodyReader
+from syntribos.clients.http.timing import clock
+from syntribos.clients.http.timing import Timing
+from syntribos.clients.http import tls
+from syntribos.clients.http.wire import BODY_CHARSET
+from syntribos.clients.http.wire import ContentDecoder
+from syntribos.utils import stats
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.errors
+    import h2.events
+    import h2.exceptions
+    import h2.settings
+except ImportError:
+    h2 = None
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+# Headers that only make sense on an HTTP/1.1 connection (RFC 7540, 8.1.2.2)
+CONNECTION_HEADERS = frozenset([
+    "connection", "host", "keep-alive", "proxy-connection",
+    "transfer-encoding", "upgrade"])
+
+_transport = None
+_transport_pid = None
+_transport_lock = threading.Lock()
+
+
+class RetryStream(Exception):
+    """The server closed the connection without processing the stream"""
+
+
+class _Stream(object):
+    """The response to a request sent as a stream, as it's received
+
+    The body is decoded and fed to a
+    :class:`syntribos.clients.http.body.BodyReader` as each frame arrives,
+    so at most ``max_response_size`` bytes of it are kept.
+    """
+
+    __slots__ = ("request", "headers", "body", "decoder", "done",
+                 "headers_at")
+
+    def __init__(self, loop, request, stop_on=None):
+        self.request = request
+        self.headers = None
+        self.body = BodyReader(stop_on)
+        self.decoder = None
+        self.done = loop.create_future()
+        self.headers_at = None
+
+    def receive_headers(self, headers):
+        self.headers = headers
+        self.headers_at = clock()
+        encoding = b", ".join(value for name, value in headers
+                              if name.lower() == b"content-encoding")
+        self.decoder = ContentDecoder(
+            encoding.decode("iso-8859-1"), self.request)
+
+    def receive_data(self, data):
+        """Reads the next chunk of the body
+
+        :rtype: bool
+        :returns: True if the rest of the body needn't be read
+        """
+        if self.decoder is None:
+            return False
+        return self.body.feed(self.decoder.decode(data))
+
+    def end(self):
+        if self.decoder is not None:
+            self.body.feed(self.decoder.flush())
+
+
+class H2Connection(object):
+    """An HTTP/2 connection to a host, carrying concurrent requests
+
+    Frames are read, and dispatched to the stream they're for, by a task
+    started by :func:`start`. A connection that the server closed, or that
+    failed, is :attr:`closed`; its streams fail with
+    :class:`requests.exceptions.ConnectionError`, or with
+    :class:`RetryStream` if the server says it didn't process them.
+    """
+
+    def __init__(self, reader, writer, max_streams, name):
+        self.reader = reader
+        self.writer = writer
+        self.max_streams = max_streams
+        self.name = name
+        self.closed = False
+        self.streams = {}
+        self.conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(
+                client_side=True, header_encoding=None,
+                validate_outbound_headers=False,
+                normalize_outbound_headers=False,
+                validate_inbound_headers=False))
+        self.conn.initiate_connection()
+        self.conn.update_settings(
+            {h2.settings.SettingCodes.ENABLE_PUSH: 0})
+        self._changed = asyncio.Event()
+        self._saved_session = False
+        self._task = None
+        self.flush()
+
+    async def check_preface(self, timeout):
+        """Checks that the server answered the connection preface in kind
+
+        Used for plain HTTP hosts, which get HTTP/2 with prior knowledge:
+        an HTTP/1.1 server answers with an error response (or closes the
+        connection) instead of its own preface, which starts with a
+        SETTINGS frame (RFC 7540, 3.5).
+
+        :rtype: bool
+        """
+        try:
+            data = await asyncio.wait_for(self.reader.read(65535), timeout)
+        except (asyncio.TimeoutError, OSError):
+            data = b""
+        if len(data) < 9 or data[3:4] != b"\x04":
+            self.writer.close()
+            return False
+        self._receive(data)
+        return not self.closed
+
+    def start(self):
+        """Starts reading frames from the server."""
+        self._task = asyncio.ensure_future(self._read_frames())
+
+    def close(self):
+        """Tells the server the connection is done with, and closes it."""
+        if not self.closed:
+            self.conn.close_connection()
+            self.flush()
+            self._close(ConnectionError("HTTP/2 connection closed"))
+        if self._task is not None:
+            self._task.cancel()
+
+    def flush(self):
+        """Writes out the frames the connection has ready to send."""
+        data = self.conn.data_to_send()
+        if data and not self.writer.is_closing():
+            self.writer.write(data)
+
+    async def request(self, prepared, parts, timeout, timing, stop_on=None):
+        """Sends `prepared` as a new stream, and reads its response
+
+        :param list stop_on: Strings to stop reading the body at
+        :returns: (response headers,
+            :class:`syntribos.clients.http.body.BodyReader` of the body,
+            nanoseconds from sending the request to receiving the response
+            headers)
+        """
+        while not self._can_open_stream():
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        stream_id = self.conn.get_next_available_stream_id()
+        stream = self.streams[stream_id] = _Stream(
+            asyncio.get_event_loop(), prepared, stop_on)
+        stats.record_max(
+            "HTTP/2 peak concurrent streams ({0})".format(self.name),
+            len(self.streams))
+        body = self._get_body(prepared)
+        start = clock()
+        try:
+            self.conn.send_headers(
+                stream_id, self._get_headers(prepared, parts),
+                end_stream=not body)
+            self.flush()
+            if body:
+                await self._send_body(stream_id, body, timeout)
+            sent = clock()
+            await asyncio.wait_for(asyncio.shield(stream.done), timeout)
+        except asyncio.TimeoutError:
+            self._reset_stream(stream_id)
+            raise
+        except h2.exceptions.ProtocolError as exc:
+            raise rex.ConnectionError(exc, request=prepared)
+        finally:
+            self.streams.pop(stream_id, None)
+            self._notify()
+        end = clock()
+        if stream.headers is None:
+            raise ConnectionError("Stream ended without a response")
+        timing.send = sent - start
+        timing.ttfb = stream.headers_at - sent
+        timing.transfer = end - stream.headers_at
+        return stream.headers, stream.body, stream.headers_at - start
+
+    def _can_open_stream(self):
+        if self.closed:
+            raise RetryStream()
+        limit = min(self.max_streams,
+                    self.conn.remote_settings.max_concurrent_streams)
+        return self.conn.open_outbound_streams < limit
+
+    @staticmethod
+    def _get_headers(prepared, parts):
+        """Returns the pseudo-headers and headers of `prepared`, as bytes"""
+        authority = prepared.headers.get(
+            "Host", parts.netloc.rpartition("@")[2])
+        headers = [(":method", prepared.method), (":authority", authority),
+                   (":scheme", parts.scheme),
+                   (":path", prepared.path_url)]
+        headers.extend(
+            (name.lower(), value) for name, value in prepared.headers.items()
+            if name.lower() not in CONNECTION_HEADERS)
+        return [tuple(field.encode("iso-8859-1") if isinstance(field, str)
+                      else field for field in header) for header in headers]
+
+    @staticmethod
+    def _get_body(prepared):
+        body = prepared.body
+        if hasattr(body, "read"):
+            body = body.read()
+        if isinstance(body, str):
+            body = body.encode(BODY_CHARSET)
+        return body or b""
+
+    async def _send_body(self, stream_id, body, timeout):
+        """Sends `body` in frames, as flow control allows."""
+        offset = 0
+        while offset < len(body):
+            size = min(self.conn.local_flow_control_window(stream_id),
+                       self.conn.max_outbound_frame_size, len(body) - offset)
+            if size <= 0:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+                if self.closed:
+                    raise RetryStream()
+                continue
+            self.conn.send_data(stream_id, body[offset:offset + size],
+                                end_stream=offset + size == len(body))
+            offset += size
+            self.flush()
+
+    def _reset_stream(self, stream_id):
+        try:
+            self.conn.reset_stream(stream_id, h2.errors.ErrorCodes.CANCEL)
+            self.flush()
+        except h2.exceptions.ProtocolError:
+            pass
+
+    def _notify(self):
+        """Wakes up requests waiting for a stream or flow control window."""
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _read_frames(self):
+        try:
+            while not self.closed:
+                data = await self.reader.read(65535)
+                if not data:
+                    raise ConnectionError(
+                        "Server closed the HTTP/2 connection")
+                self._receive(data)
+        except Exception as exc:
+            self._close(exc)
+
+    def _receive(self, data):
+        """Feeds `data` to the connection, and dispatches its events."""
+        for event in self.conn.receive_data(data):
+            stream = self.streams.get(getattr(event, "stream_id", None))
+            if isinstance(event, h2.events.ResponseReceived) and stream:
+                stream.receive_headers(event.headers)
+                if not self._saved_session:
+                    self._saved_session = True
+                    tls.save_session(
+                        self.writer.get_extra_info("ssl_object"))
+            elif isinstance(event, h2.events.DataReceived):
+                self.conn.acknowledge_received_data(
+                    event.flow_controlled_length, event.stream_id)
+                if stream and not stream.done.done():
+                    self._receive_data(event.stream_id, stream, event.data)
+            elif isinstance(event, h2.events.StreamEnded) and stream:
+                if not stream.done.done():
+                    try:
+                        stream.end()
+                    except rex.ContentDecodingError as exc:
+                        stream.done.set_exception(exc)
+                    else:
+                        stream.done.set_result(None)
+            elif isinstance(event, h2.events.StreamReset) and stream:
+                if not stream.done.done():
+                    stream.done.set_exception(ConnectionError(
+                        "Stream reset by the server (error code {0})".format(
+                            event.error_code)))
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self._close(ConnectionError(
+                    "Server closed the HTTP/2 connection (error code "
+                    "{0})".format(event.error_code)), event.last_stream_id)
+        self.flush()
+        self._notify()
+
+    def _receive_data(self, stream_id, stream, data):
+        """Feeds a DATA frame to its stream, which may end it early."""
+        try:
+            if not stream.receive_data(data):
+                return
+        except rex.ContentDecodingError as exc:
+            stream.done.set_exception(exc)
+        else:
+            stream.done.set_result(None)
+        # The rest of the body isn't needed
+        self._reset_stream(stream_id)
+
+    def _close(self, exc, last_stream_id=None):
+        """Marks the connection closed, and fails its streams."""
+        if not isinstance(exc, ConnectionError):
+            exc = ConnectionError(exc)
+        self.closed = True
+        for stream_id, stream in self.streams.items():
+            if stream.done.done():
+                continue
+            if last_stream_id is not None and stream_id > last_stream_id:
+                stream.done.set_exception(RetryStream())
+            else:
+                stream.done.set_exception(exc)
+        self.writer.close()
+        self._notify()
+
+
+class H2Transport(AsyncTransport):
+    """Sends requests as HTTP/2 streams from an event loop
+
+    :func:`submit` and :func:`request` can be called from any thread, as
+    with :class:`syntribos.clients.http.async_client.AsyncTransport`.
+    """
+
+    def __init__(self):
+        super(H2Transport, self).__init__()
+        self._connections = {}
+        self._opening = {}
+        self._http1_origins = set()
+        self._h2_ssl_contexts = {}
+
+    def close(self):
+        """Closes every connection (from any thread)."""
+        async def close():
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result()
+        super(H2Transport, self).close()
+
+    def _get_h2_ssl_context(self, verify):
+        """Returns a (cached) SSL context offering HTTP/2 with ALPN."""
+        if verify not in self._h2_ssl_contexts:
+            ctx = tls.create_context(verify)
+            ctx.set_alpn_protocols(["h2", "http/1.1"])
+            self._h2_ssl_contexts[verify] = ctx
+        return self._h2_ssl_contexts[verify]
+
+    async def _send(self, prepared, timeout, verify, stop_on=None):
+        """Sends a single prepared request as a stream of a connection."""
+        if isinstance(timeout, tuple):
+            connect_timeout, read_timeout = timeout
+        else:
+            connect_timeout = read_timeout = timeout
+        parts, port = self._check_url(prepared)
+        origin = (parts.scheme, parts.hostname, port)
+        name = "{0}:{1}".format(parts.hostname, port)
+
+        # Streams the server closed the connection without processing are
+        # sent again, once, over a new connection
+        for attempt in range(2):
+            timing = Timing()
+            conn = await self._get_connection(
+                prepared, parts, port, verify, connect_timeout, timing)
+            if conn is None:
+                return await super(H2Transport, self)._send(
+                    prepared, timeout, verify, stop_on)
+            try:
+                headers, body, elapsed = await conn.request(
+                    prepared, parts, read_timeout, timing, stop_on)
+                break
+            except RetryStream:
+                stats.increment("HTTP/2 streams retried ({0})".format(name))
+                self._connections.pop(origin, None)
+                continue
+            except asyncio.TimeoutError:
+                raise rex.ReadTimeout(
+                    "Read from {0} timed out. (read timeout={1})".format(
+                        parts.netloc, read_timeout), request=prepared)
+            except ConnectionError as exc:
+                raise rex.ConnectionError(exc, request=prepared)
+        else:
+            raise rex.ConnectionError(
+                "Server closed the HTTP/2 connection", request=prepared)
+
+        status = 0
+        msg = http.client.HTTPMessage()
+        for name, value in headers:
+            name = name.decode("iso-8859-1")
+            if name == ":status":
+                status = int(value)
+            elif not name.startswith(":"):
+                msg[name] = value.decode("iso-8859-1")
+        return self._build_response(
+            prepared, status, http.client.responses.get(status, ""), msg,
+            body, elapsed, timing)
+
+    async def _get_connection(self, prepared, parts, port, verify, timeout,
+                              timing):
+        """Returns the open connection to the host of `prepared`
+
+        A new connection is opened if there is none, and timed in `timing`.
+        Requests sent while it's being opened wait for it.
+
+        :returns: A :class:`H2Connection`, or None if the host doesn't speak
+            HTTP/2
+        """
+        origin = (parts.scheme, parts.hostname, port)
+        name = "{0}:{1}".format(parts.hostname, port)
+        while True:
+            if origin in self._http1_origins:
+                return None
+            conn = self._connections.get(origin)
+            if conn is not None and not conn.closed:
+                return conn
+            opening = self._opening.get(origin)
+            if opening is None:
+                break
+            await opening.wait()
+
+        opening = self._opening[origin] = asyncio.Event()
+        try:
+            conn = await self._open_h2(
+                prepared, parts, port, verify, timeout, timing, name)
+        finally:
+            del self._opening[origin]
+            opening.set()
+        if conn is None:
+            LOG.warning("%s doesn't speak HTTP/2, sending it HTTP/1.1 "
+                        "requests instead", name)
+            stats.increment("HTTP/2 fallbacks to HTTP/1.1 ({0})".format(
+                name))
+            self._http1_origins.add(origin)
+            return None
+        stats.increment("HTTP/2 connections ({0})".format(name))
+        self._connections[origin] = conn
+        return conn
+
+    async def _open_h2(self, prepared, parts, port, verify, timeout,
+                       timing, name):
+        """Opens an HTTP/2 connection, or returns None if not spoken."""
+        ssl_context = None
+        if parts.scheme == "https":
+            ssl_context = self._get_h2_ssl_context(verify)
+        reader, writer = await self._connect(
+            prepared, parts, port, ssl_context, timeout, timing)
+        if ssl_context is not None:
+            ssl_object = writer.get_extra_info("ssl_object")
+            if ssl_object.selected_alpn_protocol() != "h2":
+                writer.close()
+                return None
+        conn = H2Connection(reader, writer, CONF.syntribos.http2_max_streams,
+                            name)
+        if ssl_context is None and not await conn.check_preface(timeout):
+            return None
+        conn.start()
+        return conn
+
+
+def get_transport():
+    """Returns the :class:`H2Transport` for the current process
+
+    The transport's event loop thread doesn't survive a fork, so a process
+    forked after it was created (e.g. by ``--processes``) gets a new one.
+    """
+    global _transport, _transport_pid
+
+    if h2 is None:
+        raise Exception(_("The http2 transport requires the h2 package"))
+    with _transport_lock:
+        if _transport is None or _transport_pid != os.getpid():
+            _transport = H2Transport()
+            _transport_pid = os.getpid()
+    return _transport
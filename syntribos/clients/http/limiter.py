@@ -0,0 +1,275 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Limits on the requests sent to each host
+
+Each host may get a token bucket (:class:`TokenBucket`), which caps the rate
+at which requests are sent to it, and an adaptive limit on the number of
+requests in flight (:class:`AdaptiveLimiter`).
+
+The adaptive limit is an additive-increase/multiplicative-decrease (AIMD)
+limit: it grows by about one request per round of successful responses, as
+long as response times stay flat, and is cut down whenever a response shows
+the target struggling (a 5XX status code, a timeout or a 429). This keeps
+syntribos from knocking over the target and then reporting the outage as
+``500_errors`` or ``TIME_DIFF_OVER`` defects.
+"""
+import collections
+import email.utils
+import threading
+import time
+
+from oslo_config import cfg
+from six.moves.urllib.parse import urlparse
+
+from syntribos.clients.http import cassette
+from syntribos.utils import stats
+
+CONF = cfg.CONF
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+# Signal tags/slugs (see syntribos.checks.http) that mean the target is
+# overloaded
+BACKOFF_SIGNALS = ["HTTP_STATUS_CODE_5XX", "CONNECTION_TIMEOUT"]
+
+
+class AdaptiveLimiter(object):
+    """AIMD limit on the number of requests in flight to a single host
+
+    :ivar float limit: Current number of requests allowed in flight
+    :ivar int in_flight: Number of requests currently in flight
+    :ivar int backoffs: Number of times the limit has been decreased
+    """
+
+    # Multiplier applied to the limit when the target is overloaded
+    decrease = 0.5
+    # Response times above this multiple of the average don't grow the limit
+    latency_tolerance = 2.0
+
+    def __init__(self, host, initial=4, maximum=64, max_retry_after=30):
+        self.host = host
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.max_retry_after = max_retry_after
+        self.in_flight = 0
+        self.backoffs = 0
+        self._latency = None
+        self._last_backoff = 0
+        self._paused_until = 0
+        self._timer = None
+        self._waiting = collections.deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until another request may be sent to the host."""
+        ready = threading.Event()
+        self.submit(ready.set)
+        ready.wait()
+
+    def submit(self, callback):
+        """Calls `callback` once another request may be sent to the host
+
+        `callback` is called right away if the limit allows, otherwise from
+        the thread that releases the request making room for it. Either way,
+        :func:`release` must be called once its request is complete.
+        """
+        with self._lock:
+            self._waiting.append(callback)
+            ready = self._pop_ready()
+        for callback in ready:
+            callback()
+
+    def release(self, response=None, signals=None):
+        """Marks a request as complete, and adjusts the limit
+
+        :param response: The response received, if any
+        :type response: :class:`requests.Response`
+        :param signals: Signals raised by the request, if any
+        :type signals: :class:`syntribos.signal.SignalHolder`
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self._adjust(response, signals)
+            ready = self._pop_ready()
+        for callback in ready:
+            callback()
+
+    def _adjust(self, response, signals):
+        now = time.time()
+        status_code = getattr(response, "status_code", None)
+        overloaded = status_code == 429 or (
+            signals is not None and
+            any(s in signals for s in BACKOFF_SIGNALS))
+
+        if overloaded:
+            retry_after = _get_retry_after(response)
+            if retry_after:
+                self._paused_until = max(
+                    self._paused_until,
+                    now + min(retry_after, self.max_retry_after))
+                stats.increment("Retry-After pauses ({0})".format(self.host))
+            # Responses to requests sent before the last backoff don't show
+            # whether it helped, so only back off once per round trip
+            if now - self._last_backoff >= (self._latency or 0):
+                self.limit = max(1.0, self.limit * self.decrease)
+                self._last_backoff = now
+                self.backoffs += 1
+                stats.increment("Concurrency backoffs ({0})".format(
+                    self.host))
+        elif response is not None:
+            elapsed = response.elapsed.total_seconds()
+            if self._latency is None:
+                self._latency = elapsed
+            if elapsed <= self._latency * self.latency_tolerance:
+                # About one more request per round of `limit` responses
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._latency = 0.9 * self._latency + 0.1 * elapsed
+        stats.record("Concurrency limit ({0})".format(self.host),
+                     int(self.limit))
+        stats.record_max("Peak concurrency limit ({0})".format(self.host),
+                         int(self.limit))
+
+    def _pop_ready(self):
+        """Returns the waiting callbacks that can run now (lock held)."""
+        ready = []
+        delay = self._paused_until - time.time()
+        if delay > 0:
+            if self._timer is None:
+                self._timer = threading.Timer(delay, self._resume)
+                self._timer.daemon = True
+                self._timer.start()
+            return ready
+        while self._waiting and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            ready.append(self._waiting.popleft())
+        return ready
+
+    def _resume(self):
+        """Runs waiting callbacks once a Retry-After pause is over."""
+        with self._lock:
+            self._timer = None
+            ready = self._pop_ready()
+        for callback in ready:
+            callback()
+
+
+class TokenBucket(object):
+    """Token bucket capping the rate of requests sent to a single host
+
+    The bucket holds up to `burst` tokens and refills at `rate` tokens per
+    second. Each request takes a token; when there are none left, the
+    request reserves the next one and waits until it is due.
+
+    :ivar float rate: Requests allowed per second
+    :ivar int burst: Requests that may be sent at once after a quiet period
+    """
+
+    def __init__(self, host, rate, burst=1):
+        self.host = host
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Takes a token, and returns how long to wait before using it
+
+        The caller is responsible for waiting (with :func:`time.sleep`, or
+        :func:`asyncio.sleep` from an event loop), so the reservation holds
+        no locks while it waits.
+
+        :rtype: float
+        :returns: Number of seconds to wait before sending the request
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Tokens may go negative: each waiting request has reserved one
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+        if delay:
+            stats.increment("Rate limited requests ({0})".format(self.host))
+            stats.record_max("Longest rate limit wait ({0})".format(
+                self.host), round(delay, 3))
+        return delay
+
+    def wait(self):
+        """Blocks until a request may be sent to the host."""
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+
+def _get_retry_after(response):
+    """Returns the number of seconds a response asks us to wait, if any."""
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0, int(value))
+    except ValueError:
+        date = email.utils.parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0, email.utils.mktime_tz(date) - time.time())
+
+
+def get_limiter(url):
+    """Returns the limiter for the host of `url`, or None if disabled
+
+    :param str url: URL a request is about to be sent to
+    :rtype: :class:`AdaptiveLimiter`
+    """
+    # Replayed responses don't load the server, so there's nothing to adapt
+    if not CONF.syntribos.adaptive_concurrency or cassette.is_replaying():
+        return None
+    host = urlparse(url).netloc
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = AdaptiveLimiter(
+                host, initial=(CONF.syntribos.initial_concurrency or
+                               CONF.workers),
+                maximum=CONF.syntribos.max_concurrency,
+                max_retry_after=CONF.syntribos.max_retry_after)
+        return _limiters[host]
+
+
+def get_bucket(url):
+    """Returns the token bucket for the host of `url`, or None if unlimited
+
+    The rate and burst for a host are taken from ``host_rate_limits`` and
+    ``host_rate_bursts`` if it is listed there, otherwise from
+    ``rate_limit`` and ``rate_burst``.
+
+    :param str url: URL a request is about to be sent to
+    :rtype: :class:`TokenBucket`
+    """
+    opts = CONF.syntribos
+    if not opts.rate_limit and not opts.host_rate_limits:
+        return None
+    host = urlparse(url).hostname
+    with _buckets_lock:
+        if host not in _buckets:
+            rate = float(opts.host_rate_limits.get(host, opts.rate_limit))
+            burst = int(opts.host_rate_bursts.get(host, opts.rate_burst))
+            _buckets[host] = TokenBucket(host, rate, burst) if rate else None
+        return _buckets[host]
@@ -28,6 +28,12 @@ from six.moves.urllib import parse as urlparse
 
 from syntribos._i18n import _, _LE, _LW   # noqa
 
+try:
+    from html import unescape as html_unescape
+except ImportError:
+    # Python 2
+    html_unescape = html_parser.HTMLParser().unescape
+
 CONF = cfg.CONF
 _iterators = {}
 _string_var_objs = {}
@@ -478,8 +484,7 @@ class RequestHelperMixin(object):
         elif isinstance(data, ElementTree.Element):
             str_data = ElementTree.tostring(data)
             # No way to stop tostring from HTML escaping even if we wanted
-            h = html_parser.HTMLParser()
-            return h.unescape(str_data.decode())
+            return html_unescape(str_data.decode())
         else:
             return data
 
@@ -0,0 +1,88 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Caching host name resolution for new connections
+
+Every connection opened by :class:`syntribos.clients.http.HTTPClient` (with
+any transport) resolves its host through :func:`getaddrinfo`, which keeps the
+addresses of each host for ``dns_cache_ttl`` seconds, so that opening a
+connection doesn't wait for a slow resolver every time.
+
+With ``dns_pin``, each host is pinned to the first address it resolves to,
+so that a host with round-robin DNS doesn't move the requests of a template
+between backends, which would make their responses incomparable to the
+baseline response. A host is only pinned to another address once the pinned
+one is no longer in its resolved addresses. Pins aren't cleared between
+templates, as connections to the pinned address are kept open for reuse.
+"""
+import socket
+import threading
+import timeit
+
+from oslo_config import cfg
+
+from syntribos.utils import stats
+
+CONF = cfg.CONF
+
+_lock = threading.Lock()
+_cache = {}
+_pins = {}
+
+
+def getaddrinfo(host, port, family=0, type=0):
+    """Same as :func:`socket.getaddrinfo`, with caching and pinning
+
+    Errors aren't cached, so a host that failed to resolve is resolved again
+    by the next connection.
+    """
+    key = (host, port, family, type)
+    now = timeit.default_timer()
+    with _lock:
+        expires, addresses = _cache.get(key, (0, None))
+    if addresses is not None and expires > now:
+        stats.increment("DNS cache hits")
+    else:
+        addresses = socket.getaddrinfo(host, port, family, type)
+        duration = int((timeit.default_timer() - now) * 1e6)
+        stats.increment("DNS resolutions")
+        stats.increment("DNS resolution time (us)", duration)
+        stats.record_max("DNS resolution time, slowest (us)", duration)
+        if CONF.syntribos.dns_cache_ttl > 0:
+            with _lock:
+                _cache[key] = (now + CONF.syntribos.dns_cache_ttl, addresses)
+    if CONF.syntribos.dns_pin and addresses:
+        addresses = _pin(host, port, addresses)
+    return addresses
+
+
+def _pin(host, port, addresses):
+    """Returns the address `host` is pinned to, pinning it if it isn't"""
+    with _lock:
+        pinned = _pins.get(host)
+        if pinned is None or pinned[4][0] not in [
+                address[4][0] for address in addresses]:
+            if pinned is not None:
+                stats.increment("DNS pins moved")
+            pinned = _pins[host] = addresses[0]
+    family, type, proto, canonname, sockaddr = pinned
+    # The host may have been pinned by a connection to another port
+    return [(family, type, proto, canonname, (sockaddr[0], port) +
+             tuple(sockaddr[2:]))]
+
+
+def clear():
+    """Forgets every resolved address, and unpins every host."""
+    with _lock:
+        _cache.clear()
+        _pins.clear()
@@ -0,0 +1,150 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Pooled, keep-alive HTTP session shared by all HTTP clients
+
+`requests.request` builds a new session, and so opens a new connection, for
+every request. Instead, every :class:`syntribos.clients.http.HTTPClient` in a
+process sends its requests through one :class:`requests.Session`, which keeps
+connections to each host open between requests. The session never stores
+cookies, so each request is sent exactly as with `requests.request`.
+"""
+from concurrent import futures
+import os
+import threading
+
+from oslo_config import cfg
+import requests
+from requests import adapters
+from requests.packages.urllib3 import connectionpool
+from six.moves import http_cookiejar
+
+from syntribos.clients.http import timing
+from syntribos.clients.http import tls
+from syntribos.utils import stats
+
+CONF = cfg.CONF
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+class BlockCookiesPolicy(http_cookiejar.DefaultCookiePolicy):
+    """Cookie policy that doesn't keep cookies set by responses"""
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+class _CountingPoolMixin(object):
+    """Counts connections reused from (hits) or opened by (misses) a pool"""
+
+    def _get_conn(self, timeout=None):
+        conn = super(_CountingPoolMixin, self)._get_conn(timeout=timeout)
+        host = "{0}:{1}".format(self.host, self.port)
+        # New and dropped connections have no socket until they're opened
+        if getattr(conn, "sock", None) is not None:
+            stats.increment("Connection pool hits ({0})".format(host))
+        else:
+            stats.increment("Connection pool misses ({0})".format(host))
+        return conn
+
+
+class CountingHTTPConnectionPool(_CountingPoolMixin,
+                                 connectionpool.HTTPConnectionPool):
+    ConnectionCls = timing.TimingHTTPConnection
+
+
+class CountingHTTPSConnectionPool(_CountingPoolMixin,
+                                  connectionpool.HTTPSConnectionPool):
+    ConnectionCls = tls.ResumingHTTPSConnection
+
+
+class PooledHTTPAdapter(adapters.HTTPAdapter):
+    """HTTP adapter whose connection pools count hits and misses
+
+    Responses get the :class:`syntribos.clients.http.timing.Timing` of their
+    request, as ``response.timing``.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(PooledHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool
+        }
+
+    def build_response(self, req, resp):
+        response = super(PooledHTTPAdapter, self).build_response(req, resp)
+        # The body isn't read yet, so the connection is still the response's
+        conn = getattr(resp, "_connection", None)
+        response.timing = getattr(conn, "timing", None)
+        return response
+
+
+def _new_session():
+    """Returns a session with pools sized according to the config."""
+    session = requests.Session()
+    session.cookies.set_policy(BlockCookiesPolicy())
+    adapter = PooledHTTPAdapter(pool_maxsize=CONF.syntribos.pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    for host, maxsize in CONF.syntribos.host_pool_maxsizes.items():
+        adapter = PooledHTTPAdapter(pool_maxsize=int(maxsize))
+        for scheme in ("http", "https"):
+            # Match the host with or without a port, but not a longer name
+            session.mount("{0}://{1}/".format(scheme, host), adapter)
+            session.mount("{0}://{1}:".format(scheme, host), adapter)
+    return session
+
+
+def get_session():
+    """Returns the :class:`requests.Session` for the current process
+
+    Connections don't survive a fork, so a process forked after the session
+    was created (e.g. by ``--processes``) gets a new one.
+
+    :rtype: :class:`requests.Session`
+    """
+    global _session, _session_pid
+
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = _new_session()
+            _session_pid = os.getpid()
+    return _session
+
+
+def prewarm(url, count):
+    """Opens up to `count` connections to the host of `url` ahead of time
+
+    A HEAD request for `url` is sent over each connection, all at once, so
+    that each one is opened and then kept in the pool for later requests.
+
+    :param str url: URL to send the requests to
+    :param int count: Number of connections to open
+    """
+    session = get_session()
+
+    def _head(_):
+        try:
+            session.head(url, verify=False, timeout=10)
+        except requests.RequestException:
+            pass
+
+    executor = futures.ThreadPoolExecutor(max_workers=count)
+    try:
+        list(executor.map(_head, range(count)))
+    finally:
+        executor.shutdown()
@@ -0,0 +1,162 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""High resolution timing of the phases of each request
+
+Every response sent by :class:`syntribos.clients.http.HTTPClient` gets a
+:class:`Timing` (as ``response.timing``), measured with a monotonic clock,
+which splits its response time into DNS resolution, connection, TLS
+handshake, sending the request, waiting for the response headers (time to
+first byte, or TTFB) and reading the body. TTFB is mostly time spent by the
+server handling the request, which is what time based checks look for,
+while the other phases mostly depend on the network.
+"""
+import socket
+import time
+import timeit
+
+from requests.packages.urllib3 import connection
+from requests.packages.urllib3.exceptions import ConnectTimeoutError
+from requests.packages.urllib3.util.connection import allowed_gai_family
+
+from syntribos.clients.http import resolver
+
+PHASES = ("dns", "connect", "tls", "send", "ttfb", "transfer")
+
+try:
+    clock = time.perf_counter_ns
+except AttributeError:
+    def clock():
+        """Returns the time of a monotonic clock, in nanoseconds"""
+        return int(timeit.default_timer() * 1e9)
+
+
+class Timing(object):
+    """Durations of the phases of a request, in nanoseconds
+
+    Phases that didn't happen are None, e.g. DNS resolution, connection and
+    TLS handshake for a request sent over a reused connection.
+
+    :ivar int dns: Resolving the host name
+    :ivar int connect: Opening the TCP connection
+    :ivar int tls: TLS handshake
+    :ivar int send: Sending the request
+    :ivar int ttfb: Waiting for the response headers, once the request was
+        sent
+    :ivar int transfer: Reading the response body
+    """
+
+    __slots__ = PHASES
+
+    def __init__(self, **phases):
+        for phase in PHASES:
+            setattr(self, phase, phases.get(phase))
+
+    def seconds(self, phase):
+        """Returns the duration of `phase` in seconds, or None
+
+        :param str phase: One of :data:`PHASES`
+        :rtype: float
+        """
+        duration = getattr(self, phase)
+        return duration / 1e9 if duration is not None else None
+
+    def to_dict(self):
+        """Returns the durations of the phases that happened, by phase"""
+        return {phase: getattr(self, phase) for phase in PHASES
+                if getattr(self, phase) is not None}
+
+    def __repr__(self):
+        return "<Timing {0}>".format(" ".join(
+            "{0}={1:.3f}ms".format(phase, duration / 1e6)
+            for phase, duration in sorted(self.to_dict().items())))
+
+
+class _TimingConnectionMixin(object):
+    """Times each request sent over a urllib3 connection
+
+    The :class:`Timing` of the last request sent is kept as ``timing``.
+    """
+
+    timing = None
+    _opened = None
+    _opened_at = None
+
+    def _new_conn(self):
+        # Resolve the host here, so that resolving and connecting are timed
+        # separately, then connect to each address as urllib3 would
+        timing = self._opened = Timing()
+        host = self._dns_host
+        start = clock()
+        try:
+            addresses = resolver.getaddrinfo(
+                host.strip("[]"), self.port, allowed_gai_family(),
+                socket.SOCK_STREAM)
+        except socket.gaierror:
+            # Let urllib3 fail to resolve it, and raise its usual error
+            return super(_TimingConnectionMixin, self)._new_conn()
+        timing.dns = clock() - start
+
+        start = clock()
+        try:
+            for index, address in enumerate(addresses):
+                self._dns_host = address[4][0]
+                try:
+                    sock = super(_TimingConnectionMixin, self)._new_conn()
+                    break
+                except ConnectTimeoutError:
+                    if index == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+        timing.connect = clock() - start
+        return sock
+
+    def connect(self):
+        self._opened_at = start = clock()
+        super(_TimingConnectionMixin, self).connect()
+        timing = self._opened
+        if isinstance(self, connection.HTTPSConnection) and (
+                timing is not None and timing.connect is not None):
+            timing.tls = max(clock() - start - timing.dns - timing.connect, 0)
+
+    def request(self, *args, **kwargs):
+        start = clock()
+        super(_TimingConnectionMixin, self).request(*args, **kwargs)
+        end = clock()
+        # HTTPS connections are opened before the request, others by it
+        timing = self._opened or Timing()
+        self._opened = None
+        if self._opened_at is not None and self._opened_at >= start:
+            end -= sum(getattr(timing, phase) or 0
+                       for phase in ("dns", "connect", "tls"))
+        timing.send = max(end - start, 0)
+        self.timing = timing
+
+    def getresponse(self, *args, **kwargs):
+        start = clock()
+        response = super(_TimingConnectionMixin, self).getresponse(
+            *args, **kwargs)
+        if self.timing is not None:
+            self.timing.ttfb = clock() - start
+        return response
+
+
+class TimingHTTPConnection(_TimingConnectionMixin,
+                           connection.HTTPConnection):
+    pass
+
+
+class TimingHTTPSConnection(_TimingConnectionMixin,
+                            connection.HTTPSConnection):
+    pass
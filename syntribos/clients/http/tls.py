@@ -0,0 +1,169 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""TLS session resumption across connections
+
+A new HTTPS connection normally does a full TLS handshake. Connections made
+with a :class:`ResumingSSLContext` instead offer the server the TLS session
+(session ID or ticket) of the last connection to the same host, which lets
+the server skip the expensive part of the handshake. This matters when fuzz
+payloads keep getting connections closed (e.g. by error pages sent with
+``Connection: close``), as each request after that opens a new connection.
+
+A session can only be resumed by a connection made with the context that
+made it, so every transport shares contexts: unverified requests sent
+through the session use the same context (see
+:class:`ResumingHTTPSConnection`), as do wire templates, and the asyncio
+transport keeps one per ``verify`` value.
+
+With TLS 1.3, the server only sends its session ticket after the
+handshake, so sessions are kept once the first response over a connection
+was read (see :func:`save_session`).
+"""
+import os
+import ssl
+import threading
+
+from oslo_config import cfg
+from requests.packages.urllib3.util.ssl_ import resolve_cert_reqs
+import six
+
+from syntribos.clients.http.timing import TimingHTTPSConnection
+from syntribos.utils import stats
+
+CONF = cfg.CONF
+
+# Sessions can't be resumed with Python < 3.6
+HAS_SESSIONS = hasattr(ssl, "SSLSession")
+
+_context = None
+_context_lock = threading.Lock()
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """SSL context that resumes the last TLS session to each host
+
+    Sessions are kept by server host name, by :func:`save_session`. Use
+    :func:`create_context` to make one.
+    """
+
+    def wrap_socket(self, sock, server_hostname=None, **kwargs):
+        session = self._get_session(server_hostname)
+        if session is not None and kwargs.get("session") is None:
+            kwargs["session"] = session
+        return super(ResumingSSLContext, self).wrap_socket(
+            sock, server_hostname=server_hostname, **kwargs)
+
+    def wrap_bio(self, incoming, outgoing, server_side=False,
+                 server_hostname=None, session=None):
+        if session is None and not server_side:
+            session = self._get_session(server_hostname)
+        return super(ResumingSSLContext, self).wrap_bio(
+            incoming, outgoing, server_side=server_side,
+            server_hostname=server_hostname, session=session)
+
+    def _get_session(self, server_hostname):
+        if not (HAS_SESSIONS and server_hostname and
+                CONF.syntribos.tls_resumption):
+            return None
+        return self._sessions.get(server_hostname)
+
+    def save_session(self, sock):
+        """Counts whether `sock` resumed a session, and keeps its session"""
+        host = sock.server_hostname
+        if sock.session_reused:
+            stats.increment("TLS sessions resumed ({0})".format(host))
+        else:
+            stats.increment("TLS full handshakes ({0})".format(host))
+        session = sock.session
+        if host and session is not None and (
+                session.has_ticket or session.id):
+            self._sessions[host] = session
+
+
+def create_context(verify=False):
+    """Returns a new :class:`ResumingSSLContext`
+
+    :param verify: Whether to verify TLS certificates, or the path of a CA
+        bundle (file or directory) to verify them with
+    """
+    ctx = ResumingSSLContext(
+        getattr(ssl, "PROTOCOL_TLS_CLIENT", ssl.PROTOCOL_SSLv23))
+    ctx._sessions = {}
+    ctx.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3
+    ctx.options |= getattr(ssl, "OP_NO_COMPRESSION", 0)
+    if not verify:
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+        return ctx
+    ctx.verify_mode = ssl.CERT_REQUIRED
+    ctx.check_hostname = True
+    if isinstance(verify, six.string_types):
+        if os.path.isdir(verify):
+            ctx.load_verify_locations(capath=verify)
+        else:
+            ctx.load_verify_locations(cafile=verify)
+    else:
+        ctx.load_default_certs()
+    return ctx
+
+
+def get_context():
+    """Returns the context for this process' unverified connections
+
+    :rtype: :class:`ResumingSSLContext`
+    """
+    global _context
+
+    with _context_lock:
+        if _context is None:
+            _context = create_context()
+    return _context
+
+
+def save_session(sock):
+    """Keeps the TLS session of `sock` for the next connection to its host
+
+    Called once the first response over a new connection was read. Does
+    nothing for sockets that weren't made by a :class:`ResumingSSLContext`.
+
+    :param sock: An :class:`ssl.SSLSocket` or :class:`ssl.SSLObject`
+    """
+    context = getattr(sock, "context", None)
+    if HAS_SESSIONS and isinstance(context, ResumingSSLContext):
+        context.save_session(sock)
+
+
+class ResumingHTTPSConnection(TimingHTTPSConnection):
+    """urllib3 connection that resumes TLS sessions when not verifying
+
+    Connections that verify certificates, or send a client certificate,
+    use urllib3's own context for each connection, and do full handshakes.
+    """
+
+    _new_session = False
+
+    def connect(self):
+        if (self.ssl_context is None and not self.cert_file and
+                resolve_cert_reqs(self.cert_reqs) == ssl.CERT_NONE):
+            self.ssl_context = get_context()
+        super(ResumingHTTPSConnection, self).connect()
+        self._new_session = True
+
+    def getresponse(self, *args, **kwargs):
+        response = super(ResumingHTTPSConnection, self).getresponse(
+            *args, **kwargs)
+        if self._new_session:
+            self._new_session = False
+            save_session(self.sock)
+        return response
@@ -0,0 +1,610 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Requests serialized once, with a slot to splice fuzz payloads into
+
+The fuzzed requests of a test differ from each other, at any one parameter,
+only by their payload. A :class:`WireTemplate` prepares the request once,
+with :data:`SLOT` in place of the payload, and keeps its serialized bytes
+split around the slot. Each payload is then encoded the way requests would
+have encoded it at that parameter, and sent with the pieces of the template
+in a single ``sendmsg`` call over a pooled socket.
+
+Responses are returned as :class:`requests.Response` objects, and failures
+are raised as the same :mod:`requests.exceptions` the other transports
+raise, so the checks can't tell the difference.
+"""
+import datetime
+import json
+import os
+import socket
+import ssl
+import threading
+import zlib
+
+from oslo_config import cfg
+import requests
+from requests.cookies import extract_cookies_to_jar
+import requests.exceptions as rex
+from requests.models import RequestEncodingMixin
+from requests.packages.urllib3.util.wait import wait_for_read
+from requests.structures import CaseInsensitiveDict
+from requests import utils as requests_utils
+import six
+from six.moves import http_client
+from six.moves.urllib.parse import urlsplit
+
+from syntribos.clients.http.body import BodyReader
+from syntribos.clients.http.body import CHUNK_SIZE
+from syntribos.clients.http.parser import _iterators
+from syntribos.clients.http.parser import _string_var_objs
+from syntribos.clients.http import resolver
+from syntribos.clients.http.session import get_session
+from syntribos.clients.http.timing import clock
+from syntribos.clients.http.timing import Timing
+from syntribos.clients.http import tls
+from syntribos.utils import stats
+
+CONF = cfg.CONF
+
+#: Placeholder for the payload in a template; it is left as is by every
+#: encoding a payload goes through
+SLOT = "SYNTRIBOSWIRESLOT"
+
+#: Locations of the slot: a string in a JSON body, anywhere in another body,
+#: the value of a query parameter, or the value of a header
+JSON = "json"
+RAW = "raw"
+QUERY = "query"
+HEADER = "header"
+
+# Content codings we can decode; requests may advertise more (e.g. brotli)
+ACCEPT_ENCODING = "gzip, deflate"
+
+# requests sends str bodies as UTF-8 with urllib3 2.x, and as Latin-1 before
+BODY_CHARSET = ("iso-8859-1" if getattr(requests_utils, "is_urllib3_1", True)
+                else "utf-8")
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class CookieSource(object):
+    """Exposes response headers the way `extract_cookies_to_jar` expects."""
+
+    def __init__(self, msg):
+        self._original_response = self
+        self.msg = msg
+
+
+class ContentDecoder(object):
+    """Undoes the content codings listed in a Content-Encoding header, as
+    the body is read chunk by chunk
+
+    :param str content_encoding: Value of the Content-Encoding header
+    :param request: The request the response is for, for exceptions
+    """
+
+    def __init__(self, content_encoding, request):
+        self.content_encoding = content_encoding
+        self.request = request
+        codings = [c.strip().lower() for c in content_encoding.split(",")]
+        # Decompressors, in the order the codings are undone, and whether
+        # each one got any data
+        self._stages = [[_decompressor(coding), False]
+                        for coding in reversed(codings)
+                        if coding in ("gzip", "x-gzip", "deflate")]
+
+    def decode(self, data):
+        """Returns the decoded bytes of the next chunk of the body
+
+        :param bytes data: Next chunk of the body, as sent
+        :rtype: bytes
+        """
+        try:
+            for stage in self._stages:
+                if not data:
+                    break
+                stage[1] = True
+                data = stage[0].decompress(data)
+        except zlib.error as exc:
+            self._raise(exc)
+        return data
+
+    def flush(self):
+        """Returns what's left of the body once it has all been read
+
+        :rtype: bytes
+        """
+        data = b""
+        try:
+            for stage in self._stages:
+                if data:
+                    stage[1] = True
+                    data = stage[0].decompress(data)
+                if stage[1]:
+                    data += stage[0].flush()
+                    if not _is_eof(stage[0]):
+                        raise zlib.error("incomplete or truncated stream")
+        except zlib.error as exc:
+            self._raise(exc)
+        return data
+
+    def _raise(self, exc):
+        raise rex.ContentDecodingError(
+            "Received response with content-encoding: {0}, but failed to "
+            "decode it.".format(self.content_encoding), exc,
+            request=self.request)
+
+
+class _DeflateDecompressor(object):
+    """Decompresses deflate bodies, with or without their zlib header
+
+    Some servers send raw deflate data for ``Content-Encoding: deflate``,
+    so the first chunk decides which it is (as urllib3 does).
+    """
+
+    def __init__(self):
+        self._obj = zlib.decompressobj()
+        self._first = b""
+
+    @property
+    def eof(self):
+        return _is_eof(self._obj)
+
+    def decompress(self, data):
+        if self._first is None:
+            return self._obj.decompress(data)
+        self._first += data
+        try:
+            decoded = self._obj.decompress(data)
+        except zlib.error:
+            self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+            decoded = self._obj.decompress(self._first)
+            self._first = None
+            return decoded
+        if decoded:
+            self._first = None
+        return decoded
+
+    def flush(self):
+        return self._obj.flush()
+
+
+def _is_eof(obj):
+    """Returns whether a decompressor has read the end of its stream."""
+    # Python 2 decompressors don't say, so truncation isn't detected there
+    return getattr(obj, "eof", True)
+
+
+def _decompressor(coding):
+    """Returns a decompressor for a gzip or deflate content coding."""
+    if coding == "deflate":
+        return _DeflateDecompressor()
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+class WireTemplate(object):
+    """A prepared request, serialized once, with a slot for a payload
+
+    :ivar str location: Where the slot is (:data:`JSON`, :data:`RAW`,
+        :data:`QUERY` or :data:`HEADER`), which decides how payloads are
+        encoded
+    :ivar str url: URL of the request (with the slot in it for
+        :data:`QUERY` templates)
+    :ivar tuple pieces: Serialized request, split around the slot
+    """
+
+    def __init__(self, prepared, location, action_field=None):
+        self.prepared = prepared
+        self.location = location
+        self.action_field = action_field
+        self.url = prepared.url
+        parts = urlsplit(prepared.url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        if location == HEADER:
+            self.charset = "iso-8859-1"
+        elif location == QUERY:
+            self.charset = "ascii"
+        else:
+            self.charset = BODY_CHARSET
+
+        headers = prepared.headers
+        if headers.get("Accept-Encoding") == (
+                requests_utils.DEFAULT_ACCEPT_ENCODING):
+            headers["Accept-Encoding"] = ACCEPT_ENCODING
+        headers = CaseInsensitiveDict(headers)
+        if "Host" not in headers:
+            headers["Host"] = parts.netloc.rpartition("@")[2]
+        length = headers.pop("Content-Length", None)
+
+        body = prepared.body or b""
+        if isinstance(body, six.text_type):
+            body = body.encode(BODY_CHARSET)
+        lines = ["{0} {1} HTTP/1.1".format(
+            prepared.method, prepared.path_url).encode("iso-8859-1")]
+        for name, value in headers.items():
+            if isinstance(value, six.text_type):
+                value = value.encode("iso-8859-1")
+            lines.append(name.encode("ascii") + b": " + value)
+        head = b"\r\n".join(lines) + b"\r\n"
+
+        slot = SLOT.encode("ascii")
+        if location in (JSON, RAW):
+            if length is None or slot in head:
+                raise ValueError("Slot isn't only in the body")
+            before, after = self._split(body, slot)
+            if location == JSON and not (before.endswith(b'"') and
+                                         after.startswith(b'"')):
+                raise ValueError("Slot isn't a JSON string")
+            # Content-Length goes last, so that only its value changes
+            self.pieces = (head + b"Content-Length: ", b"\r\n\r\n",
+                           before, after)
+        else:
+            if length is not None:
+                head += b"Content-Length: " + length.encode("ascii") + (
+                    b"\r\n")
+            before, after = self._split(head + b"\r\n" + body, slot)
+            if location == QUERY:
+                if b"\r\n" in before or b"?" not in before or (
+                        not before.endswith(b"=")):
+                    raise ValueError("Slot isn't a query parameter value")
+            elif b"\r\n\r\n" in before or not before.endswith(b": ") or (
+                    not after.startswith(b"\r\n")):
+                raise ValueError("Slot isn't a header value")
+            self.pieces = (before, after)
+
+    def __repr__(self):
+        return "<WireTemplate {0} {1}>".format(self.prepared.method, self.url)
+
+    @staticmethod
+    def _split(data, slot):
+        """Splits `data` around the only `slot` in it."""
+        if data.count(slot) != 1:
+            raise ValueError("Expected exactly one slot")
+        before, _, after = data.partition(slot)
+        return before, after
+
+    @classmethod
+    def from_request(cls, request, location):
+        """Returns a template of a prepared request with :data:`SLOT` in it
+
+        The request is prepared by the same session that sends the other
+        requests, so it gets the same default headers.
+
+        :param request: A prepared RequestObject, with :data:`SLOT` in place
+            of the payload
+        :type request: :class:`syntribos.clients.http.parser.RequestObject`
+        :param str location: Where :data:`SLOT` is in the request
+        :returns: A :class:`WireTemplate`, or None if the request can't be
+            sent from a template (e.g. it would be sent through a proxy)
+        """
+        try:
+            prepared = get_session().prepare_request(requests.Request(
+                method=request.method.upper(), url=request.url,
+                headers=request.headers, data=request.data or {},
+                params=request.params or {}))
+            if urlsplit(prepared.url).scheme not in ("http", "https"):
+                return None
+            if requests_utils.get_environ_proxies(prepared.url):
+                return None
+            return cls(prepared, location, request.action_field)
+        except (ValueError, UnicodeError, rex.RequestException):
+            return None
+
+    def splice(self, payload):
+        """Encodes `payload` for the slot, the way requests would
+
+        Payloads that wouldn't end up in the request as is when it's
+        prepared (e.g. they contain a variable or the action field) or that
+        requests would reject, aren't encoded.
+
+        :param payload: Payload to put in the slot; payload files are read
+            as bytes on Python 3, and decoded as UTF-8 here
+        :type payload: str or bytes
+        :rtype: bytes
+        :returns: The encoded payload, or None if it can't be spliced into
+            the template
+        """
+        if isinstance(payload, six.binary_type) and not six.PY2:
+            try:
+                payload = payload.decode("utf-8")
+            except UnicodeError:
+                return None
+        if not isinstance(payload, str):
+            return None
+        if self.action_field and self.action_field in payload:
+            return None
+        for name in list(_iterators) + list(_string_var_objs):
+            if name in payload:
+                return None
+        try:
+            if self.location == JSON:
+                payload = json.dumps(payload)[1:-1]
+            elif self.location == QUERY:
+                payload = requests_utils.requote_uri(
+                    RequestEncodingMixin._encode_params(
+                        [("k", payload)])[2:])
+            elif self.location == HEADER:
+                requests_utils.check_header_validity(("X-Slot", payload))
+            return payload.encode(self.charset)
+        except (ValueError, TypeError, UnicodeError, rex.RequestException):
+            return None
+
+    def send(self, data, timeout=None, stop_on=None):
+        """Sends the request with `data` in the slot, and reads the response
+
+        The response body is read, and decoded, chunk by chunk by a
+        :class:`syntribos.clients.http.body.BodyReader`.
+
+        :param bytes data: Payload encoded by :func:`splice`
+        :param float timeout: Seconds to wait for the connection and for
+            each read
+        :param list stop_on: Strings to stop reading the body at
+        :rtype: :class:`requests.Response`
+        """
+        if len(self.pieces) == 4:
+            head, end, before, after = self.pieces
+            length = str(len(before) + len(data) + len(after))
+            buffers = (head, length.encode("ascii"), end, before, data,
+                       after)
+        else:
+            length = None
+            before, after = self.pieces
+            buffers = (before, data, after)
+        request = self._prepare(data, length)
+
+        pool = get_pool()
+        key = "{0}:{1}".format(self.host, self.port)
+        sock = pool.get(self, timeout, request)
+        while True:
+            reused = sock.reused
+            timing = sock.opened or Timing()
+            sock.opened = None
+            start = clock()
+            try:
+                _send_buffers(sock, buffers)
+                sent = clock()
+                resp = http_client.HTTPResponse(sock, method=request.method)
+                resp.begin()
+            except socket.timeout:
+                sock.close()
+                raise rex.ReadTimeout(
+                    "Read from {0} timed out. (read timeout={1})".format(
+                        key, timeout), request=request)
+            except ssl.SSLError as exc:
+                sock.close()
+                raise rex.SSLError(exc, request=request)
+            except (socket.error, http_client.HTTPException) as exc:
+                sock.close()
+                if reused:
+                    # The server closed the connection while it was idle
+                    sock = pool.connect(self, timeout, request)
+                    continue
+                raise rex.ConnectionError(exc, request=request)
+            break
+        end = clock()
+        timing.send = sent - start
+        timing.ttfb = end - sent
+        if not reused:
+            tls.save_session(sock.sock)
+
+        headers = CaseInsensitiveDict()
+        for name, value in resp.msg.items():
+            if name in headers:
+                headers[name] = "{0}, {1}".format(headers[name], value)
+            else:
+                headers[name] = value
+        response = requests.Response()
+        response.status_code = resp.status
+        response.reason = resp.reason
+        response.headers = headers
+        response.encoding = requests_utils.get_encoding_from_headers(headers)
+        response.url = request.url
+        response.request = request
+        response.elapsed = datetime.timedelta(seconds=(end - start) / 1e9)
+        response.timing = timing
+        extract_cookies_to_jar(response.cookies, request,
+                               CookieSource(resp.msg))
+
+        decoder = ContentDecoder(headers.get("Content-Encoding", ""), request)
+        try:
+            reader = BodyReader(stop_on)
+            complete = True
+            for data in iter(lambda: resp.read(CHUNK_SIZE), b""):
+                if reader.feed(decoder.decode(data)):
+                    complete = False
+                    break
+            if complete:
+                reader.feed(decoder.flush())
+            complete = reader.finish(response)
+            timing.transfer = clock() - end
+        except socket.timeout:
+            sock.close()
+            raise rex.ReadTimeout(
+                "Read from {0} timed out. (read timeout={1})".format(
+                    key, timeout), request=request)
+        except (socket.error, http_client.HTTPException) as exc:
+            sock.close()
+            raise rex.ConnectionError(exc, request=request)
+        except Exception:
+            sock.close()
+            raise
+        # The rest of an unread body would be read by the next request
+        if complete and not resp.will_close:
+            pool.put(self, sock)
+        else:
+            sock.close()
+        return response
+
+    def _prepare(self, data, length=None):
+        """Returns the prepared request with `data` in the slot, as sent."""
+        # A copy keeps the session's cookies, for following redirects
+        prepared = self.prepared.copy()
+        text = data.decode(self.charset)
+        if self.location == QUERY:
+            prepared.url = prepared.url.replace(SLOT, text)
+        elif self.location == HEADER:
+            for name, value in prepared.headers.items():
+                if value == SLOT:
+                    prepared.headers[name] = text
+        else:
+            if isinstance(prepared.body, six.binary_type):
+                prepared.body = prepared.body.replace(
+                    SLOT.encode("ascii"), data)
+            else:
+                prepared.body = prepared.body.replace(SLOT, text)
+            prepared.headers["Content-Length"] = length
+        return prepared
+
+
+def _send_buffers(sock, buffers):
+    """Sends `buffers` in as few system calls as possible
+
+    Plain sockets send them with ``sendmsg`` (scatter/gather), so the pieces
+    of a template are never copied into a single buffer.
+    """
+    if isinstance(sock.sock, ssl.SSLSocket) or not hasattr(
+            sock.sock, "sendmsg"):
+        sock.sock.sendall(b"".join(buffers))
+        return
+    views = [memoryview(buf) for buf in buffers if buf]
+    while views:
+        sent = sock.sock.sendmsg(views)
+        while views and sent >= len(views[0]):
+            sent -= len(views.pop(0))
+        if sent:
+            views[0] = views[0][sent:]
+
+
+class _PooledSocket(object):
+    """A socket, whether it was reused from a pool, and the
+    :class:`syntribos.clients.http.timing.Timing` of opening it (until the
+    first request sent over it takes it)
+    """
+
+    __slots__ = ("sock", "reused", "opened")
+
+    def __init__(self, sock, reused=False, opened=None):
+        self.sock = sock
+        self.reused = reused
+        self.opened = opened
+
+    def makefile(self, *args, **kwargs):
+        return self.sock.makefile(*args, **kwargs)
+
+    def close(self):
+        self.sock.close()
+
+
+class SocketPool(object):
+    """Idle keep-alive sockets, by host
+
+    Up to ``pool_maxsize`` (or the host's ``host_pool_maxsizes``) idle
+    sockets are kept for each host.
+    """
+
+    def __init__(self):
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, template, timeout, request):
+        """Returns an idle socket to the template's host, or a new one
+
+        :rtype: :class:`_PooledSocket`
+        """
+        key = (template.scheme, template.host, template.port)
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                sock = idle.pop() if idle else None
+            if sock is None:
+                return self.connect(template, timeout, request)
+            # Drop sockets the server closed (or sent data on) while idle
+            if wait_for_read(sock.sock, timeout=0.0):
+                sock.close()
+                continue
+            sock.sock.settimeout(timeout)
+            sock.reused = True
+            stats.increment("Connection pool hits ({0}:{1})".format(
+                template.host, template.port))
+            return sock
+
+    def connect(self, template, timeout, request):
+        """Opens a new socket to the template's host
+
+        :rtype: :class:`_PooledSocket`
+        """
+        stats.increment("Connection pool misses ({0}:{1})".format(
+            template.host, template.port))
+        opened = Timing()
+        try:
+            start = clock()
+            addresses = resolver.getaddrinfo(
+                template.host, template.port, 0, socket.SOCK_STREAM)
+            opened.dns = clock() - start
+            start = clock()
+            for index, address in enumerate(addresses):
+                try:
+                    sock = socket.create_connection(address[4][:2], timeout)
+                    break
+                except socket.error:
+                    if index == len(addresses) - 1:
+                        raise
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            opened.connect = clock() - start
+            if template.scheme == "https":
+                start = clock()
+                sock = tls.get_context().wrap_socket(
+                    sock, server_hostname=template.host)
+                opened.tls = clock() - start
+        except socket.timeout:
+            raise rex.ConnectTimeout(
+                "Connection to {0}:{1} timed out. (connect timeout={2})"
+                "".format(template.host, template.port, timeout),
+                request=request)
+        except ssl.SSLError as exc:
+            raise rex.SSLError(exc, request=request)
+        except socket.error as exc:
+            raise rex.ConnectionError(exc, request=request)
+        return _PooledSocket(sock, opened=opened)
+
+    def put(self, template, sock):
+        """Keeps `sock` for later requests, if the pool isn't full."""
+        key = (template.scheme, template.host, template.port)
+        maxsize = int(CONF.syntribos.host_pool_maxsizes.get(
+            template.host, CONF.syntribos.pool_maxsize))
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < maxsize:
+                idle.append(sock)
+                return
+        sock.close()
+
+
+def get_pool():
+    """Returns the :class:`SocketPool` for the current process
+
+    Sockets shouldn't be shared with a forked process, so a process forked
+    after the pool was created (e.g. by ``--processes``) gets a new one.
+    """
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = SocketPool()
+            _pool_pid = os.getpid()
+    return _pool
@@ -61,6 +61,7 @@ user_group = cfg.OptGroup(name="user", title="Identity Config")
 test_group = cfg.OptGroup(name="test", title="Test Config")
 logger_group = cfg.OptGroup(name="logging", title="Logger config")
 remote_group = cfg.OptGroup(name="remote", title="Remote config")
+bench_group = cfg.OptGroup(name="bench", title="Benchmark config")
 rax_payment_system_group = cfg.OptGroup(name='rax_payment_system',
                                         title='Payment System API')
 
@@ -104,12 +105,26 @@ def sub_commands(sub_parser):
 
     sub_parser.add_parser("list_tests",
                           help=_("List all available tests"))
-    sub_parser.add_parser("run",
-                          help=_("Run syntribos with given config"
-                                 "options"))
+    run_parser = sub_parser.add_parser(
+        "run",
+        help=_("Run syntribos with given config"
+               "options"))
+    journal_group = run_parser.add_mutually_exclusive_group()
+    journal_group.add_argument(
+        "--journal", dest="journal", metavar="PATH",
+        help=_("Record each completed test case to a new journal file, so "
+               "the run can be resumed with --resume if it is interrupted"))
+    journal_group.add_argument(
+        "--resume", dest="resume", metavar="PATH",
+        help=_("Resume a run from its journal file, skipping the test cases "
+               "it records as completed and reporting their results along "
+               "with the rest"))
     sub_parser.add_parser("dry_run",
                           help=_("Dry run syntribos with given config"
                                  "options"))
+    sub_parser.add_parser("bench",
+                          help=_("Run syntribos against a local benchmark "
+                                 "server and report its throughput"))
 
 
 def list_opts():
@@ -120,6 +135,7 @@ def list_opts():
     results.append((test_group, list_test_opts()))
     results.append((logger_group, list_logger_opts()))
     results.append((remote_group, list_remote_opts()))
+    results.append((bench_group, list_bench_opts()))
     return results
 
 
@@ -143,6 +159,9 @@ def register_opts():
         # Remote options
         CONF.register_group(remote_group)
         CONF.register_opts(list_remote_opts(), group=remote_group)
+        # Benchmark options
+        CONF.register_group(bench_group)
+        CONF.register_cli_opts(list_bench_opts(), group=bench_group)
         # Payment System options
         CONF.register_group(rax_payment_system_group)
         CONF.register_opts(list_payment_system_opts(),
@@ -186,7 +205,14 @@ def list_cli_opts():
         cfg.StrOpt("min-confidence", dest="min_confidence", short="C",
                    default="LOW", choices=syntribos.RANKING,
                    help=_("Select a minimum confidence for reported "
-                          "defects"))
+                          "defects")),
+        cfg.IntOpt("workers", dest="workers", short="w", default=1, min=1,
+                   help=_("Number of test cases from a single test type "
+                          "to run concurrently")),
+        cfg.IntOpt("processes", dest="processes", short="p", default=1,
+                   min=1,
+                   help=_("Number of processes to split template files "
+                          "across"))
     ]
 
 
@@ -235,6 +261,96 @@ def list_syntribos_opts():
                    help=_(
                        "The path to a meta variable definitions file, which "
                        "will be used when parsing your templates")),
+        cfg.StrOpt("transport", default="sync",
+                   choices=["sync", "asyncio", "http2"],
+                   help=_(
+                       "How requests are sent: 'sync' sends them with the "
+                       "requests library, 'asyncio' sends them from an "
+                       "asyncio event loop, and 'http2' sends them as "
+                       "HTTP/2 streams from an asyncio event loop (both "
+                       "require Python 3.5+, and 'http2' the h2 package)")),
+        cfg.IntOpt("http2_max_streams", default=100, min=1,
+                   help=_(
+                       "Most requests in flight at once over each HTTP/2 "
+                       "connection (the server may allow fewer)")),
+        cfg.BoolOpt("adaptive_concurrency", default=False,
+                    help=_(
+                        "Adapt the number of requests in flight to each "
+                        "host, backing off when responses show the host is "
+                        "overloaded (5XX status codes, timeouts or 429s)")),
+        cfg.IntOpt("initial_concurrency", min=1,
+                   help=_(
+                       "Number of requests allowed in flight to each host "
+                       "before adapting to its responses (defaults to the "
+                       "number of workers)")),
+        cfg.IntOpt("max_concurrency", default=64, min=1,
+                   help=_(
+                       "Most requests ever allowed in flight to each host")),
+        cfg.IntOpt("max_retry_after", default=30, min=0,
+                   help=_(
+                       "Longest delay, in seconds, to honor when a host "
+                       "responds with a Retry-After header")),
+        cfg.FloatOpt("rate_limit", default=0, min=0,
+                     help=_(
+                         "Most requests per second to send to each host "
+                         "(0 means no limit)")),
+        cfg.IntOpt("rate_burst", default=1, min=1,
+                   help=_(
+                       "Requests that may be sent to a host at once, after "
+                       "a quiet period, despite the rate limit")),
+        cfg.DictOpt("host_rate_limits", default={},
+                    help=_(
+                        "Per host overrides of rate_limit, as a comma "
+                        "separated list of host:rate pairs")),
+        cfg.DictOpt("host_rate_bursts", default={},
+                    help=_(
+                        "Per host overrides of rate_burst, as a comma "
+                        "separated list of host:burst pairs")),
+        cfg.IntOpt("pool_maxsize", default=10, min=1,
+                   help=_(
+                       "Number of connections to each host kept open for "
+                       "reuse between requests")),
+        cfg.DictOpt("host_pool_maxsizes", default={},
+                    help=_(
+                        "Per host overrides of pool_maxsize, as a comma "
+                        "separated list of host:size pairs")),
+        cfg.IntOpt("pool_prewarm", default=0, min=0,
+                   help=_(
+                       "Number of connections to the endpoint to open "
+                       "before the run starts (sends a HEAD request over "
+                       "each one)")),
+        cfg.IntOpt("max_response_size", default=16 * 1024 * 1024, min=0,
+                   help=_(
+                       "Most bytes of each response body to read; the rest "
+                       "of the body is discarded (0 means no limit)")),
+        cfg.BoolOpt("wire_templates", default=False,
+                    help=_(
+                        "Serialize each fuzzed request template once, and "
+                        "send fuzz test cases by splicing their payload into "
+                        "it (only used with the sync transport)")),
+        cfg.StrOpt("cassette",
+                   help=_(
+                       "Path of a cassette file to record each request and "
+                       "response to, or to replay responses from (see "
+                       "cassette_mode)")),
+        cfg.StrOpt("cassette_mode", default="record",
+                   choices=["record", "replay"],
+                   help=_(
+                       "Whether to record responses to the cassette, or to "
+                       "replay them from it instead of sending requests")),
+        cfg.IntOpt("dns_cache_ttl", default=60, min=0,
+                   help=_(
+                       "Number of seconds the resolved addresses of each "
+                       "host are reused for by new connections (0 means "
+                       "resolve each time)")),
+        cfg.BoolOpt("dns_pin", default=False,
+                    help=_(
+                        "Connect to a single resolved address of each host "
+                        "for as long as it resolves to it")),
+        cfg.BoolOpt("tls_resumption", default=True,
+                    help=_(
+                        "Resume the TLS session of an earlier connection to "
+                        "the same host when opening a new connection")),
     ]
 
 
@@ -294,6 +410,25 @@ def list_test_opts():
         cfg.IntOpt("max_length", default=500,
                    help=_(
                        "Maximum length (in characters) of the response text")),
+        cfg.IntOpt("baseline_samples", default=1, min=1,
+                   help=_(
+                       "Number of times to send the baseline request for "
+                       "each template; the response with the median "
+                       "response time is used")),
+        cfg.StrOpt("timing_basis", default="elapsed",
+                   choices=["elapsed", "ttfb"],
+                   help=_(
+                       "Response time used by the time checks: the time "
+                       "until the response headers are received (elapsed), "
+                       "or only the time to first byte once the request was "
+                       "sent (ttfb), which leaves out connection setup")),
+        cfg.IntOpt("timing_confirmations", default=0, min=0,
+                   help=_(
+                       "Number of times to send the baseline request and "
+                       "then the fuzzed request again when the fuzzed "
+                       "request took too long, before a timing issue is "
+                       "registered; the fuzzed request must take too long "
+                       "every time")),
         cfg.ListOpt("failure_keys", default="[`syntax error`]",
                     help=_(
                         "Comma seperated list of keys for which the test "
@@ -337,3 +472,35 @@ def list_remote_opts():
                     help=_(
                         "Cache remote template & payload resources locally")),
     ]
+
+
+def list_bench_opts():
+    """Method defining the local server run against by ``bench``."""
+    return [
+        cfg.StrOpt("templates",
+                   help=_(
+                       "Directory of templates to benchmark with (defaults "
+                       "to the templates bundled with syntribos)")),
+        cfg.FloatOpt("latency", default=0.002, min=0,
+                     help=_("Mean delay of the server's responses, in "
+                            "seconds")),
+        cfg.StrOpt("latency_distribution", default="exponential",
+                   choices=["constant", "uniform", "exponential"],
+                   help=_("Distribution of the server's response delays")),
+        cfg.IntOpt("body_size", default=1024, min=0,
+                   help=_("Size to pad response bodies to, in bytes")),
+        cfg.FloatOpt("error_rate", default=0.01, min=0, max=1,
+                     help=_("Fraction of requests answered with a 503")),
+        cfg.BoolOpt("vulnerable", default=True,
+                    help=_(
+                        "Echo payloads, and answer some with SQL errors, "
+                        "stacktraces, slow responses or 500 errors")),
+        cfg.IntOpt("long_input", default=2048, min=0,
+                   help=_("Length of requests answered with a 500 error, "
+                          "if vulnerable")),
+        cfg.FloatOpt("slow_delay", default=0.05, min=0,
+                     help=_("Extra delay of responses to ReDoS payloads, "
+                            "if vulnerable")),
+        cfg.IntOpt("seed", default=0,
+                   help=_("Seed of the server's random delays and errors"))
+    ]
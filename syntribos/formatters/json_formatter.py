@@ -31,4 +31,7 @@ class SetEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, set):
             return list(obj)
+        # Payloads are read as bytes on Python 3
+        if isinstance(obj, bytes):
+            return obj.decode("utf-8", "replace")
         return json.JSONEncoder.default(self, obj)
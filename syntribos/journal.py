@@ -0,0 +1,212 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Append-only journal of completed test cases, used to resume a run
+
+Each line of the journal is a JSON object recording either a completed test
+case (its template, test name, position and name, along with its results as
+returned by :func:`syntribos.result.IssueTestResult.get_shard`) or that every
+test case of a test has been run against a template. Each record is written
+with a single ``write`` to a file opened with ``O_APPEND``, so records from
+several processes don't interleave, and a run killed part way through at
+worst leaves a truncated last line, which is ignored when the journal is
+loaded.
+"""
+import json
+import os
+import threading
+import unittest
+
+
+class Journal(object):
+    """Records completed test cases to, and loads them from, a journal file
+
+    :ivar str path: Path of the journal file
+    """
+
+    def __init__(self, path, resume=False):
+        """Opens the journal at `path`
+
+        :param str path: Path of the journal file
+        :param bool resume: If True, load the records already in the journal
+            and append to it, otherwise start a new, empty journal
+        """
+        self.path = path
+        self._cases = {}
+        self._finished = set()
+        self._partial = False
+        self._fd = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if resume:
+            self._load()
+        else:
+            open(path, "w").close()
+
+    def _load(self):
+        with open(self.path, "rb") as journal_file:
+            content = journal_file.read()
+        # The last record may have been cut short by a crash
+        self._partial = bool(content) and not content.endswith(b"\n")
+        for line in content.splitlines():
+            try:
+                record = json.loads(line.decode("utf-8"))
+            except ValueError:
+                continue
+            key = (record["template"], record["test"])
+            if record.get("finished"):
+                self._finished.add(key)
+            else:
+                self._cases[key + (record["index"], record["case"])] = (
+                    _load_shard(record["shard"]))
+
+    def _append(self, record):
+        line = json.dumps(record, default=sorted) + "\n"
+        if self._partial:
+            # Terminate the truncated record so this one can be read back
+            line = "\n" + line
+        with self._lock:
+            # A file descriptor inherited over fork shares its offset, which
+            # is harmless with O_APPEND, but open our own all the same
+            if self._fd is None or self._pid != os.getpid():
+                self._fd = os.open(
+                    self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                self._pid = os.getpid()
+            os.write(self._fd, line.encode("utf-8"))
+            self._partial = False
+
+    def record_case(self, template, test_name, index, case_name, shard):
+        """Records the results of a completed test case
+
+        :param str template: Path of the template file
+        :param str test_name: Name of the test (e.g. ``SQL_INJECTION_BODY``)
+        :param int index: Position of the test case among the test's cases
+        :param str case_name: Name of the test case class
+        :param dict shard: The test case's results, as returned by
+            :func:`syntribos.result.IssueTestResult.get_shard`
+        """
+        self._append({"template": template, "test": test_name,
+                      "index": index, "case": case_name, "shard": shard})
+
+    def record_finished(self, template, test_name):
+        """Records that every test case of a test has been run on a template
+
+        :param str template: Path of the template file
+        :param str test_name: Name of the test
+        """
+        self._append({"template": template, "test": test_name,
+                      "finished": True})
+
+    def get_case(self, template, test_name, index, case_name):
+        """Returns the recorded results of a test case, or None if not run
+
+        :rtype: dict
+        """
+        return self._cases.get((template, test_name, index, case_name))
+
+    def get_cases(self, template, test_name):
+        """Returns the recorded results of a test's cases, in order
+
+        :rtype: list
+        """
+        keys = sorted(k for k in self._cases if k[:2] == (template, test_name))
+        return [self._cases[k] for k in keys]
+
+    def is_finished(self, template, test_name):
+        """Returns True if every case of a test was run against a template
+
+        :rtype: bool
+        """
+        return (template, test_name) in self._finished
+
+
+def _load_shard(shard):
+    """Restores the sets in a shard's failure instances after JSON decoding
+
+    :param dict shard: Shard as decoded from the journal
+    :rtype: dict
+    """
+    for failure in shard["failures"]:
+        for instance in failure["instances"]:
+            if "param" in instance:
+                instance["strings"] = set(instance["strings"])
+                instance["param"]["variables"] = set(
+                    instance["param"]["variables"])
+            for sig_type in instance["signals"]:
+                instance["signals"][sig_type] = set(
+                    instance["signals"][sig_type])
+    return shard
+
+
+class JournalingTestResult(unittest.TestResult):
+    """Test result that records each test case to a journal
+
+    Outcomes are passed on to the wrapped result as they happen; once a test
+    case stops, the results it added are recorded to the journal as a shard
+    that :func:`syntribos.result.IssueTestResult.merge_shard` can replay.
+    """
+
+    def __init__(self, result, journal, template, test_name, case_keys):
+        """Wraps `result`, recording test cases of a test to `journal`
+
+        :param result: The result object to pass outcomes on to
+        :type result: :class:`syntribos.result.IssueTestResult`
+        :param journal: The journal to record test cases to
+        :type journal: :class:`Journal`
+        :param str template: Path of the template file
+        :param str test_name: Name of the test
+        :param dict case_keys: Maps each test case (as generated by the
+            test's `get_test_cases`) to its (index, name)
+        """
+        super(JournalingTestResult, self).__init__()
+        self.result = result
+        self.journal = journal
+        self.template = template
+        self.test_name = test_name
+        self.case_keys = case_keys
+        self._shard = None
+
+    def startTest(self, test):
+        self.result.startTest(test)
+        self._shard = {"failures": [], "errors": [],
+                       "stats": {"errors": 0, "successes": 0},
+                       "tests_run": 1}
+
+    def stopTest(self, test):
+        self.result.stopTest(test)
+        index, case_name = self.case_keys[test.case or type(test)]
+        self.journal.record_case(self.template, self.test_name, index,
+                                 case_name, self._shard)
+
+    def addError(self, test, err):
+        self.result.addError(test, err)
+        self._shard["errors"].append(self.result.errors[-1])
+        self._shard["stats"]["errors"] += 1
+
+    def addFailure(self, test, err):
+        self.result.addFailure(test, err)
+        for url, defect_type, description, instance in (
+                self.result.get_issues(test)):
+            self._shard["failures"].append({
+                "url": url,
+                "defect_type": defect_type,
+                "description": description,
+                "instances": [instance]
+            })
+
+    def addSuccess(self, test):
+        self.result.addSuccess(test)
+        self._shard["stats"]["successes"] += 1
+
+    def addSkip(self, test, reason):
+        self.result.addSkip(test, reason)
@@ -21,6 +21,7 @@ from syntribos._i18n import _
 from syntribos.formatters.json_formatter import JSONFormatter
 from syntribos.runner import Runner
 import syntribos.utils.remotes
+import syntribos.utils.stats
 
 CONF = cfg.CONF
 
@@ -31,18 +32,21 @@ class IssueTestResult(unittest.TextTestResult):
     This class aggregates :class:`syntribos.issue.Issue` objects from all the
     tests as they run
     """
-    output = {"failures": {}, "errors": [], "stats": {}}
-    output["stats"]["severity"] = {
-        "UNDEFINED": 0,
-        "LOW": 0,
-        "MEDIUM": 0,
-        "HIGH": 0
-    }
-    stats = {"errors": 0, "failures": 0, "successes": 0}
     severity_counter_dict = {}
     testsRunSinceLastPrint = 0
     failure_id = 0
 
+    def __init__(self, *args, **kwargs):
+        super(IssueTestResult, self).__init__(*args, **kwargs)
+        self.output = {"failures": {}, "errors": [], "stats": {}}
+        self.output["stats"]["severity"] = {
+            "UNDEFINED": 0,
+            "LOW": 0,
+            "MEDIUM": 0,
+            "HIGH": 0
+        }
+        self.stats = {"errors": 0, "failures": 0, "successes": 0}
+
     def addFailure(self, test, err):
         """Adds issues to data structures
 
@@ -84,6 +88,22 @@ class IssueTestResult(unittest.TextTestResult):
         :type test: :class:`syntribos.tests.base.BaseTestCase`
         :param tuple err: Tuple of format ``(type, value, traceback)``
         """
+        for url, defect_type, description, instance in self.get_issues(test):
+            failure_obj = self._get_failure(url, defect_type, description)
+            self._add_instance(failure_obj, instance)
+
+    def get_issues(self, test):
+        """Yields the reportable issues registered by a failed test
+
+        Issues excluded by ``exclude_results``, ``min_severity`` or
+        ``min_confidence`` are left out.
+
+        :param test: The test that has failed
+        :type test: :class:`syntribos.tests.base.BaseTestCase`
+        :returns: Generator of (url, defect type, description, instance)
+            tuples, where each instance takes the form shown in
+            :func:`addFailure`
+        """
         for issue in test.failures:
             defect_type = issue.defect_type
             if any([
@@ -100,24 +120,6 @@ class IssueTestResult(unittest.TextTestResult):
             target = issue.target
             path = issue.path
             url = "{0}{1}".format(target, path)
-            description = issue.description
-            failure_obj = None
-
-            for f in self.failures:
-                if (f["url"] == url and f["defect_type"] == defect_type and
-                        f["description"] == description):
-                    failure_obj = f
-                    break
-            if not failure_obj:
-                failure_obj = {
-                    "url": url,
-                    "defect_type": defect_type,
-                    "description": description,
-                    "failure_id": self.failure_id,
-                    "instances": []
-                }
-                self.failures.append(failure_obj)
-                self.failure_id += 1
 
             signals = {}
             if issue.init_signals:
@@ -142,62 +144,116 @@ class IssueTestResult(unittest.TextTestResult):
                 param = {
                     "method": method,
                     "location": loc,
+                    "variables": set([name])
                 }
                 if loc == "data":
                     param["type"] = content_type
 
-                instance_obj = None
-                for i in failure_obj["instances"]:
-                    if (i["confidence"] == conf_rating and
-                            i["severity"] == sev_rating and
-                            i["param"]["method"] == method and
-                            i["param"]["location"] == loc):
-
-                        i["param"]["variables"].add(name)
-                        for sig_type in signals:
-                            if sig_type in i["signals"]:
-                                i["signals"][sig_type].update(signals[
-                                    sig_type])
-                            else:
-                                i["signals"][sig_type] = signals[sig_type]
-                        i["strings"].add(payload_string)
-                        instance_obj = i
-                        break
-
-                if not instance_obj:
-                    param["variables"] = set([name])
-                    instance_obj = {
-                        "confidence": conf_rating,
-                        "severity": sev_rating,
-                        "param": param,
-                        "strings": set([payload_string]),
-                        "signals": signals
-                    }
-                    failure_obj["instances"].append(instance_obj)
-                    self.stats["failures"] += 1
-                    self.output["stats"]["severity"][sev_rating] += 1
+                yield url, defect_type, issue.description, {
+                    "confidence": conf_rating,
+                    "severity": sev_rating,
+                    "param": param,
+                    "strings": set([payload_string]),
+                    "signals": signals
+                }
             else:
-                instance_obj = None
-                for i in failure_obj["instances"]:
-                    if (i["confidence"] == conf_rating and
-                            i["severity"] == sev_rating):
-                        for sig_type in signals:
-                            if sig_type in i["signals"]:
-                                i["signals"][sig_type].update(signals[
-                                    sig_type])
-                            else:
-                                i["signals"][sig_type] = signals[sig_type]
-                        instance_obj = i
-                        break
-                if not instance_obj:
-                    instance_obj = {
-                        "confidence": conf_rating,
-                        "severity": sev_rating,
-                        "signals": signals
-                    }
-                    failure_obj["instances"].append(instance_obj)
-                    self.stats["failures"] += 1
-                    self.output["stats"]["severity"][sev_rating] += 1
+                yield url, defect_type, issue.description, {
+                    "confidence": conf_rating,
+                    "severity": sev_rating,
+                    "signals": signals
+                }
+
+    def _get_failure(self, url, defect_type, description):
+        """Returns the failure matching the given details, adding it if new
+
+        :param str url: URL the defect was found at
+        :param str defect_type: Type of the defect (e.g. "500_errors")
+        :param str description: Description of the defect
+        :rtype: dict
+        """
+        for f in self.failures:
+            if (f["url"] == url and f["defect_type"] == defect_type and
+                    f["description"] == description):
+                return f
+        failure_obj = {
+            "url": url,
+            "defect_type": defect_type,
+            "description": description,
+            "failure_id": self.failure_id,
+            "instances": []
+        }
+        self.failures.append(failure_obj)
+        self.failure_id += 1
+        return failure_obj
+
+    def _add_instance(self, failure_obj, instance):
+        """Merges an instance into a failure's matching instance, if any
+
+        Instances match if they share a confidence and severity, and (for
+        fuzz tests) the method and location of the impacted parameter. If no
+        instance matches, `instance` is added to the failure and counted.
+
+        :param dict failure_obj: Failure to add the instance to
+        :param dict instance: Instance to add, in the form shown in
+            :func:`addFailure`
+        """
+        param = instance.get("param")
+        for i in failure_obj["instances"]:
+            if (i["confidence"] != instance["confidence"] or
+                    i["severity"] != instance["severity"]):
+                continue
+            if param:
+                if (i["param"]["method"] != param["method"] or
+                        i["param"]["location"] != param["location"]):
+                    continue
+                i["param"]["variables"].update(param["variables"])
+                i["strings"].update(instance["strings"])
+            for sig_type in instance["signals"]:
+                if sig_type in i["signals"]:
+                    i["signals"][sig_type].update(
+                        instance["signals"][sig_type])
+                else:
+                    i["signals"][sig_type] = instance["signals"][sig_type]
+            return
+        failure_obj["instances"].append(instance)
+        self.stats["failures"] += 1
+        self.output["stats"]["severity"][instance["severity"]] += 1
+
+    def get_shard(self):
+        """Returns the results gathered so far as a picklable dict
+
+        This is used to send results from a worker process (see
+        ``--processes``) back to the parent, which combines them with
+        :func:`merge_shard`.
+
+        :rtype: dict
+        """
+        return {
+            "failures": self.failures,
+            "errors": self.errors,
+            "stats": self.stats,
+            "tests_run": self.testsRun
+        }
+
+    def merge_shard(self, shard):
+        """Adds the results from a shard returned by :func:`get_shard`
+
+        Failures and instances are combined as if each issue in the shard had
+        been added to this result directly; failures new to this result are
+        given a new `failure_id`.
+
+        :param dict shard: Results returned by :func:`get_shard`
+        """
+        for failure in shard["failures"]:
+            failure_obj = self._get_failure(failure["url"],
+                                            failure["defect_type"],
+                                            failure["description"])
+            for instance in failure["instances"]:
+                self._add_instance(failure_obj, instance)
+        self.errors.extend(shard["errors"])
+        self.stats["errors"] += shard["stats"]["errors"]
+        self.stats["successes"] += shard["stats"]["successes"]
+        self.testsRun += shard["tests_run"]
 
     def addError(self, test, err):
         """Duplicates parent class addError functionality.
@@ -253,7 +309,58 @@ class IssueTestResult(unittest.TextTestResult):
             e=num_err,
             fsuff="s" * bool(num_fail - 1),
             esuff="s" * bool(num_err - 1)))
+        summary = syntribos.utils.stats.get_summary()
+        if summary:
+            print(syntribos.SEP)
+            for name, value in summary:
+                print("{0}: {1}".format(name, value))
         if test_log:
             print(syntribos.SEP)
             print(_("LOG PATH...: %s") % test_log)
             print(syntribos.SEP)
+
+
+class RecordingTestResult(unittest.TestResult):
+    """Test result that records outcomes so they can be replayed later
+
+    This lets a test run off of the main thread without touching the shared
+    :class:`IssueTestResult`; once the test finishes, :func:`replay` feeds the
+    recorded outcomes into the real result in the order they happened.
+    """
+
+    def __init__(self):
+        super(RecordingTestResult, self).__init__()
+        self.events = []
+
+    def startTest(self, test):
+        self.events.append(("startTest", (test, )))
+
+    def stopTest(self, test):
+        self.events.append(("stopTest", (test, )))
+
+    def addError(self, test, err):
+        self.events.append(("addError", (test, err)))
+
+    def addFailure(self, test, err):
+        self.events.append(("addFailure", (test, err)))
+
+    def addSuccess(self, test):
+        self.events.append(("addSuccess", (test, )))
+
+    def addSkip(self, test, reason):
+        self.events.append(("addSkip", (test, reason)))
+
+    def addExpectedFailure(self, test, err):
+        self.events.append(("addExpectedFailure", (test, err)))
+
+    def addUnexpectedSuccess(self, test):
+        self.events.append(("addUnexpectedSuccess", (test, )))
+
+    def replay(self, result):
+        """Feeds each recorded outcome into `result`
+
+        :param result: The result object to replay events into
+        :type result: :class:`IssueTestResult`
+        """
+        for method, args in self.events:
+            getattr(result, method)(*args)
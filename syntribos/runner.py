@@ -11,29 +11,41 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import collections
+from concurrent import futures
+import itertools
 import json
 import logging
+import multiprocessing
 import os
 import pkgutil
+import signal
 import sys
 import time
 import traceback
 import unittest
 
 from oslo_config import cfg
+import six
 from six.moves import input
 
+from syntribos.bench import benchmark
+from syntribos.clients.http import cassette
+from syntribos.clients.http import session
 import syntribos.config
 from syntribos.formatters.json_formatter import JSONFormatter
 from syntribos._i18n import _, _LW, _LE   # noqa
+import syntribos.journal
 import syntribos.result
 import syntribos.tests as tests
 import syntribos.tests.base
+from syntribos.tests.fuzz.base_fuzz import FuzzCase
 from syntribos.utils import cleanup
 from syntribos.utils import cli as cli
 from syntribos.utils import env as ENV
 from syntribos.utils.file_utils import ContentType
 from syntribos.utils import remotes
+from syntribos.utils import stats
 
 result = None
 user_base_dir = None
@@ -51,6 +63,7 @@ class Runner(object):
 
     log_path = ""
     current_test_id = 1000
+    journal = None
 
     @classmethod
     def list_tests(cls):
@@ -159,6 +172,47 @@ class Runner(object):
         else:
             cls.output = sys.stdout
 
+    @classmethod
+    def setup_journal(cls, resume=False):
+        """Opens the journal given by ``--journal`` or ``--resume``, if any
+
+        :param bool resume: Load and append to the journal even if it was
+            given by ``--journal`` (e.g. in a worker process)
+        """
+        path = CONF.sub_command.resume or CONF.sub_command.journal
+        if not path:
+            return
+        resume = resume or bool(CONF.sub_command.resume)
+        try:
+            cls.journal = syntribos.journal.Journal(path, resume=resume)
+        except (IOError, OSError) as exc:
+            print(_("Not able to open journal `%(path)s` (%(err)s), "
+                    "exiting...") % {"path": path, "err": exc})
+            exit(1)
+
+    @classmethod
+    def setup_cassette(cls):
+        """Starts recording to, or loads, the cassette given by ``cassette``"""
+        if not CONF.syntribos.cassette:
+            return
+        try:
+            cassette.start()
+            cassette.get_cassette()
+        except (IOError, OSError) as exc:
+            print(_("Not able to open cassette `%(path)s` (%(err)s), "
+                    "exiting...") % {"path": CONF.syntribos.cassette,
+                                     "err": exc})
+            exit(1)
+
+    @classmethod
+    def prewarm_connections(cls):
+        """Opens ``pool_prewarm`` connections to the endpoint, if set"""
+        if cassette.is_replaying():
+            return
+        if CONF.syntribos.pool_prewarm and CONF.syntribos.endpoint:
+            session.prewarm(CONF.syntribos.endpoint,
+                            CONF.syntribos.pool_prewarm)
+
     @classmethod
     def get_meta_vars(cls, file_path):
         """Creates the appropriate meta_var dict for the given file path
@@ -228,6 +282,9 @@ class Runner(object):
                     " more information about the installation process."))
             exit(1)
 
+        if CONF.sub_command.name == "bench":
+            exit(benchmark.run(sys.argv[1:]))
+
         cls.setup_runtime_env()
 
         decorator = unittest.runner._WritelnDecorator(cls.output)
@@ -235,6 +292,10 @@ class Runner(object):
 
         cls.start_time = time.time()
         if CONF.sub_command.name == "run":
+            cls.setup_journal()
+            cls.setup_cassette()
+            if CONF.processes <= 1:
+                cls.prewarm_connections()
             list_of_tests = list(
                 cls.get_tests(CONF.test_types, CONF.excluded_types))
         elif CONF.sub_command.name == "dry_run":
@@ -266,35 +327,24 @@ class Runner(object):
                 except Exception:
                     print("Unable to parse %s, skipping..." % file_path)
 
-        for file_path, req_str in templates_dir:
-            if "meta.json" in file_path:
-                continue
-            meta_vars = cls.get_meta_vars(file_path)
-            LOG = cls.get_logger(file_path)
-            CONF.log_opt_values(LOG, logging.DEBUG)
-            if not file_path.endswith(".template"):
-                LOG.warning(
-                    _LW('file.....:%s (SKIPPED - not a .template file)'),
-                    file_path)
-                continue
+        templates_dir = [(file_path, req_str)
+                         for file_path, req_str in templates_dir
+                         if "meta.json" not in file_path]
 
-            test_names = [t for (t, i) in list_of_tests]  # noqa
-            log_string = ''.join([
-                '\n{0}\nTEMPLATE FILE\n{0}\n'.format('-' * 12),
-                'file.......: {0}\n'.format(file_path),
-                'tests......: {0}\n'.format(test_names)
-            ])
-            LOG.debug(log_string)
-            print(syntribos.SEP)
-            print("Template File...: {}".format(file_path))
-            print(syntribos.SEP)
-
-            if CONF.sub_command.name == "run":
-                cls.run_given_tests(list_of_tests, file_path,
-                                    req_str, meta_vars)
-            elif CONF.sub_command.name == "dry_run":
-                cls.dry_run(list_of_tests, file_path,
-                            req_str, dry_run_output, meta_vars)
+        if CONF.sub_command.name == "run" and CONF.processes > 1:
+            cls.run_in_processes(list_of_tests, templates_dir)
+        else:
+            for file_path, req_str in templates_dir:
+                meta_vars = cls.get_meta_vars(file_path)
+                if not cls.start_template(list_of_tests, file_path):
+                    continue
+
+                if CONF.sub_command.name == "run":
+                    cls.run_given_tests(list_of_tests, file_path,
+                                        req_str, meta_vars)
+                elif CONF.sub_command.name == "dry_run":
+                    cls.dry_run(list_of_tests, file_path,
+                                req_str, dry_run_output, meta_vars)
 
         if CONF.sub_command.name == "run":
             result.print_result(cls.start_time)
@@ -302,6 +352,76 @@ class Runner(object):
         elif CONF.sub_command.name == "dry_run":
             cls.dry_run_report(dry_run_output)
 
+    @classmethod
+    def start_template(cls, list_of_tests, file_path):
+        """Sets up logging for a template file and prints its header
+
+        :param list list_of_tests: A list of all the loaded tests
+        :param str file_path: Path of the template file
+        :rtype: bool
+        :returns: False if the file should be skipped, True otherwise
+        """
+        LOG = cls.get_logger(file_path)
+        CONF.log_opt_values(LOG, logging.DEBUG)
+        if not file_path.endswith(".template"):
+            LOG.warning(
+                _LW('file.....:%s (SKIPPED - not a .template file)'),
+                file_path)
+            return False
+
+        test_names = [t for (t, i) in list_of_tests]  # noqa
+        log_string = ''.join([
+            '\n{0}\nTEMPLATE FILE\n{0}\n'.format('-' * 12),
+            'file.......: {0}\n'.format(file_path),
+            'tests......: {0}\n'.format(test_names)
+        ])
+        LOG.debug(log_string)
+        print(syntribos.SEP)
+        print("Template File...: {}".format(file_path))
+        print(syntribos.SEP)
+        return True
+
+    @classmethod
+    def run_in_processes(cls, list_of_tests, templates):
+        """Runs the given tests against templates split across processes
+
+        Each template file is run in one of a pool of ``CONF.processes``
+        worker processes, which logs to its own subdirectory of the log path
+        and returns its results as a shard. Shards are merged into `result`
+        in the order of `templates`, and each template's console output is
+        printed once it has finished, so the report matches a serial run.
+
+        :param list list_of_tests: A list of all the loaded tests
+        :param list templates: List of (file path, request string) tuples
+        """
+        units = []
+        first_id = cls.current_test_id
+        for file_path, req_str in templates:
+            units.append((first_id, file_path, req_str,
+                          cls.get_meta_vars(file_path)))
+            # As in a serial run, only template files use up test IDs
+            if file_path.endswith(".template"):
+                first_id += 5 * len(list_of_tests)
+
+        pool = multiprocessing.Pool(
+            processes=CONF.processes, initializer=_init_worker,
+            initargs=(sys.argv[1:], cls.log_path))
+        try:
+            for shard in pool.imap(_run_template, units):
+                sys.stdout.write(shard["console"])
+                sys.stdout.flush()
+                result.merge_shard(shard)
+                stats.merge(shard["summary"])
+            pool.close()
+        except KeyboardInterrupt:
+            pool.terminate()
+            print(_("\n\nExiting..."))
+            result.print_result(cls.start_time)
+            cleanup.delete_temps()
+            exit(0)
+        finally:
+            pool.join()
+
     @classmethod
     def dry_run(cls, list_of_tests, file_path, req_str, output,
                 meta_vars=None):
@@ -367,6 +487,10 @@ class Runner(object):
 
         :return: None
         """
+        syntribos.tests.base.clear_baseline_cache()
+        # Each template uses up the same test IDs, whichever tests run, so
+        # they don't depend on earlier templates (e.g. in other processes)
+        last_id = cls.current_test_id + 5 * len(list_of_tests)
         try:
             template_start_time = time.time()
             failures = 0
@@ -386,6 +510,10 @@ class Runner(object):
                 else:
                     result_string = result_string.ljust(60)
                 LOG.debug(log_string)
+                if (cls.journal is not None and
+                        cls.journal.is_finished(file_path, test_name)):
+                    cls.resume_test(file_path, test_name, result_string)
+                    continue
                 try:
                     test_class.send_init_request(file_path, req_str, meta_vars)
                 except Exception:
@@ -393,6 +521,7 @@ class Runner(object):
                         "Error in parsing template:\n %s\n"
                     ) % traceback.format_exc())
                     LOG.error(_LE("Error in parsing template:"))
+                    cls.current_test_id = last_id
                     break
                 test_cases = list(
                     test_class.get_test_cases(file_path, req_str))
@@ -401,14 +530,21 @@ class Runner(object):
                         message=result_string, total_len=len(test_cases))
                     last_failures = result.stats["failures"]
                     last_errors = result.stats["errors"]
-                    for test in test_cases:
+                    total_tests = len(test_cases)
+                    case_result = result
+                    if cls.journal is not None:
+                        test_cases, case_result = cls.resume_test_cases(
+                            test_cases, file_path, test_name)
+                        p_bar.increment(total_tests - len(test_cases))
+                        p_bar.print_bar()
+                        failures = result.stats["failures"] - last_failures
+                        errors = result.stats["errors"] - last_errors
+                    for test in cls.run_test_cases(test_cases, case_result):
                         if test:
-                            cls.run_test(test, result)
                             p_bar.increment(1)
                         p_bar.print_bar()
                         failures = result.stats["failures"] - last_failures
                         errors = result.stats["errors"] - last_errors
-                        total_tests = len(test_cases)
                         if failures > total_tests * 0.90:
                             # More than 90 percent failure
                             failures = cli.colorize(failures, "red")
@@ -430,6 +566,8 @@ class Runner(object):
                         print(
                             _(
                                 "  : %s Failure(s), 0 Error(s)\r") % failures)
+                if cls.journal is not None:
+                    cls.journal.record_finished(file_path, test_name)
 
             run_time = time.time() - template_start_time
             LOG.info(_("Run time: %s sec."), run_time)
@@ -456,6 +594,142 @@ class Runner(object):
                 print(_("Exiting..."))
                 exit(0)
 
+    @classmethod
+    def resume_test(cls, file_path, test_name, result_string):
+        """Adds a test's results from the journal instead of running it
+
+        :param str file_path: Path of the template file
+        :param str test_name: Name of the test
+        :param str result_string: The test's ID and name, as printed
+        """
+        last_failures = result.stats["failures"]
+        last_errors = result.stats["errors"]
+        for shard in cls.journal.get_cases(file_path, test_name):
+            result.merge_shard(shard)
+        print(_("%(test)s  :  %(fail)s Failure(s), %(err)s Error(s) "
+                "(resumed)\r") % {
+                    "test": result_string,
+                    "fail": result.stats["failures"] - last_failures,
+                    "err": result.stats["errors"] - last_errors})
+
+    @classmethod
+    def resume_test_cases(cls, test_cases, file_path, test_name):
+        """Adds the results of test cases completed in the journal
+
+        :param list test_cases: Test cases generated by a test class
+        :param str file_path: Path of the template file
+        :param str test_name: Name of the test
+        :rtype: tuple
+        :returns: (test cases still to be run, a
+            :class:`syntribos.journal.JournalingTestResult` to run them with)
+        """
+        remaining = []
+        case_keys = {}
+        for index, test in enumerate(test_cases):
+            if not test:
+                continue
+            shard = cls.journal.get_case(file_path, test_name, index,
+                                         test.__name__)
+            if shard is None:
+                remaining.append(test)
+                case_keys[test] = (index, test.__name__)
+            else:
+                result.merge_shard(shard)
+        return remaining, syntribos.journal.JournalingTestResult(
+            result, cls.journal, file_path, test_name, case_keys)
+
+    @classmethod
+    def run_test_cases(cls, test_cases, result):
+        """Runs the given test cases, yielding each one as it completes
+
+        With a single worker, each test case is run in turn. With more, and
+        the asyncio or HTTP/2 transport, their requests are pipelined (see
+        :func:`_pipeline_test_cases`). Otherwise, test cases are run on a
+        pool of ``CONF.workers`` threads, each recording its outcome into
+        its own :class:`syntribos.result.RecordingTestResult`. Those outcomes
+        are replayed into `result` in the original order of `test_cases`, so
+        progress reporting and result stats match a serial run. At most two
+        test cases per worker are queued or recorded at once, so memory
+        doesn't grow with the number of test cases.
+
+        :param list test_cases: Test cases generated by a test class
+        :param result: The result object to append to
+        :type result: :class:`syntribos.result.IssueTestResult`
+        :returns: Generator of test cases, in order, once their results have
+            been added to `result`
+        """
+        if CONF.syntribos.transport != "sync" and CONF.workers > 1:
+            for test in cls._pipeline_test_cases(test_cases, result):
+                yield test
+            return
+        if CONF.workers <= 1:
+            for test in test_cases:
+                if test:
+                    cls.run_test(test, result)
+                yield test
+            return
+
+        executor = futures.ThreadPoolExecutor(max_workers=CONF.workers)
+        window = 2 * CONF.workers
+        cases = iter(test_cases)
+        pending = collections.deque()
+        try:
+            while True:
+                for test in itertools.islice(cases, window - len(pending)):
+                    pending.append((test, executor.submit(
+                        cls._record_test, test) if test else None))
+                if not pending:
+                    break
+                test, future = pending.popleft()
+                if future is not None:
+                    future.result().replay(result)
+                yield test
+        finally:
+            # Don't wait on the queue if we were interrupted (e.g. Ctrl-C)
+            for test, future in pending:
+                if future is not None:
+                    future.cancel()
+            executor.shutdown(wait=False)
+
+    @classmethod
+    def _pipeline_test_cases(cls, test_cases, result):
+        """Runs test cases with their requests sent from the event loop
+
+        With the asyncio or HTTP/2 transport, up to ``CONF.workers`` fuzzed
+        requests are in flight at once, sent without blocking over
+        keep-alive connections. Their checks are run in this thread, in the
+        original order of `test_cases`, as each response arrives. Test cases
+        that aren't fuzz cases are run in turn.
+
+        See :func:`run_test_cases` for the parameters.
+        """
+        cases = iter(test_cases)
+        pending = collections.deque()
+        while True:
+            for test in itertools.islice(
+                    cases, CONF.workers - len(pending)):
+                pending.append((test, test.send() if isinstance(
+                    test, FuzzCase) else None))
+            if not pending:
+                break
+            test, sent = pending.popleft()
+            if sent is not None:
+                test.run(result, sent)
+            elif test:
+                cls.run_test(test, result)
+            yield test
+
+    @classmethod
+    def _record_test(cls, test):
+        """Runs a test, recording its outcome for later replay
+
+        :param test: The test to run
+        :rtype: :class:`syntribos.result.RecordingTestResult`
+        """
+        recorder = syntribos.result.RecordingTestResult()
+        cls.run_test(test, recorder)
+        return recorder
+
     @classmethod
     def run_test(cls, test, result):
         """Create a new test suite, add a test, and run it
@@ -465,11 +739,75 @@ class Runner(object):
         :type result: :class:`syntribos.result.IssueTestResult`
         :param bool dry_run: (OPTIONAL) Only print out test names
         """
+        if isinstance(test, FuzzCase):
+            # Fuzz tests have no class or module fixtures to run, so they
+            # skip the TestSuite and are run by their own executor
+            test.run(result)
+            return
         suite = unittest.TestSuite()
         suite.addTest(test("run_test_case"))
         suite.run(result)
 
 
+def _init_worker(argv, log_path):
+    """Prepares a worker process for :func:`Runner.run_in_processes`
+
+    :param list argv: Command line arguments, to parse config from if the
+        worker does not share the parent's memory (i.e. is spawned)
+    :param str log_path: The parent's log path; each worker logs to its own
+        subdirectory of it
+    """
+    # Ctrl-C is handled by the parent, which terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if not syntribos.config.OPTS_REGISTERED:
+        Runner.setup_config(use_file=True, argv=argv)
+    Runner.log_path = os.path.join(
+        log_path, "worker_{0}".format(os.getpid()))
+    if not os.path.isdir(Runner.log_path):
+        os.makedirs(Runner.log_path)
+    Runner.list_of_tests = list(
+        Runner.get_tests(CONF.test_types, CONF.excluded_types))
+    if Runner.journal is None:
+        # Spawned workers must not start the parent's journal over
+        Runner.setup_journal(resume=True)
+    Runner.prewarm_connections()
+
+
+def _run_template(unit):
+    """Runs all the given tests against a single template in a worker
+
+    :param tuple unit: (ID of the template's first test, file path, request
+        string, meta variables)
+    :rtype: dict
+    :returns: The template's results, as returned by
+        :func:`syntribos.result.IssueTestResult.get_shard`, along with its
+        console output under the "console" key and its run summary
+        statistics under the "summary" key
+    """
+    global result
+
+    first_id, file_path, req_str, meta_vars = unit
+    list_of_tests = Runner.list_of_tests
+    console = six.StringIO()
+    decorator = unittest.runner._WritelnDecorator(console)
+    result = syntribos.result.IssueTestResult(decorator, True, verbosity=1)
+    # Give every template the test IDs it would have had in a serial run
+    Runner.current_test_id = first_id
+    stats.reset()
+    stdout = sys.stdout
+    sys.stdout = console
+    try:
+        if Runner.start_template(list_of_tests, file_path):
+            Runner.run_given_tests(list_of_tests, file_path, req_str,
+                                   meta_vars)
+    finally:
+        sys.stdout = stdout
+    shard = result.get_shard()
+    shard["console"] = console.getvalue()
+    shard["summary"] = stats.get_stats()
+    return shard
+
+
 def entry_point():
     """Start runner. Need this so we can point to it in ``setup.cfg``."""
     Runner.run()
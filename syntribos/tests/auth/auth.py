@@ -40,20 +40,18 @@ class AuthTestCase(base.BaseTestCase):
 
         cls.request.headers['x-auth-token'] = alt_token
 
-        cls.test_resp, cls.test_signals = cls.client.request(
-            method=cls.request.method, url=cls.request.url,
-            headers=cls.request.headers, params=cls.request.params,
-            data=cls.request.data)
+    def setUp(self):
+        super(AuthTestCase, self).setUp()
+        self.test_resp, self.test_signals = self.client.request(
+            method=self.request.method, url=self.request.url,
+            headers=self.request.headers, params=self.request.params,
+            data=self.request.data)
 
     @classmethod
     def send_init_request(cls, filename, file_content, meta_vars):
         super(AuthTestCase, cls).send_init_request(filename,
                                                    file_content, meta_vars)
-        cls.request = cls.init_req.get_prepared_copy()
-
-    @classmethod
-    def tearDownClass(cls):
-        super(AuthTestCase, cls).tearDownClass()
+        cls.request = cls.baseline.init_req.get_prepared_copy()
 
     def test_case(self):
         if 'HTTP_STATUS_CODE_2XX' in self.test_signals:
@@ -20,9 +20,11 @@ import six
 from six.moves.urllib.parse import urlparse
 
 import syntribos
+from syntribos.checks.time import get_response_time
 from syntribos.clients.http import client
 from syntribos.clients.http import parser
 from syntribos.signal import SignalHolder
+from syntribos.utils import stats
 
 LOG = logging.getLogger(__name__)
 
@@ -31,6 +33,8 @@ ALLOWED_CHARS = "().-_{0}{1}".format(t_string.ascii_letters, t_string.digits)
 """test_table is the master list of tests to be run by the runner"""
 CONF = cfg.CONF
 test_table = {}
+# (response, signals) for each baseline request sent for the current template
+_baseline_cache = {}
 
 
 def replace_invalid_characters(string, new_char="_"):
@@ -61,6 +65,77 @@ def replace_invalid_characters(string, new_char="_"):
     return string
 
 
+def clear_baseline_cache():
+    """Forgets the baseline responses cached for the previous template
+
+    The runner calls this before running tests against each template, so a
+    baseline response is only shared by the tests run against one template.
+    """
+    _baseline_cache.clear()
+
+
+def _get_request_key(request):
+    """Returns a key identifying a prepared request, for the baseline cache."""
+    return repr((request.method, request.url,
+                 sorted(request.headers.items()),
+                 sorted(request.params.items()), request.data))
+
+
+class ExecutionContext(object):
+
+    """State for a single run of a test case
+
+    A context is created for the template (see `BaseTestCase.baseline`) when
+    the initial request is sent. Each test case then runs against its own
+    context from :func:`new_case`, which shares the template's request and
+    response by reference, but has its own signals and failures. This means
+    test cases never write to state shared with other cases, and so can run
+    at the same time.
+
+    :ivar init_req: Initial request (loaded from request template)
+    :ivar init_resp: Response to the initial request
+    :ivar init_signals: Holder for signals on `init_req`
+    :ivar test_req: Request sent by the test for analysis
+    :ivar test_resp: Response to the test request
+    :ivar test_signals: Holder for signals on `test_req`
+    :ivar diff_signals: Holder for signals between `init_req` and `test_req`
+    :ivar list failures: Issues registered by the test
+    :ivar list errors: Exceptions raised by the test
+    :ivar bool dead: Whether a request failed to return a response
+    """
+
+    def __init__(self, init_req=None, init_resp=None, init_signals=None,
+                 dead=False):
+        self.init_req = init_req
+        self.init_resp = init_resp
+        self.init_signals = SignalHolder(init_signals)
+        self.test_req = None
+        self.test_resp = None
+        self.test_signals = SignalHolder()
+        self.diff_signals = SignalHolder()
+        self.failures = []
+        self.errors = []
+        self.dead = dead
+
+    def new_case(self):
+        """Returns a new context for a test case run against this baseline
+
+        :rtype: :class:`ExecutionContext`
+        """
+        return ExecutionContext(self.init_req, self.init_resp,
+                                self.init_signals, self.dead)
+
+
+def _context_property(name):
+    """Returns a property reading and writing `name` on `self.context`."""
+    def getter(self):
+        return getattr(self.context, name)
+
+    def setter(self, value):
+        setattr(self.context, name, value)
+    return property(getter, setter)
+
+
 class TestType(type):
 
     """This is the metaclass for each class extending :class:`BaseTestCase`."""
@@ -83,34 +158,46 @@ class BaseTestCase(unittest.TestCase):
     :attribute str test_name: A name like ``XML_EXTERNAL_ENTITY_BODY``,
         containing the test type and the portion of the request template being
         tested
-    :attribute list failures: A collection of "failures" raised by tests
-    :attribute bool dead: Flip this if one of the requests doesn't return a
-        response object
     :attribute client: HTTP client to be used by the test
-    :attribute init_req: Initial request (loaded from request template)
-    :attribute init_resp: Response to the initial request
-    :attribute test_req: Request sent by the test for analysis
-    :attribute test_resp: Response to the test request
-    :attribute init_signals: Holder for signals on `init_req`
-    :attribute test_signals: Holder for signals on `test_req`
-    :attribute diff_signals: Holder for signals between `init_req` and
-        `test_req`
+    :attribute baseline: :class:`ExecutionContext` holding the initial
+        request for the current template, and its response
+    :attribute context: :class:`ExecutionContext` of this test case. The
+        `failures`, `dead`, `init_*`, `test_*` and `diff_signals` attributes
+        of a test case are read from and written to its context.
+    :attribute case: The test case this test was created from, if it wasn't
+        created from a class (e.g.
+        :class:`syntribos.tests.fuzz.base_fuzz.FuzzCase`)
     """
 
     test_name = None
-    failures = []
-    errors = []
-    dead = False
     client = client()
-
-    init_req = None
-    init_resp = None
-    test_req = None
-    test_resp = None
-
-    init_signals = SignalHolder()
-    test_signals = SignalHolder()
-    diff_signals = SignalHolder()
+    baseline = ExecutionContext()
+    case = None
+
+    failures = _context_property("failures")
+    errors = _context_property("errors")
+    dead = _context_property("dead")
+
+    init_req = _context_property("init_req")
+    init_resp = _context_property("init_resp")
+    test_req = _context_property("test_req")
+    test_resp = _context_property("test_resp")
+
+    init_signals = _context_property("init_signals")
+    test_signals = _context_property("test_signals")
+    diff_signals = _context_property("diff_signals")
+
+    def __init__(self, *args, **kwargs):
+        super(BaseTestCase, self).__init__(*args, **kwargs)
+        self.context = self.baseline.new_case()
+
+    def __str__(self):
+        if self.case is None:
+            return super(BaseTestCase, self).__str__()
+        # Describe the test by its case, as if the case were a class
+        return "{0} ({1}.{2})".format(self._testMethodName,
+                                      type(self).__module__,
+                                      self.case.__name__)
 
     @classmethod
     def register_opts(cls):
@@ -133,9 +220,7 @@ class BaseTestCase(unittest.TestCase):
         """
         request_obj = parser.create_request(
             file_content, CONF.syntribos.endpoint, meta_vars)
-        cls.init_req = request_obj
-        cls.init_resp = None
-        cls.init_signals = None
+        cls.baseline = ExecutionContext(init_req=request_obj)
 
     @classmethod
     def send_init_request(cls, filename, file_content, meta_vars):
@@ -148,18 +233,47 @@ class BaseTestCase(unittest.TestCase):
         :param str filename: name of template file
         :param str file_content: content of template file as string
         """
-        cls.init_req = parser.create_request(
+        init_req = parser.create_request(
             file_content, CONF.syntribos.endpoint, meta_vars)
 
-        prepared_copy = cls.init_req.get_prepared_copy()
-        cls.init_resp, cls.init_signals = cls.client.send_request(
-            prepared_copy)
-        if cls.init_resp is not None:
+        prepared_copy = init_req.get_prepared_copy()
+        init_resp, init_signals = cls.send_baseline_request(prepared_copy)
+        if init_resp is not None:
             # Get the computed body and add it to our RequestObject
             # TODO(cneill): Figure out a better way to handle this discrepancy
-            cls.init_req.body = cls.init_resp.request.body
+            init_req.body = init_resp.request.body
+        cls.baseline = ExecutionContext(init_req, init_resp, init_signals,
+                                        dead=init_resp is None)
+
+    @classmethod
+    def send_baseline_request(cls, request):
+        """Sends a prepared baseline request, unless its response is cached
+
+        Most tests send the same baseline request for a template, so its
+        response is cached until the runner moves on to the next template.
+        The request is sent ``[test] baseline_samples`` times, and the
+        response with the median response time is kept, so a single slow or
+        fast response doesn't skew the time checks of every test.
+
+        :param request: A prepared request
+        :type request: :class:`syntribos.clients.http.parser.RequestObject`
+        :returns: tuple of (response, signals)
+        """
+        key = _get_request_key(request)
+        if key in _baseline_cache:
+            stats.increment("Baseline requests reused")
+            return _baseline_cache[key]
+
+        samples = [cls.client.send_request(request)
+                   for _ in range(CONF.test.baseline_samples)]
+        received = sorted([s for s in samples if s[0] is not None],
+                          key=lambda s: get_response_time(s[0]))
+        if received:
+            sample = received[(len(received) - 1) // 2]
         else:
-            cls.dead = True
+            sample = samples[0]
+        _baseline_cache[key] = sample
+        return sample
 
     @classmethod
     def extend_class(cls, new_name, kwargs):
@@ -181,23 +295,18 @@ class BaseTestCase(unittest.TestCase):
         new_cls.__module__ = cls.__module__
         return new_cls
 
-    @classmethod
-    def tearDownClass(cls):
-        super(BaseTestCase, cls).tearDownClass()
-        if not cls.failures:
-            if "EXCEPTION_RAISED" in cls.test_signals:
-                sig = cls.test_signals.find(
-                    tags="EXCEPTION_RAISED")[0]
-                raise sig.data["exception"]
-
-    @classmethod
-    def tearDown(cls):
-        get_slugs = [sig.slug for sig in cls.test_signals]
-        get_checks = [sig.check_name for sig in cls.test_signals]
+    def tearDown(self):
+        get_slugs = [sig.slug for sig in self.test_signals]
+        get_checks = [sig.check_name for sig in self.test_signals]
         test_signals_used = "Signals: " + str(get_slugs)
         LOG.debug(test_signals_used)
         test_checks_used = "Checks used: " + str(get_checks)
         LOG.debug(test_checks_used)
+        if not self.failures:
+            if "EXCEPTION_RAISED" in self.test_signals:
+                sig = self.test_signals.find(
+                    tags="EXCEPTION_RAISED")[0]
+                raise sig.data["exception"]
 
     def run_test_case(self):
         """This kicks off the test(s) for a given TestCase class
@@ -211,7 +320,7 @@ class BaseTestCase(unittest.TestCase):
             try:
                 self.test_case()
             except Exception as e:
-                self.errors += e
+                self.errors.append(e)
                 raise
             if self.failures:
                 raise AssertionError
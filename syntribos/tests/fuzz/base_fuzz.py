@@ -12,26 +12,140 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # pylint: skip-file
+from concurrent import futures
 import logging
 import os
+import sys
 
 from oslo_config import cfg
+import six
 from six.moves.urllib.parse import urlparse
 
 import syntribos
 from syntribos.checks import length_diff as length_diff
+from syntribos.checks.time import is_time_diff_over
+from syntribos.clients.http import cassette
+from syntribos.clients.http import wire
 from syntribos.tests import base
 import syntribos.tests.fuzz.datagen
 from syntribos.utils.file_utils import ContentType
 from syntribos.utils import remotes
+from syntribos.utils import stats
 
 LOG = logging.getLogger(__name__)
 CONF = cfg.CONF
 
 
+class FuzzCase(object):
+    """A test case of a fuzz test, for a single fuzzed request
+
+    Calling a case with the name of a test method, as if it were a TestCase
+    class, returns an instance of its test class set up to send the fuzzed
+    request, so cases can be run and reported on like any other test.
+
+    :ivar test_class: The fuzz test class (e.g. ``SQL_INJECTION_BODY``)
+    :ivar str fuzz_name: Unsanitized name of the test case
+    :ivar str fuzz_string: Fuzz string inserted in the request
+    :ivar str param_path: String tracing location of the ImpactedParameter
+    :ivar request: The fuzzed request
+    :ivar wire: :class:`syntribos.clients.http.wire.WireTemplate` to send
+        the fuzzed request from, if any
+    """
+
+    __slots__ = ("test_class", "fuzz_name", "fuzz_string", "param_path",
+                 "request", "wire")
+
+    def __init__(self, test_class, fuzz_name, fuzz_string, param_path,
+                 request, wire=None):
+        self.test_class = test_class
+        self.fuzz_name = fuzz_name
+        self.fuzz_string = fuzz_string
+        self.param_path = param_path
+        self.request = request
+        self.wire = wire
+
+    @property
+    def __name__(self):
+        """The name of the test case, as a valid identifier"""
+        return base.replace_invalid_characters(self.fuzz_name)
+
+    def __call__(self, method_name="runTest"):
+        test = self.test_class(method_name)
+        test.case = self
+        test.fuzz_string = self.fuzz_string
+        test.param_path = self.param_path
+        test.request = self.request
+        test.wire = self.wire
+        return test
+
+    def send(self):
+        """Sends the fuzzed request without blocking, through the test
+        class's client (see ``SynHTTPClient.send_request_async``)
+
+        :returns: :class:`concurrent.futures.Future` of a tuple of
+            (response, signals), to pass to :func:`run`
+        """
+        try:
+            return self.test_class.client.send_request_async(self.request)
+        except Exception as exc:
+            sent = futures.Future()
+            sent.set_running_or_notify_cancel()
+            sent.set_exception(exc)
+            return sent
+
+    def run(self, result, sent=None):
+        """Runs the test case, reporting its outcome to `result`
+
+        This drives the same lifecycle as :func:`unittest.TestCase.run`:
+        `setUp` sends the fuzzed request, `run_test_case` runs the checks and
+        `tearDown` logs the signals, and an exception raised by any of them
+        is reported to `result` as a failure or error. It skips unittest's
+        per-test bookkeeping (outcome objects, cleanups, skips, subtests and
+        expected failures), none of which syntribos tests use.
+
+        :param result: The result object to report to
+        :type result: :class:`syntribos.result.IssueTestResult`
+        :param sent: (OPTIONAL) Future returned by :func:`send`, if the
+            request was already sent; `setUp` waits on it instead of sending
+            the request again
+        """
+        test = self("run_test_case")
+        test.sent = sent
+        result.startTest(test)
+        try:
+            if _run_part(test, test.setUp, result):
+                passed = _run_part(test, test.run_test_case, result)
+                passed = _run_part(test, test.tearDown, result) and passed
+                if passed:
+                    result.addSuccess(test)
+        finally:
+            result.stopTest(test)
+
+
+def _run_part(test, part, result):
+    """Calls `part` of `test`, reporting any exception it raises to `result`
+
+    :rtype: bool
+    :returns: True if `part` didn't raise an exception
+    """
+    try:
+        part()
+    except KeyboardInterrupt:
+        raise
+    except test.failureException:
+        result.addFailure(test, sys.exc_info())
+    except Exception:
+        result.addError(test, sys.exc_info())
+    else:
+        return True
+    return False
+
+
 class BaseFuzzTestCase(base.BaseTestCase):
     failure_keys = None
     success_keys = None
+    wire = None
+    sent = None
 
     @classmethod
     def _get_strings(cls, file_name=None):
@@ -57,24 +171,67 @@ class BaseFuzzTestCase(base.BaseTestCase):
                   "exiting...".format(cls.test_name))
             exit(1)
 
-    @classmethod
-    def setUpClass(cls):
-        """being used as a setup test not."""
-        super(BaseFuzzTestCase, cls).setUpClass()
-        cls.test_resp, cls.test_signals = cls.client.request(
-            method=cls.request.method,
-            url=cls.request.url,
-            headers=cls.request.headers,
-            params=cls.request.params,
-            data=cls.request.data)
-        cls.test_req = cls.request
-
-        if cls.test_resp is None or "EXCEPTION_RAISED" in cls.test_signals:
-            cls.dead = True
+    def setUp(self):
+        """Sends the fuzzed request for this test case
 
-    @classmethod
-    def tearDownClass(cls):
-        super(BaseFuzzTestCase, cls).tearDownClass()
+        The whole response body is read, even once it contains one of the
+        test's `failure_keys`, since the length checks and the list of
+        failure strings found depend on the rest of it. If the request was
+        already sent (see :func:`FuzzCase.send`), this waits for its response
+        instead.
+        """
+        super(BaseFuzzTestCase, self).setUp()
+        if self.sent is not None:
+            self.test_resp, self.test_signals = self.sent.result()
+        else:
+            self.test_resp, self.test_signals = self._send_test_request()
+        self.test_req = self.request
+
+        if self.test_resp is None or "EXCEPTION_RAISED" in self.test_signals:
+            self.dead = True
+
+    def _send_test_request(self):
+        """Sends the fuzzed request, from its wire template if it has one
+
+        :returns: tuple of (response, signals)
+        """
+        if self.wire is not None:
+            return self.client.send_wire_request(
+                self.wire, self.fuzz_string, self.request)
+        return self.client.request(
+            method=self.request.method,
+            url=self.request.url,
+            headers=self.request.headers,
+            params=self.request.params,
+            data=self.request.data)
+
+    def confirm_time_diff(self):
+        """Sends the requests again to check that a slow response repeats
+
+        A single slow response to the fuzzed request may be down to noise
+        (e.g. a busy host) rather than to the payload. So once the fuzzed
+        request took over ``time_diff_percent`` percent longer than the
+        baseline request, both are sent again, baseline first, up to
+        ``[test] timing_confirmations`` times. The difference is confirmed
+        if every fuzzed response is again that much slower than the
+        baseline response sent just before it.
+
+        :rtype: bool
+        :returns: True if the difference was confirmed (or if
+            ``timing_confirmations`` is 0)
+        """
+        for _ in range(CONF.test.timing_confirmations):
+            init_resp, _ = self.client.send_request(
+                self.init_req.get_prepared_copy())
+            test_resp, _ = self._send_test_request()
+            stats.increment("Timing confirmation requests", 2)
+            if init_resp is None or test_resp is None or (
+                    not is_time_diff_over(init_resp, test_resp)):
+                stats.increment("Time differences not confirmed")
+                return False
+        if CONF.test.timing_confirmations:
+            stats.increment("Time differences confirmed")
+        return True
 
     def run_default_checks(self):
         """Tests for some default issues
@@ -123,17 +280,16 @@ class BaseFuzzTestCase(base.BaseTestCase):
 
     @classmethod
     def get_test_cases(cls, filename, file_content):
-        """Generates new TestCases for each fuzz string
+        """Generates a test case for each fuzz string and parameter
 
-        First, sends a baseline (non-fuzzed) request, storing it in
-        cls.init_resp.
+        The baseline (non-fuzzed) request, sent beforehand by
+        :func:`send_init_request`, is read from cls.baseline.
 
-        For each string returned by cls._get_strings(), yield a TestCase class
-        for the string as an extension to the current TestCase class. Every
-        string used as a fuzz test payload entails the generation of a new
-        subclass for each parameter fuzzed. See :func:`base.extend_class`.
+        For each string returned by cls._get_strings(), yield a
+        :class:`FuzzCase` of the current TestCase class for every parameter
+        fuzzed with it, rather than a new subclass. See :func:`extend_class`.
+        The runner runs these with :func:`FuzzCase.run`.
         """
-        cls.failures = []
         if hasattr(cls, 'data_key'):
             prefix_name = "{filename}_{test_name}_{fuzz_file}_".format(
                 filename=filename,
@@ -144,30 +300,77 @@ class BaseFuzzTestCase(base.BaseTestCase):
                 filename=filename, test_name=cls.test_name)
 
         fr = syntribos.tests.fuzz.datagen.fuzz_request(
-            cls.init_req, cls._get_strings(), cls.test_type, prefix_name)
+            cls.baseline.init_req, cls._get_strings(), cls.test_type,
+            prefix_name)
+        templates = cls._get_wire_templates()
         for fuzz_name, request, fuzz_string, param_path in fr:
             yield cls.extend_class(fuzz_name, fuzz_string, param_path,
-                                   {"request": request})
+                                   {"request": request,
+                                    "wire": templates.get(param_path)})
+
+    @classmethod
+    def _get_wire_templates(cls):
+        """Returns wire templates of the fuzzed requests, by parameter path
+
+        Only used if ``wire_templates`` is set, and no cassette is replayed.
+        The request is fuzzed with :data:`syntribos.clients.http.wire.SLOT`
+        at each parameter, twice: parameters whose request differs between
+        the two (e.g. it has generated values), or whose path isn't unique,
+        get no template, so their test cases are sent the usual way.
+
+        :rtype: dict
+        """
+        if not CONF.syntribos.wire_templates or (
+                CONF.syntribos.transport != "sync") or cassette.is_replaying():
+            return {}
+        data = cls.baseline.init_req.data
+        if cls.test_type == "params":
+            location = wire.QUERY
+        elif cls.test_type == "headers":
+            location = wire.HEADER
+        elif cls.test_type == "data" and isinstance(data, dict):
+            location = wire.JSON
+        elif cls.test_type == "data" and isinstance(data, six.string_types):
+            location = wire.RAW
+        else:
+            return {}
+
+        passes = []
+        for _ in range(2):
+            templates = {}
+            for _, request, _, param_path in (
+                    syntribos.tests.fuzz.datagen.fuzz_request(
+                        cls.baseline.init_req, [wire.SLOT], cls.test_type,
+                        "")):
+                if param_path in templates:
+                    templates[param_path] = None
+                else:
+                    templates[param_path] = wire.WireTemplate.from_request(
+                        request, location)
+            passes.append(templates)
+        return dict(
+            (param_path, template)
+            for param_path, template in passes[0].items()
+            if template is not None and
+            template.pieces == getattr(passes[1][param_path], "pieces", None))
 
     @classmethod
     def extend_class(cls, new_name, fuzz_string, param_path, kwargs):
-        """Creates an extension for the class
+        """Creates a test case of this class for a fuzzed request
 
-        Each TestCase class created is added to the `test_table`, which is then
-        read in by the test runner as the master list of tests to be run.
+        Unlike :func:`syntribos.tests.base.BaseTestCase.extend_class`, this
+        doesn't create a new class: a fuzz test generates a test case for
+        every payload and parameter, so each one is a lightweight
+        :class:`FuzzCase` instead.
 
-        :param str new_name: Name of new class to be created
+        :param str new_name: Name of the test case
         :param str fuzz_string: Fuzz string to insert
         :param str param_path: String tracing location of the ImpactedParameter
-        :param dict kwargs: Keyword arguments to pass to the new class
-        :rtype: class
-        :returns: A TestCase class extending :class:`BaseTestCase`
+        :param dict kwargs: Attributes of the test case; must include the
+            fuzzed "request"
+        :rtype: :class:`FuzzCase`
         """
-
-        new_cls = super(BaseFuzzTestCase, cls).extend_class(new_name, kwargs)
-        new_cls.fuzz_string = fuzz_string
-        new_cls.param_path = param_path
-        return new_cls
+        return FuzzCase(cls, new_name, fuzz_string, param_path, **kwargs)
 
     def register_issue(self, defect_type, severity, confidence, description):
         """Adds an issue to the test's list of issues
@@ -47,7 +47,7 @@ class CommandInjectionBody(base_fuzz.BaseFuzzTestCase):
                              "a vulnerability to command injection "
                              "attacks.").format(failed_strings))
         self.diff_signals.register(time_diff(self))
-        if "TIME_DIFF_OVER" in self.diff_signals:
+        if "TIME_DIFF_OVER" in self.diff_signals and self.confirm_time_diff():
             self.register_issue(
                 defect_type="command_injection",
                 severity=syntribos.HIGH,
@@ -11,46 +11,325 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import collections
 import copy
+import json
 import re
+import uuid
 from xml.etree import ElementTree
 
 import six
 
 from syntribos.clients.http.parser import _string_var_objs
+from syntribos.clients.http.parser import html_unescape
 from syntribos.clients.http.parser import RequestCreator
+from syntribos.clients.http.parser import RequestHelperMixin
 from syntribos.clients.http import VariableObject
 
 
-def fuzz_request(req, strings, fuzz_type, name_prefix):
+def fuzz_request(req, strings, fuzz_type, name_prefix, body_prefix=""):
     """Creates the fuzzed RequestObject
 
-    Gets the name and the fuzzed request model from _fuzz_data, and
-    creates a RequestObject from the parameters of the model.
+    Gets the name and the fuzz location of each fuzzed request from
+    _fuzz_locations. Unless preparing `req` gives different requests each
+    time (e.g. it has generated values), the fuzzed requests are
+    :class:`FuzzedRequest` objects sharing a single prepared copy of `req`.
+    Otherwise, each is a prepared copy of `req` with its model fuzzed.
 
     :param req: The RequestObject to be fuzzed
     :type req: :class:`syntribos.clients.http.parser.RequestObject`
     :param list strings: List of strings to fuzz with
     :param str fuzz_type: What attribute of the RequestObject to fuzz
     :param name_prefix: (Used for ImpactedParameter)
+    :param str body_prefix: Text put before the body of each fuzzed request
+        (e.g. a DTD)
     :returns: Generator of tuples:
         (name, request, fuzzstring, ImpactedParameter name)
     :rtype: `tuple`
     """
-    for name, data, stri, param_path in _fuzz_data(
+    shared = None
+    for name, location, stri in _fuzz_locations(
             strings, getattr(req, fuzz_type), req.action_field, name_prefix):
+        if shared is None:
+            shared = _prepare_base(req, fuzz_type)
+        base, model = shared
+        if base is not None:
+            yield (name, FuzzedRequest(base, fuzz_type, model, location,
+                                       stri, body_prefix), stri,
+                   _get_param_path(location))
+            continue
         request_copy = req.get_copy()
-        setattr(request_copy, fuzz_type, data)
+        # Preparing the request changes its model in place, so the model is
+        # built from the copy's own data rather than shared with `req`
+        setattr(request_copy, fuzz_type, _build_model(
+            getattr(request_copy, fuzz_type), location, stri))
         request_copy.prepare_request()
-        yield name, request_copy, stri, param_path
+        if body_prefix:
+            request_copy.data = "{0}{1}".format(body_prefix, request_copy.data)
+        yield name, request_copy, stri, _get_param_path(location)
+
+
+def _prepare_base(req, fuzz_type):
+    """Prepares `req` to be shared by :class:`FuzzedRequest` objects
+
+    `req` is prepared twice, and isn't shared if the two differ, as each
+    fuzzed request must then be prepared on its own.
+
+    :returns: (prepared copy of `req`, prepared model of its `fuzz_type`
+        attribute, before the body is serialized), or (None, None). The
+        model of a JSON or XML body is a :class:`BodySegments`.
+    """
+    base = req.get_prepared_copy()
+    other = req.get_prepared_copy()
+    model = getattr(req, fuzz_type)
+    if not isinstance(model, six.string_types):
+        model = req._run_iters(copy.deepcopy(model), req.action_field)
+        if fuzz_type == "data" and isinstance(model, dict):
+            model = JSONSegments(model)
+        elif fuzz_type == "data" and isinstance(model, ElementTree.Element):
+            model = XMLSegments(model)
+        if isinstance(model, BodySegments):
+            prepared = model.join()
+        elif fuzz_type == "data":
+            prepared = req._string_data(model)
+        else:
+            prepared = model
+        if prepared != getattr(base, fuzz_type):
+            return None, None
+    for attr in ("method", "url", "headers", "params", "data"):
+        if getattr(base, attr) != getattr(other, attr):
+            return None, None
+    return base, model
+
+
+class FuzzedRequest(object):
+    """A prepared request with a fuzz string in it, made when it's read
+
+    Test cases are created long before they are run, and each fuzzes a
+    single location of a request, so every fuzzed request of a
+    :func:`fuzz_request` call shares a prepared copy of the request, and
+    only holds where to put its fuzz string. The fuzzed attribute (e.g.
+    `data`) is made each time it's read, copying only the containers along
+    the path to the fuzz string; other attributes are read from the shared
+    request.
+
+    Setting an attribute (including the fuzzed one) sets it on this fuzzed
+    request only.
+
+    :param base: The shared, prepared
+        :class:`syntribos.clients.http.parser.RequestObject`
+    :param str fuzz_type: The fuzzed attribute
+    :param model: The fuzzed attribute of `base` before its body was
+        serialized (a :class:`BodySegments` for a JSON or XML body); a string
+        model isn't prepared
+    :param location: :class:`FuzzLocation` of the fuzz string, in the
+        unprepared model
+    :param str fuzz_string: The fuzz string
+    :param str body_prefix: Text put before the body when it's read
+    """
+
+    def __init__(self, base, fuzz_type, model, location, fuzz_string,
+                 body_prefix=""):
+        self._base = base
+        self._fuzz_type = fuzz_type
+        self._model = model
+        self._location = location
+        self._fuzz_string = fuzz_string
+        self._body_prefix = body_prefix
+
+    def __getattr__(self, name):
+        # Only called for attributes that aren't set on this object
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name == self._fuzz_type:
+            value = self._build()
+        else:
+            value = getattr(self._base, name)
+        if name == "data" and self._body_prefix:
+            value = "{0}{1}".format(self._body_prefix, value)
+        return value
+
+    def _build(self):
+        """Returns the fuzzed attribute, as preparing the request makes it"""
+        base = self._base
+        location = self._location
+        if location.container == "string":
+            value = base._run_iters(
+                _build_model(self._model, location, self._fuzz_string),
+                base.action_field)
+            if self._fuzz_type == "url":
+                value = base._remove_braces(base._remove_attr_names(value))
+            return value
+        # Keys and values are changed as prepare_request changes them
+        path = tuple(
+            base._replace_iter(step).replace(base.action_field, "")
+            if isinstance(step, six.string_types) else step
+            for step in location.path)
+        value = base._replace_iter(self._fuzz_string)
+        if location.container in ("list", "xml_text"):
+            value = value.replace(base.action_field, "")
+        model = self._model
+        if isinstance(model, BodySegments):
+            body = model.join(path, value)
+            if body is not None:
+                return body
+            model = model.model
+        value = _build_model(model, location._replace(path=path), value)
+        if self._fuzz_type == "data":
+            value = base._string_data(value)
+        return value
+
+    def get_copy(self):
+        """Returns a copy of the fuzzed request, as a RequestObject"""
+        request_copy = copy.deepcopy(self._base)
+        for name in set([self._fuzz_type, "data"]):
+            setattr(request_copy, name, getattr(self, name))
+        for name, value in vars(self).items():
+            if not name.startswith("_"):
+                setattr(request_copy, name, copy.deepcopy(value))
+        return request_copy
+
+
+class BodySegments(object):
+    """A request body, serialized once and split around each of its values
+
+    The body is serialized with a unique placeholder in place of each value
+    that can be fuzzed, and split around the placeholders. As a value is
+    serialized the same way wherever it is in the body, the body with one
+    value changed serializes to the segments joined around the serialized
+    values, with the new one in its place. Fuzzed bodies are spliced this
+    way instead of being serialized whole.
+
+    :param model: The prepared body
+    """
+
+    # A placeholder, as the body is serialized, capturing its index
+    pattern = "{0}([0-9]+)"
+
+    def __init__(self, model):
+        self.model = model
+        self.placeholder = "SYNTRIBOS{0}_".format(uuid.uuid4().hex)
+        slots = []
+        self.pieces = re.split(self.pattern.format(self.placeholder),
+                               self.serialize(self._mark(model, (), slots)))
+        self.paths = {}
+        # Segments and serialized values alternate
+        for i in range(1, len(self.pieces), 2):
+            path, self.pieces[i] = slots[int(self.pieces[i])]
+            self.paths[path] = i
+
+    def _slot(self, path, value, slots):
+        """Returns the placeholder of `value`, found at `path`"""
+        slots.append((path, self.serialize_value(value)))
+        return "{0}{1}".format(self.placeholder, len(slots) - 1)
+
+    def join(self, path=None, value=None):
+        """Returns the body, serialized, with `value` at `path` if given
+
+        :param tuple path: Path of a value in the body, from :attr:`paths`
+        :param str value: Value to put at `path` instead
+        :returns: The serialized body, or None if `value` can't be spliced
+            in at `path`
+        """
+        if path is None:
+            return "".join(self.pieces)
+        elif path not in self.paths:
+            return None
+        pieces = list(self.pieces)
+        pieces[self.paths[path]] = self.serialize_value(value)
+        return "".join(pieces)
+
+
+class JSONSegments(BodySegments):
+    """A JSON body split around each value that isn't an object or array
+
+    Paths are the keys and list indexes of values.
+    """
+
+    pattern = '"{0}([0-9]+)"'
+    serialize = serialize_value = staticmethod(json.dumps)
+
+    def _mark(self, val, path, slots):
+        if not isinstance(val, (dict, list)):
+            return self._slot(path, val, slots)
+        ret = val.copy() if isinstance(val, dict) else list(val)
+        for key in val.keys() if isinstance(val, dict) else range(len(val)):
+            ret[key] = self._mark(val[key], path + (key, ), slots)
+        return ret
+
+
+class XMLSegments(BodySegments):
+    """An XML body split around element text and attribute values
+
+    Paths are those of :class:`FuzzLocation` objects in XML models.
+    """
+
+    serialize = staticmethod(RequestHelperMixin._string_data)
+
+    def __init__(self, model):
+        # Text of elements that are written as "<tag />" when it's empty
+        self.childless = set()
+        super(XMLSegments, self).__init__(model)
+
+    @staticmethod
+    def serialize_value(value):
+        """Returns `value` as it is once the body is serialized
+
+        `value` is escaped, with non-ASCII characters as character
+        references, as ElementTree writes it, then unescaped as the rest of
+        the body is.
+        """
+        return html_unescape(value.replace("&", "&amp;").encode(
+            "ascii", "xmlcharrefreplace").decode("ascii"))
+
+    def _mark(self, ele, path, slots):
+        ret = copy.copy(ele)
+        if ele.text:
+            ret.text = self._slot(path, ele.text, slots)
+            if not len(ele):
+                self.childless.add(path)
+        ret.attrib = ele.attrib.copy()
+        for key, val in ele.attrib.items():
+            if isinstance(val, six.string_types):
+                ret.attrib[key] = self._slot(path + (key, ), val, slots)
+        for i, child in enumerate(list(ele)):
+            ret[i] = self._mark(child, path + (i, ), slots)
+        return ret
+
+    def join(self, path=None, value=None):
+        if path in self.childless and not value:
+            return None
+        return super(XMLSegments, self).join(path, value)
+
+
+FuzzLocation = collections.namedtuple(
+    "FuzzLocation", ["param_path", "container", "path", "var_obj"])
+"""A location in a request model where a fuzz string is placed
+
+:ivar str param_path: String tracing the location (the ImpactedParameter
+    name)
+:ivar str container: What holds the location: ``"dict"`` or ``"list"`` (in
+    a dict model), ``"xml_text"`` or ``"xml_attrib"`` (in an XML model) or
+    ``"string"``
+:ivar tuple path: Keys and list indexes from the root of a dict model; child
+    indexes from the root of an XML model, followed by the attribute name
+    for ``"xml_attrib"``; or the (start, stop) span of the variable in a
+    string
+:ivar var_obj: :class:`syntribos.clients.http.VariableObject` whose limits
+    the fuzz string must be within, if any
+"""
+
+# Fuzz locations of the last few models fuzzed, by model
+_locations_cache = {}
+_LOCATIONS_CACHE_SIZE = 16
 
 
 def _fuzz_data(strings, data, skip_var, name_prefix):
     """Iterates through model fields and places fuzz string in each field
 
-    For each attribute in the model object, call the _build_X_combinations
-    method corresponding to the type of the data parameter, which replaces
-    the value with the fuzz string.
+    The fuzzable locations of the model are found once (see
+    :func:`get_fuzz_locations`), then each fuzz string is placed in each
+    location whose variable's limits (if any) it is within.
 
     :param list strings: List of strings to fuzz with
     :param data: Can be a dict, XML Element, or string
@@ -59,202 +338,266 @@ def _fuzz_data(strings, data, skip_var, name_prefix):
     :returns: Generator of tuples:
         (name, model, string, ImpactedParameter name)
     """
-    param_path = ""
+    for name, location, stri in _fuzz_locations(
+            strings, data, skip_var, name_prefix):
+        yield (name, _build_model(data, location, stri), stri,
+               _get_param_path(location))
+
+
+def _fuzz_locations(strings, data, skip_var, name_prefix):
+    """Pairs each fuzz string with each location of `data` it can go in
+
+    :returns: Generator of tuples: (name, :class:`FuzzLocation`, string)
+    """
+    locations = get_fuzz_locations(data, skip_var)
+    masks = _get_var_obj_masks(strings, locations)
     for str_num, stri in enumerate(strings, 1):
-        if isinstance(data, dict):
-            model_iter = _build_dict_combinations(stri, data, skip_var)
-        elif isinstance(data, ElementTree.Element):
-            model_iter = _build_xml_combinations(stri, data, skip_var)
-        elif isinstance(data, six.string_types):
-            model_iter = _build_str_combinations(stri, data)
-        else:
-            raise TypeError("Format not recognized!")
-        for model_num, (model, param_path) in enumerate(model_iter, 1):
+        model_num = 0
+        for location, mask in zip(locations, masks):
+            if mask is not None and not mask[str_num - 1]:
+                continue
+            model_num += 1
             name = "{0}str{1}_model{2}".format(name_prefix, str_num, model_num)
-            yield (name, model, stri, param_path)
+            yield name, location, stri
 
 
-def _build_str_combinations(fuzz_string, data):
-    """Places `fuzz_string` in fuzz location for string data.
+def get_fuzz_locations(data, skip_var):
+    """Returns the locations in `data` where fuzz strings are placed
 
-    :param str fuzz_string: Value to place in fuzz location
-    :param str data: Lines from the request template
+    Every test fuzzing the same part of a template fuzzes the same model, so
+    the locations of the last few models are cached. Models aren't changed
+    once parsed, so they are cached by identity.
+
+    :param data: Can be a dict, XML Element, or string
+    :param str skip_var: String representing ACTION_FIELDs
+    :rtype: list of :class:`FuzzLocation`
     """
+    key = (id(data), skip_var)
+    cached = _locations_cache.get(key)
+    if cached is not None and cached[0] is data:
+        return cached[1]
+    if isinstance(data, dict):
+        locations = list(_find_dict_locations(data, skip_var))
+    elif isinstance(data, ElementTree.Element):
+        locations = list(_find_xml_locations(data, skip_var))
+    elif isinstance(data, six.string_types):
+        locations = list(_find_str_locations(data))
+    else:
+        raise TypeError("Format not recognized!")
+    if len(_locations_cache) >= _LOCATIONS_CACHE_SIZE:
+        _locations_cache.clear()
+    _locations_cache[key] = (data, locations)
+    return locations
+
+
+def _find_str_locations(data):
+    """Finds the variables of string data, like "{identifier:value}"."""
     # Match either "{identifier:value}" or "{value}"
     var_regex = r"{([\w]*):?([^}]*)}"
     for match in re.finditer(var_regex, data):
-        start, stop = match.span()
-        model = "{0}{1}{2}".format(data[:start], fuzz_string, data[stop:])
-
         if match.group(1):
             # The string is of the format "{identifier:value}", so we just
             # want the identifier as the param_path
             param = match.group(1)
         else:
             param = match.group(0)
+        yield FuzzLocation(param, "string", match.span(),
+                           _string_var_objs.get(param))
 
-        if param in _string_var_objs:
-            var_obj = _string_var_objs[param]
-            if not _check_var_obj_limits(var_obj, fuzz_string):
-                continue
-            param = RequestCreator.replace_one_variable(var_obj)
-        yield model, param
 
+def _find_dict_locations(dic, skip_var, path=(), prefix=""):
+    """Finds the values of object data, and of lists of values in it.
 
-def _build_dict_combinations(fuzz_string, dic, skip_var):
-    """Places fuzz string in fuzz location for object data.
-
-    :param str fuzz_string: Value to place in fuzz location
     :param dic: A dictionary to fuzz
     :param skip_var: ACTION_FIELD UUID value to skip
+    :param tuple path: Path of `dic` from the root of the model
+    :param str prefix: Param path of `dic`
     """
     for key, val in dic.items():
         if skip_var in key:
             continue
         elif isinstance(val, VariableObject):
-            if not _check_var_obj_limits(val, fuzz_string):
-                continue
-            else:
-                yield _merge_dictionaries(dic, {key: fuzz_string}), key
+            yield FuzzLocation(prefix + key, "dict", path + (key, ), val)
         elif isinstance(val, dict):
-            for ret, param_path in _build_dict_combinations(fuzz_string, val,
-                                                            skip_var):
-                yield (_merge_dictionaries(dic, {
-                    key: ret
-                }), "{0}/{1}".format(key, param_path))
+            for location in _find_dict_locations(
+                    val, skip_var, path + (key, ), "{0}{1}/".format(
+                        prefix, key)):
+                yield location
         elif isinstance(val, list):
             for i, v in enumerate(val):
-                list_ = [_ for _ in val]
                 if isinstance(v, dict):
-                    for ret, param_path in _build_dict_combinations(
-                            fuzz_string, v, skip_var):
-                        list_[i] = copy.copy(ret)
-                        yield (_merge_dictionaries(dic, {
-                            key: ret
-                        }), "{0}[{1}]/{2}".format(key, i, param_path))
-                elif isinstance(v, VariableObject):
-                    if not _check_var_obj_limits(v, fuzz_string):
-                        continue
-                else:
-                    list_[i] = fuzz_string
-                    yield (_merge_dictionaries(dic, {
-                        key: list_
-                    }), "{0}[{1}]".format(key, i))
+                    for location in _find_dict_locations(
+                            v, skip_var, path + (key, i),
+                            "{0}{1}[{2}]/".format(prefix, key, i)):
+                        yield location
+                elif not isinstance(v, VariableObject):
+                    # Variables in lists aren't fuzzed
+                    yield FuzzLocation("{0}{1}[{2}]".format(prefix, key, i),
+                                       "list", path + (key, i), None)
         else:
-            yield _merge_dictionaries(dic, {key: fuzz_string}), key
+            yield FuzzLocation(prefix + key, "dict", path + (key, ), None)
+
+
+def _find_xml_locations(ele, skip_var, path=(), prefix=""):
+    """Finds the text and attributes of XML data, and of its children."""
+    if skip_var in ele.tag:
+        return
+    prefix += ele.tag
+    if ele.text and skip_var not in ele.text:
+        yield FuzzLocation(prefix, "xml_text", path, None)
+    for location in _find_dict_locations(ele.attrib, skip_var, path,
+                                         prefix + "/"):
+        yield location._replace(container="xml_attrib")
+    for i, element in enumerate(list(ele)):
+        for location in _find_xml_locations(element, skip_var, path + (i, ),
+                                            prefix + "/"):
+            yield location
+
+
+def _build_model(data, location, fuzz_string):
+    """Returns a copy of `data` with `fuzz_string` placed at `location`
+
+    Only the containers along the path to `location` are copied; the rest
+    of the model is shared with `data`.
+    """
+    if location.container == "string":
+        start, stop = location.path
+        return "{0}{1}{2}".format(data[:start], fuzz_string, data[stop:])
+    elif location.container in ("xml_text", "xml_attrib"):
+        return _build_xml_model(data, location, fuzz_string)
+    return _build_dict_model(data, location.path, fuzz_string)
+
+
+def _build_dict_model(data, path, fuzz_string):
+    if not path:
+        return fuzz_string
+    ret = list(data) if isinstance(data, list) else data.copy()
+    ret[path[0]] = _build_dict_model(data[path[0]], path[1:], fuzz_string)
+    return ret
+
+
+def _build_xml_model(ele, location, fuzz_string, depth=0):
+    ret = copy.copy(ele)
+    if location.container == "xml_attrib" and depth == len(
+            location.path) - 1:
+        ret.attrib = _build_dict_model(ele.attrib, location.path[depth:],
+                                       fuzz_string)
+    elif depth == len(location.path):
+        ret.text = fuzz_string
+    else:
+        i = location.path[depth]
+        ret[i] = _build_xml_model(ele[i], location, fuzz_string, depth + 1)
+    return ret
 
 
-def _merge_dictionaries(x, y):
-    """Merge `dicts` together
+def _get_param_path(location):
+    """Returns the ImpactedParameter name of a fuzz string at `location`"""
+    if location.container == "string" and location.var_obj is not None:
+        return RequestCreator.replace_one_variable(location.var_obj)
+    return location.param_path
 
-    Create a copy of `x`, and update that with elements of `y`, to prevent
-    squashing of passed in dicts.
 
-    :param dict x: Dictionary 1
-    :param dict y: Dictionary 2
-    :returns: Merged dictionary
-    :rtype: `dict`
+def _build_str_combinations(fuzz_string, data):
+    """Places `fuzz_string` in fuzz location for string data.
+
+    :param str fuzz_string: Value to place in fuzz location
+    :param str data: Lines from the request template
     """
+    for location in get_fuzz_locations(data, None):
+        if location.var_obj is not None and not _check_var_obj_limits(
+                location.var_obj, fuzz_string):
+            continue
+        yield (_build_model(data, location, fuzz_string),
+               _get_param_path(location))
+
+
+def _is_int(fuzz_string):
+    try:
+        int(fuzz_string)
+        return True
+    except ValueError:
+        return False
+
+
+def _is_ascii(fuzz_string):
+    try:
+        fuzz_string.encode('ascii')
+        return True
+    except UnicodeEncodeError:
+        return False
+
+
+def _is_url(fuzz_string):
+    url_re = r"^[A-Za-z0-9\-\._~:\/\?#[\]@!\$&'()*\+,;=%]+$"
+    return re.match(url_re, fuzz_string) is not None
 
-    z = x.copy()
-    z.update(y)
-    return z
-
-
-def _build_xml_combinations(stri, ele, skip_var):
-    """Places fuzz string in fuzz location for XML data."""
-    if skip_var not in ele.tag:
-        if ele.text and skip_var not in ele.text:
-            yield _update_xml_ele_text(ele, stri), ele.tag
-        for attr, param_path in _build_dict_combinations(stri, ele.attrib,
-                                                         skip_var):
-            yield (_update_xml_ele_attribs(ele, attr),
-                   "{0}/{1}".format(ele.tag, param_path))
-        for i, element in enumerate(list(ele)):
-            for ret, param_path in _build_xml_combinations(stri, element,
-                                                           skip_var):
-                list_ = list(ele)
-                list_[i] = copy.copy(ret)
-                yield (_update_inner_xml_ele(ele, list_),
-                       "{0}/{1}".format(ele.tag, param_path))
-
-
-def _update_xml_ele_text(ele, text):
-    """Copies an XML element, updates its text attribute with `text`
-
-    :param ele: XML element to be copied, modified
-    :type ele: :class:`xml.ElementTree.Element`
-    :param str text: Text to populate `ele`'s text attribute with
-    :returns: XML element with "text" attribute set to `text`
-    :rtype: :class:`xml.ElementTree.Element`
+
+def _is_str(fuzz_string):
+    try:
+        str(fuzz_string)
+        return True
+    except ValueError:
+        return False
+
+
+# Checks of whether a fuzz string is of a variable's fuzz type
+_FUZZ_TYPE_CHECKS = {
+    "int": _is_int, "ascii": _is_ascii, "url": _is_url, "str": _is_str}
+
+
+def _get_string_features(strings, fuzz_types):
+    """Returns the features of each fuzz string, for variable limits
+
+    :param list strings: Fuzz strings
+    :param fuzz_types: Fuzz types to check the strings for
+    :returns: list of (set of the fuzz types of a string, its length)
     """
-    ret = copy.copy(ele)
-    ret.text = text
-    return ret
+    checks = [(fuzz_type, _FUZZ_TYPE_CHECKS[fuzz_type])
+              for fuzz_type in set(fuzz_types) if fuzz_type in
+              _FUZZ_TYPE_CHECKS]
+    return [(frozenset(fuzz_type for fuzz_type, check in checks
+                       if check(stri)), len(stri)) for stri in strings]
 
 
-def _update_xml_ele_attribs(ele, attribs):
-    """Copies an XML element, populates attributes from `attribs`
+def _get_var_obj_mask(var_obj, features):
+    """Returns whether each fuzz string is within the limits of `var_obj`
 
-    :param ele: XML element to be copied, modified
-    :type ele: :class:`xml.ElementTree.Element`
-    :param dict attribs: Source of new attribute values for `ele`
-    :returns: XML element with all attributes overwritten by `attribs`
-    :rtype: :class:`xml.ElementTree.Element`
+    :param var_obj: :class:`syntribos.clients.http.VariableObject`
+    :param list features: Features of the fuzz strings, from
+        :func:`_get_string_features`
+    :rtype: list of bool
     """
-    ret = copy.copy(ele)
-    ret.attrib = attribs
-    return ret
+    if not var_obj.fuzz:
+        return [False] * len(features)
+    fuzz_types = set(var_obj.fuzz_types)
+    return [(not fuzz_types or not fuzz_types.isdisjoint(string_types)) and
+            var_obj.min_length <= length <= var_obj.max_length
+            for string_types, length in features]
+
 
+def _get_var_obj_masks(strings, locations):
+    """Returns the mask of fuzz strings each location can take
 
-def _update_inner_xml_ele(ele, list_):
-    """Copies an XML element, populates sub-elements from `list_`
+    The features of the fuzz strings are found once, for the fuzz types of
+    all the variables, rather than for each string and variable.
 
-    Returns a copy of the element with the subelements given via list_
-    :param ele: XML element to be copied, modified
-    :type ele: :class:`xml.ElementTree.Element`
-    :param list list_: List of subelements to append to `ele`
-    :returns: XML element with new subelements from `list_`
-    :rtype: :class:`xml.ElementTree.Element`
+    :returns: list with, for each location, the mask of its variable (see
+        :func:`_get_var_obj_mask`), or None if it has no variable
     """
-    ret = copy.copy(ele)
-    for i, v in enumerate(list_):
-        ret[i] = v
-    return ret
+    var_objs = [location.var_obj for location in locations]
+    if all(var_obj is None for var_obj in var_objs):
+        return var_objs
+    features = _get_string_features(strings, [
+        fuzz_type for var_obj in var_objs if var_obj is not None
+        for fuzz_type in var_obj.fuzz_types])
+    masks = {}
+    for var_obj in var_objs:
+        if var_obj is not None and id(var_obj) not in masks:
+            masks[id(var_obj)] = _get_var_obj_mask(var_obj, features)
+    return [masks.get(id(var_obj)) for var_obj in var_objs]
 
 
 def _check_var_obj_limits(var_obj, fuzz_string):
-    if not var_obj.fuzz:
-        return False
-    if var_obj.fuzz_types:
-        ret = False
-        if "int" in var_obj.fuzz_types:
-            try:
-                int(fuzz_string)
-                ret = True
-            except ValueError:
-                pass
-        if "ascii" in var_obj.fuzz_types:
-            try:
-                fuzz_string.encode('ascii')
-                ret = True
-            except UnicodeEncodeError:
-                pass
-        if "url" in var_obj.fuzz_types:
-            url_re = r"^[A-Za-z0-9\-\._~:\/\?#[\]@!\$&'()*\+,;=%]+$"
-            if re.match(url_re, fuzz_string):
-                ret = True
-        if "str" in var_obj.fuzz_types:
-            try:
-                str(fuzz_string)
-                ret = True
-            except ValueError:
-                pass
-        if not ret:
-            return ret
-
-    if len(fuzz_string) > var_obj.max_length:
-        return False
-    if len(fuzz_string) < var_obj.min_length:
-        return False
-    return True
+    """Returns whether `fuzz_string` is within the limits of `var_obj`"""
+    features = _get_string_features([fuzz_string], var_obj.fuzz_types)
+    return _get_var_obj_mask(var_obj, features)[0]
@@ -26,7 +26,7 @@ class ReDosBody(base_fuzz.BaseFuzzTestCase):
     def test_case(self):
         self.run_default_checks()
         self.diff_signals.register(time_diff(self))
-        if "TIME_DIFF_OVER" in self.diff_signals:
+        if "TIME_DIFF_OVER" in self.diff_signals and self.confirm_time_diff():
             self.register_issue(
                 defect_type="redos_timing",
                 severity=syntribos.MEDIUM,
@@ -50,7 +50,7 @@ class SQLInjectionBody(base_fuzz.BaseFuzzTestCase):
                              "attacks.").format(failed_strings))
 
         self.diff_signals.register(time_diff(self))
-        if "TIME_DIFF_OVER" in self.diff_signals:
+        if "TIME_DIFF_OVER" in self.diff_signals and self.confirm_time_diff():
             self.register_issue(
                 defect_type="sql_timing",
                 severity=syntribos.MEDIUM,
@@ -79,13 +79,13 @@ class UserDefinedVulnBody(base_fuzz.BaseFuzzTestCase):
         conf_var = CONF.user_defined.payload
         if conf_var is None or not os.path.isfile(conf_var):
             return
-        cls.failures = []
         prefix_name = "{filename}_{test_name}_{fuzz_file}_".format(
             filename=filename,
             test_name=cls.test_name,
             fuzz_file=cls.data_key)
         fr = syntribos.tests.fuzz.datagen.fuzz_request(
-            cls.init_req, cls._get_strings(), cls.test_type, prefix_name)
+            cls.baseline.init_req, cls._get_strings(), cls.test_type,
+            prefix_name)
         for fuzz_name, request, fuzz_string, param_path in fr:
             yield cls.extend_class(fuzz_name, fuzz_string, param_path,
                                    {"request": request})
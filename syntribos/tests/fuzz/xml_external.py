@@ -17,6 +17,7 @@ import syntribos
 from syntribos.checks import has_string as has_string
 from syntribos.checks import time_diff as time_diff
 from syntribos.clients.http import parser
+from syntribos.tests import base
 from syntribos.tests.fuzz import base_fuzz
 import syntribos.tests.fuzz.datagen
 
@@ -56,12 +57,13 @@ class XMLExternalEntityBody(base_fuzz.BaseFuzzTestCase):
         prepared_copy_xml = prepared_copy.get_prepared_copy()
         prepared_copy_xml.headers['content-type'] = "application/xml"
 
-        init_response, init_signals = cls.client.send_request(prepared_copy)
-        _, xml_signals = cls.client.send_request(
-            prepared_copy_xml)
+        init_response, init_signals = cls.send_baseline_request(
+            prepared_copy)
+        _, xml_signals = cls.send_baseline_request(prepared_copy_xml)
 
-        cls.init_resp = init_response
-        cls.init_signals = init_signals
+        cls.baseline = base.ExecutionContext(
+            cls.baseline.init_req, init_response, init_signals,
+            dead=init_response is None)
 
         if ("HTTP_CONTENT_TYPE_XML" not in init_signals and
                 "HTTP_CONTENT_TYPE_XML" not in xml_signals):
@@ -75,9 +77,9 @@ class XMLExternalEntityBody(base_fuzz.BaseFuzzTestCase):
                 filename=filename, test_name=cls.test_name,
                 fuzz_file=cls.dtds_data_key, d_index=d_num)
             fr = syntribos.tests.fuzz.datagen.fuzz_request(
-                request_obj, ["&xxe;"], cls.test_type, prefix_name)
+                request_obj, ["&xxe;"], cls.test_type, prefix_name,
+                body_prefix="{0}\n".format(dtd))
             for fuzz_name, request, fuzz_string, param_path in fr:
-                request.data = "{0}\n{1}".format(dtd, request.data)
                 yield cls.extend_class(fuzz_name, fuzz_string, param_path,
                                        {"request": request})
 
@@ -98,7 +100,7 @@ class XMLExternalEntityBody(base_fuzz.BaseFuzzTestCase):
                              "entity attacks.").format(failed_strings))
 
         self.diff_signals.register(time_diff(self))
-        if "TIME_DIFF_OVER" in self.diff_signals:
+        if "TIME_DIFF_OVER" in self.diff_signals and self.confirm_time_diff():
             self.register_issue(
                 defect_type="xml_timing",
                 severity=syntribos.MEDIUM,
@@ -31,7 +31,6 @@ class CorsHeader(base.BaseTestCase):
     test_name = "CORS_WILDCARD_HEADERS"
     test_type = "headers"
     client = client()
-    failures = []
 
     @classmethod
     def get_test_cases(cls, filename, file_content):
@@ -40,10 +39,14 @@ class CorsHeader(base.BaseTestCase):
             file_content, CONF.syntribos.endpoint
         )
         prepared_copy = request_obj.get_prepared_copy()
-        cls.test_resp, cls.test_signals = cls.client.send_request(
-            prepared_copy)
+        cls.request = prepared_copy
         yield cls
 
+    def setUp(self):
+        super(CorsHeader, self).setUp()
+        self.test_resp, self.test_signals = self.client.send_request(
+            self.request)
+
     def test_case(self):
         self.test_signals.register(cors(self))
 
@@ -42,7 +42,6 @@ class XstHeader(base.BaseTestCase):
     test_name = "XST_HEADERS"
     test_type = "headers"
     client = client()
-    failures = []
 
     @classmethod
     def get_test_cases(cls, filename, file_content):
@@ -52,10 +51,14 @@ class XstHeader(base.BaseTestCase):
         prepared_copy = request_obj.get_prepared_copy()
         prepared_copy.method = "TRACE"
         prepared_copy.headers.update(xst_header)
-        cls.test_resp, cls.test_signals = cls.client.send_request(
-            prepared_copy)
+        cls.request = prepared_copy
         yield cls
 
+    def setUp(self):
+        super(XstHeader, self).setUp()
+        self.test_resp, self.test_signals = self.client.send_request(
+            self.request)
+
     def test_case(self):
         self.test_signals.register(xst(self))
 
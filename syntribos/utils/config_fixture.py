@@ -53,6 +53,7 @@ class ConfFixture(config_fixture.Config):
         self.conf.set_default("time_diff_percent", 1000.0, group="test")
         self.conf.set_default("max_time", 10, group="test")
         self.conf.set_default("max_length", 500, group="test")
+        self.conf.set_default("baseline_samples", 1, group="test")
 
     def logger_config_fixture(self):
         """config values for logger group."""
@@ -68,6 +69,8 @@ class ConfFixture(config_fixture.Config):
         self.conf.set_default("output_format", "json")
         self.conf.set_default("min_severity", "LOW")
         self.conf.set_default("min_confidence", "LOW")
+        self.conf.set_default("workers", 1)
+        self.conf.set_default("processes", 1)
 
     def setUp(self):
         super(ConfFixture, self).setUp()
@@ -14,6 +14,8 @@
 import os
 import shutil
 
+import six
+
 
 class ExistingPathType(object):
     def _raise_invalid_file(self, filename, exc=None):
@@ -68,8 +70,11 @@ class ContentType(ExistingPathType):
         if subdir:
             # Path relative to the "templates" directory specified by user
             relative_path = os.path.join(subdir, relative_path)
+        # Python 3 can't read text unbuffered, and buffering doesn't matter
+        # when reading whole files
+        bufsize = self._bufsize if six.PY2 or "b" in self._mode else -1
         try:
-            with open(string, self._mode, self._bufsize) as fp:
+            with open(string, self._mode, bufsize) as fp:
                 return relative_path, fp.read()
         except IOError as exc:
             self._raise_invalid_file(string, exc=exc)
@@ -0,0 +1,90 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Run-wide counters that are printed in the summary at the end of a run
+
+Each statistic is recorded under a name, along with how it should be
+combined with the same statistic from another process (see
+``--processes``):
+
+* ``"sum"`` values are added together (e.g. number of events)
+* ``"max"`` keeps the largest value (e.g. a peak)
+* ``"last"`` keeps the most recently merged value (e.g. a current level)
+"""
+import threading
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def increment(name, amount=1):
+    """Adds `amount` to the counter `name`."""
+    _record(name, "sum", amount)
+
+
+def record_max(name, value):
+    """Records `value` for `name` if it is larger than the current value."""
+    _record(name, "max", value)
+
+
+def record(name, value):
+    """Records `value` as the current value of `name`."""
+    _record(name, "last", value)
+
+
+def _record(name, kind, value):
+    with _lock:
+        _merge_one(name, kind, value)
+
+
+def _merge_one(name, kind, value):
+    if name not in _stats:
+        _stats[name] = (kind, value)
+    elif kind == "sum":
+        _stats[name] = (kind, _stats[name][1] + value)
+    elif kind == "max":
+        _stats[name] = (kind, max(_stats[name][1], value))
+    else:
+        _stats[name] = (kind, value)
+
+
+def get_stats():
+    """Returns a copy of all statistics, which can be passed to `merge`
+
+    :rtype: dict
+    :returns: Dictionary of {name: (kind, value)}
+    """
+    with _lock:
+        return dict(_stats)
+
+
+def merge(stats):
+    """Combines statistics returned by `get_stats` into this process' own
+
+    :param dict stats: Statistics returned by :func:`get_stats`
+    """
+    with _lock:
+        for name, (kind, value) in stats.items():
+            _merge_one(name, kind, value)
+
+
+def reset():
+    """Removes all statistics."""
+    with _lock:
+        _stats.clear()
+
+
+def get_summary():
+    """Returns the statistics as a sorted list of (name, value) tuples."""
+    return [(name, value) for name, (kind, value)
+            in sorted(get_stats().items())]
@@ -0,0 +1,216 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gzip
+import socket
+import threading
+import time
+
+import six
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+import testtools
+
+from syntribos.clients.http import limiter
+from syntribos.clients.http.client import SynHTTPClient
+import syntribos.config
+from syntribos.utils.config_fixture import ConfFixture
+from syntribos.utils import stats
+
+syntribos.config.register_opts()
+
+
+class FakeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves canned responses depending on the request path."""
+
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self, code, body, headers=None):
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if "Transfer-Encoding" not in (headers or {}):
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/gzip":
+            self._respond(200, gzip.compress(b"zipped"), {
+                "Content-Encoding": "gzip",
+                "Content-Type": "text/plain"})
+        elif self.path == "/chunked":
+            self._respond(200, b"3\r\nabc\r\n2\r\nde\r\n0\r\n\r\n", {
+                "Transfer-Encoding": "chunked",
+                "Content-Type": "application/json"})
+        elif self.path == "/redirect":
+            self._respond(302, b"", {"Location": "/gzip"})
+        elif self.path == "/slow":
+            time.sleep(0.5)
+            self._respond(200, b"")
+        elif self.path == "/drop":
+            # Close the connection without saying so
+            self._respond(200, b"dropped")
+            self.close_connection = True
+        else:
+            self._respond(500, self.path.encode("utf-8"), {
+                "Content-Type": "application/json",
+                "Set-Cookie": "session=1234"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self._respond(201, body, {"Content-Type": "text/xml"})
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+@testtools.skipIf(six.PY2, "The asyncio transport requires Python 3")
+class AsyncClientUnittest(testtools.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(AsyncClientUnittest, cls).setUpClass()
+        cls.server = FakeServer(("127.0.0.1", 0), FakeHandler)
+        cls.url = "http://127.0.0.1:{0}".format(cls.server.server_port)
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super(AsyncClientUnittest, cls).tearDownClass()
+
+    def setUp(self):
+        super(AsyncClientUnittest, self).setUp()
+        self.useFixture(ConfFixture()).config(
+            transport="asyncio", adaptive_concurrency=False,
+            group="syntribos")
+        self.client = SynHTTPClient()
+
+    def test_response_signals(self):
+        """Check that responses get status code and content type signals."""
+        resp, signals = self.client.request("GET", self.url + "/x?a=1")
+        self.assertEqual(500, resp.status_code)
+        self.assertEqual(b"/x?a=1", resp.content)
+        self.assertEqual("1234", resp.cookies["session"])
+        self.assertIn("HTTP_STATUS_CODE_5XX_500", signals)
+        self.assertIn("HTTP_CONTENT_TYPE_JSON", signals)
+
+    def test_post_body(self):
+        """Check that request bodies are sent."""
+        resp, signals = self.client.request("POST", self.url, data="<a/>")
+        self.assertEqual(201, resp.status_code)
+        self.assertEqual("<a/>", resp.text)
+        self.assertIn("HTTP_CONTENT_TYPE_XML", signals)
+
+    def test_gzip_and_redirect(self):
+        """Check that redirects are followed and bodies are decoded."""
+        resp, signals = self.client.request("GET", self.url + "/redirect")
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(b"zipped", resp.content)
+        self.assertEqual([302], [r.status_code for r in resp.history])
+
+    def test_chunked(self):
+        """Check that chunked bodies are read."""
+        resp, signals = self.client.request("GET", self.url + "/chunked")
+        self.assertEqual(b"abcde", resp.content)
+
+    def test_limits_body(self):
+        """Check that bodies over the limit are read, but not kept."""
+        from syntribos.clients.http import async_client
+
+        async_client.get_transport().close()
+        stats.reset()
+        self.addCleanup(stats.reset)
+        self.useFixture(ConfFixture()).config(
+            max_response_size=3, group="syntribos")
+        for path, content, length in (("/chunked", b"abc", 5),
+                                      ("/gzip", b"zip", 6),
+                                      ("/chunked", b"abc", 5)):
+            resp, signals = self.client.request("GET", self.url + path)
+            self.assertEqual(content, resp.content)
+            self.assertTrue(resp.body_truncated)
+            self.assertEqual(length, resp.body_length)
+        # The whole body was read, so the connection was kept
+        host = self.url.split("//")[1]
+        self.assertEqual(2, dict(stats.get_summary())[
+            "Connection pool hits ({0})".format(host)])
+
+    def test_read_timeout(self):
+        """Check that timeouts give the same signals as requests."""
+        resp, signals = self.client.request(
+            "GET", self.url + "/slow", requestslib_kwargs={"timeout": 0.1})
+        self.assertIsNone(resp)
+        self.assertIn("HTTP_FAIL_READ_TIMEOUT", signals)
+        self.assertIn("CONNECTION_TIMEOUT", signals)
+
+    def test_connection_refused(self):
+        """Check that connection errors give the same signals as requests."""
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        resp, signals = self.client.request(
+            "GET", "http://127.0.0.1:{0}/".format(port))
+        self.assertIsNone(resp)
+        self.assertIn("HTTP_FAIL_CONNECTION_ERROR", signals)
+
+    def test_request_async(self):
+        """Check that many requests can be in flight at once."""
+        pending = [self.client.request_async("GET", self.url + "/slow")
+                   for _ in range(20)]
+        start = time.time()
+        results = [f.result() for f in pending]
+        self.assertLess(time.time() - start, 5)
+        for resp, signals in results:
+            self.assertEqual(200, resp.status_code)
+            self.assertIn("HTTP_STATUS_CODE_2XX_200", signals)
+
+    def test_keep_alive(self):
+        """Check that connections are reused, and replaced once closed."""
+        from syntribos.clients.http import async_client
+
+        async_client.get_transport().close()
+        stats.reset()
+        self.addCleanup(stats.reset)
+        for path, body in (("/x", b"/x"), ("/drop", b"dropped"),
+                           ("/x", b"/x"), ("/chunked", b"abcde")):
+            resp, signals = self.client.request("GET", self.url + path)
+            self.assertEqual(body, resp.content)
+        # The connection closed after /drop is replaced for the next request
+        host = self.url.split("//")[1]
+        summary = dict(stats.get_summary())
+        self.assertEqual(2, summary["Connection pool misses ({0})".format(
+            host)])
+        self.assertEqual(2, summary["Connection pool hits ({0})".format(
+            host)])
+
+    def test_rate_limit(self):
+        """Check that rate limited requests are delayed on the loop."""
+        self.useFixture(ConfFixture()).config(
+            rate_limit=10, group="syntribos")
+        self.addCleanup(limiter._buckets.clear)
+        start = time.time()
+        pending = [self.client.request_async("GET", self.url + "/chunked")
+                   for _ in range(4)]
+        self.assertLess(time.time() - start, 0.2)
+        for resp, signals in [f.result() for f in pending]:
+            self.assertEqual(200, resp.status_code)
+        self.assertGreaterEqual(time.time() - start, 0.3)
@@ -0,0 +1,117 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+
+import fixtures
+import requests
+import testtools
+
+from syntribos.bench import benchmark
+from syntribos.bench.server import BenchServer
+import syntribos.config
+from syntribos.utils.config_fixture import ConfFixture
+
+syntribos.config.register_opts()
+
+
+class BenchServerUnittest(testtools.TestCase):
+
+    def _server(self, **kwargs):
+        server = BenchServer(**kwargs)
+        server.start()
+        self.addCleanup(server.stop)
+        return server
+
+    def test_vulnerable(self):
+        """Check that fuzzed input gets the responses checks look for."""
+        server = self._server(long_input=100, slow_delay=0)
+        url = server.url + "/v1/items"
+        resp = requests.post(url, json={"name": "<script>"})
+        self.assertEqual(200, resp.status_code)
+        self.assertIn("<script>", resp.json()["echo"])
+        resp = requests.get(url, params={"q": "' OR 1=1 --"})
+        self.assertEqual(500, resp.status_code)
+        self.assertIn("SQL syntax", resp.text)
+        resp = requests.get(url, params={"q": "; cat /etc/passwd"})
+        self.assertIn("Traceback (most recent call last):", resp.text)
+        self.assertEqual(500, requests.post(url, data="x y" * 50).status_code)
+        requests.get(url, params={"q": "a" * 20})
+        self.assertEqual({"ok": 1, "sql_error": 1, "stacktrace": 1,
+                          "long_input": 1, "slow": 1}, dict(server.counts))
+
+    def test_not_vulnerable(self):
+        """Check that fuzzed input is ignored unless vulnerable is set."""
+        server = self._server(vulnerable=False, body_size=200)
+        resp = requests.get(server.url, params={"q": "' OR 1=1 --"})
+        self.assertEqual(200, resp.status_code)
+        self.assertNotIn("echo", resp.json())
+        self.assertEqual(200, len(resp.content))
+
+    def test_error_rate(self):
+        """Check that errors are injected at the configured rate."""
+        server = self._server(error_rate=1)
+        self.assertEqual(503, requests.get(server.url).status_code)
+
+
+class BenchmarkUnittest(testtools.TestCase):
+
+    def test_percentile(self):
+        """Check nearest rank percentiles."""
+        values = list(range(100, 0, -1))
+        self.assertEqual(50, benchmark.percentile(values, 50))
+        self.assertEqual(99, benchmark.percentile(values, 99))
+        self.assertEqual(100, benchmark.percentile(values, 100))
+        self.assertEqual(7, benchmark.percentile([7], 99))
+        self.assertIsNone(benchmark.percentile([], 50))
+
+    def test_run_args(self):
+        """Check that the benchmarked run is pointed at the server."""
+        self.useFixture(ConfFixture())
+        args = benchmark.get_run_args(
+            ["-t", "bench", "-o", "out.json", "bench"],
+            "http://127.0.0.1:8080", "/tmp/bench")
+        self.assertEqual(["-t", "bench", "-o", "out.json"], args[:4])
+        self.assertEqual("run", args[-1])
+        self.assertEqual("http://127.0.0.1:8080",
+                         args[args.index("--syntribos-endpoint") + 1])
+        self.assertEqual(benchmark.TEMPLATES_DIR,
+                         args[args.index("--syntribos-templates") + 1])
+
+    def test_run(self):
+        """Check that a benchmark runs syntribos and reports on the run."""
+        work_dir = self.useFixture(fixtures.TempDir()).path
+        os.mkdir(os.path.join(work_dir, "payloads"))
+        with open(os.path.join(work_dir, "payloads",
+                               "sql-injection.txt"), "w") as payloads:
+            payloads.write("' OR 1=1 --\nwidget\n")
+        config_path = os.path.join(work_dir, "bench.conf")
+        with open(config_path, "w") as config:
+            config.write("[syntribos]\ncustom_root={0}\npayloads={1}\n"
+                         "[logging]\nlog_dir={0}\n".format(
+                             work_dir, os.path.join(work_dir, "payloads")))
+        report_path = os.path.join(work_dir, "report.json")
+        self.useFixture(ConfFixture()).config(outfile=report_path)
+        self.assertEqual(0, benchmark.run(
+            ["--config-file", config_path, "-t", "SQL_INJECTION_PARAMS",
+             "bench"]))
+        with open(report_path) as report_file:
+            report = json.load(report_file)
+        self.assertEqual(sum(report["server_responses"].values()),
+                         report["requests"])
+        self.assertGreater(report["requests"], 0)
+        self.assertEqual(0, report["request_errors"])
+        self.assertGreater(report["issues"], 0)
+        self.assertIsNotNone(report["cpu_per_request"])
+        self.assertIsNotNone(report["latency_p50"])
@@ -0,0 +1,89 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import requests
+import requests_mock
+import testtools
+
+from syntribos.clients.http import body
+from syntribos.clients.http.client import SynHTTPClient
+import syntribos.config
+from syntribos.utils.config_fixture import ConfFixture
+
+syntribos.config.register_opts()
+
+
+class BodyUnittest(testtools.TestCase):
+
+    def setUp(self):
+        super(BodyUnittest, self).setUp()
+        self.conf = self.useFixture(ConfFixture())
+        self.conf.config(adaptive_concurrency=False, max_response_size=25,
+                         group="syntribos")
+
+    def _response(self, headers=None):
+        response = requests.Response()
+        response.headers = requests.structures.CaseInsensitiveDict(
+            headers or {})
+        return response
+
+    def test_whole_body(self):
+        """Check that bodies under the limit are read whole."""
+        response = self._response()
+        self.assertTrue(body.read_body(response, [b"abc", b"def"]))
+        self.assertEqual(b"abcdef", response.content)
+        self.assertFalse(response.body_truncated)
+        self.assertEqual(6, body.get_body_length(response))
+
+    def test_truncated(self):
+        """Check that bodies over the limit are truncated, but read."""
+        response = self._response({"Content-Length": "50"})
+        chunks = iter([b"0123456789"] * 5)
+        self.assertTrue(body.read_body(response, chunks))
+        self.assertEqual([], list(chunks))
+        self.assertEqual(b"0123456789" * 2 + b"01234", response.content)
+        self.assertTrue(response.body_truncated)
+        self.assertEqual(50, body.get_body_length(response))
+
+    def test_truncated_without_length(self):
+        """Check that the bytes read are counted past the limit."""
+        response = self._response({"Content-Length": "20",
+                                   "Content-Encoding": "gzip"})
+        body.read_body(response, [b"0123456789"] * 5)
+        self.assertEqual(50, body.get_body_length(response))
+
+    def test_stop_on(self):
+        """Check that reading stops at a key, even split across chunks."""
+        response = self._response()
+        chunks = iter([b"abc", b"syntax ", b"err", b"or", b"def"])
+        self.assertFalse(body.read_body(
+            response, chunks, stop_on=["syntax error"]))
+        self.assertEqual(b"abcsyntax error", response.content)
+        self.assertTrue(response.body_truncated)
+        self.assertEqual([b"def"], list(chunks))
+
+    def test_no_limit(self):
+        """Check that a limit of 0 means no limit."""
+        self.conf.config(max_response_size=0, group="syntribos")
+        response = self._response()
+        self.assertTrue(body.read_body(response, [b"0123456789"] * 5))
+        self.assertEqual(50, len(response.content))
+
+    @requests_mock.Mocker()
+    def test_client_limits_body(self, m):
+        """Check that the HTTP client only reads up to the limit."""
+        m.register_uri("GET", "http://example.com", content=b"x" * 100,
+                       headers={"Content-Length": "100"})
+        resp, signals = SynHTTPClient().request("GET", "http://example.com")
+        self.assertEqual(b"x" * 25, resp.content)
+        self.assertEqual(100, body.get_body_length(resp))
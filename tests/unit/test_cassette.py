@@ -0,0 +1,111 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+import tempfile
+
+import requests.exceptions as rex
+import requests_mock
+import testtools
+
+from syntribos.clients.http import body
+from syntribos.clients.http import cassette
+from syntribos.clients.http.client import SynHTTPClient
+import syntribos.config
+from syntribos.utils.config_fixture import ConfFixture
+
+syntribos.config.register_opts()
+
+URL = "http://example.com/v1/items"
+
+
+class CassetteUnittest(testtools.TestCase):
+
+    def setUp(self):
+        super(CassetteUnittest, self).setUp()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.path = os.path.join(tmp_dir, "test.cassette")
+        self.conf = self.useFixture(ConfFixture())
+        self.conf.config(adaptive_concurrency=False, cassette=self.path,
+                         max_response_size=25, group="syntribos")
+        self.addCleanup(setattr, cassette, "_cassette", None)
+        cassette.start()
+
+    def _replay(self):
+        self.conf.config(cassette_mode="replay", group="syntribos")
+        return SynHTTPClient()
+
+    @staticmethod
+    def _time_out(request, context):
+        raise rex.ConnectTimeout("timed out", request=request)
+
+    @requests_mock.Mocker()
+    def _record(self, m):
+        m.register_uri("GET", URL, [{"text": "first", "status_code": 200},
+                                    {"text": "second", "status_code": 404}])
+        m.register_uri("POST", URL, text="created", status_code=201)
+        m.register_uri("GET", URL + "/big", content=b"x" * 100,
+                       headers={"Content-Length": "100"})
+        m.register_uri("GET", URL + "/slow", text=self._time_out)
+        client = SynHTTPClient()
+        client.request("GET", URL)
+        client.request("GET", URL)
+        client.request("POST", URL, data={"name": "widget"})
+        client.request("GET", URL + "/big")
+        client.request("GET", URL + "/slow")
+
+    def test_replay(self):
+        """Check that recorded responses are replayed in order."""
+        self._record()
+        client = self._replay()
+        resp, _ = client.request("POST", URL, data={"name": "widget"})
+        self.assertEqual((201, "created"), (resp.status_code, resp.text))
+        statuses = [client.request("GET", URL)[0].status_code
+                    for _ in range(3)]
+        self.assertEqual([200, 404, 404], statuses)
+
+    def test_replay_truncated_body(self):
+        """Check that truncated bodies are replayed with their length."""
+        self._record()
+        resp, _ = self._replay().request("GET", URL + "/big")
+        self.assertEqual(b"x" * 25, resp.content)
+        self.assertEqual(100, body.get_body_length(resp))
+
+    def test_replay_error(self):
+        """Check that recorded exceptions are raised again."""
+        self._record()
+        resp, signals = self._replay().request("GET", URL + "/slow")
+        self.assertIsNone(resp)
+        self.assertIn("HTTP_FAIL_CONNECT_TIMEOUT",
+                      [signal.slug for signal in signals])
+
+    def test_miss(self):
+        """Check that requests that weren't recorded aren't replayed."""
+        self._record()
+        resp, signals = self._replay().request(
+            "POST", URL, data={"name": "gadget"})
+        self.assertIsNone(resp)
+        self.assertIn("HTTP_FAIL_CASSETTE_MISS",
+                      [signal.slug for signal in signals])
+
+    def test_truncated_cassette(self):
+        """Check that a record cut short is ignored, not the whole file."""
+        self._record()
+        with open(self.path, "rb+") as cassette_file:
+            cassette_file.truncate(os.path.getsize(self.path) - 5)
+        client = self._replay()
+        self.assertEqual(
+            200, client.request("GET", URL)[0].status_code)
+        self.assertIsNone(client.request("GET", URL + "/slow")[0])
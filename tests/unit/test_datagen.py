@@ -11,6 +11,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import collections
 import json
 from xml.etree import ElementTree
 
@@ -105,6 +106,35 @@ class FuzzDatagenUnittest(testtools.TestCase):
             self.assertEqual("unitteststr1_model{0}".format(i), name)
         self.assertEqual(4, i)
 
+    def test_fuzz_data_dict_with_list_of_dicts(self):
+        """Test _fuzz_data with a dict containing a list of dicts."""
+        data = {"a": [{"b": "c"}, "d"], "e": {"f": ["g"]}}
+        results = list(fuzz_datagen._fuzz_data(["test"], data, action_field,
+                                               "unittest"))
+        self.assertEqual(
+            [({"a": [{"b": "test"}, "d"], "e": {"f": ["g"]}}, "a[0]/b"),
+             ({"a": [{"b": "c"}, "test"], "e": {"f": ["g"]}}, "a[1]"),
+             ({"a": [{"b": "c"}, "d"], "e": {"f": ["test"]}}, "e/f[0]")],
+            sorted([(r[1], r[3]) for r in results], key=lambda r: r[1]))
+        self.assertEqual({"a": [{"b": "c"}, "d"], "e": {"f": ["g"]}}, data)
+
+    def test_fuzz_locations(self):
+        """Test that fuzz locations are only found once for a model."""
+        var_obj = VariableObject("var", min_length=2)
+        data = {"a": {"b": var_obj, "ACTION_FIELD:d": "e"}, "f": ["g"]}
+        locations = fuzz_datagen.get_fuzz_locations(data, action_field)
+        self.assertEqual(
+            [("a/b", "dict", ("a", "b"), var_obj),
+             ("f[0]", "list", ("f", 0), None)],
+            sorted(locations))
+        self.assertIs(locations,
+                      fuzz_datagen.get_fuzz_locations(data, action_field))
+        # "x" is too short for the variable
+        self.assertEqual(
+            ["a/b", "f[0]", "f[0]"],
+            sorted(r[3] for r in fuzz_datagen._fuzz_data(
+                ["x", "xx"], data, action_field, "unittest")))
+
     def test_fuzz_data_xml(self):
         """Test _fuzz_data_ with an XML element."""
         data = ElementTree.Element("a")
@@ -263,6 +293,115 @@ class FuzzDatagenUnittest(testtools.TestCase):
             self.assertIn(req.params, expected_param_objs)
         self.assertEqual(i, 4)
 
+    def test_fuzzed_requests_share_request(self):
+        """Test that fuzz_request builds fuzzed bodies when they're read."""
+        req = post_req("/api/v1/endpoint",
+                       data={"a": [{"b": "c"}, "d"], "e": "f"})
+        results = list(fuzz_datagen.fuzz_request(req, ["test"], "data",
+                                                 "ut"))
+        requests = [r[1] for r in results]
+        for request in requests:
+            self.assertIsInstance(request, fuzz_datagen.FuzzedRequest)
+            self.assertEqual(get_url("/api/v1/endpoint"), request.url)
+        self.assertEqual(
+            [{"a": [{"b": "c"}, "d"], "e": "test"},
+             {"a": [{"b": "c"}, "test"], "e": "f"},
+             {"a": [{"b": "test"}, "d"], "e": "f"}],
+            sorted([json.loads(r.data) for r in requests],
+                   key=lambda d: json.dumps(d, sort_keys=True)))
+        self.assertEqual({"a": [{"b": "c"}, "d"], "e": "f"}, req.data)
+
+        requests[0].data = "changed"
+        request_copy = requests[0].get_copy()
+        self.assertIsInstance(request_copy, RequestObject)
+        self.assertEqual("changed", request_copy.data)
+        self.assertNotEqual("changed", requests[1].data)
+
+    def test_fuzzed_requests_generated_values(self):
+        """Test that requests with generated values are prepared each time."""
+        var_obj = VariableObject("id", var_type="generator", val="uuid.uuid4",
+                                 fuzz=False)
+        req = post_req("/api/v1/endpoint", data={"id": var_obj, "a": "b"})
+        requests = [r[1] for r in fuzz_datagen.fuzz_request(
+            req, ["test", "test2"], "data", "ut")]
+        self.assertEqual(2, len(requests))
+        for request in requests:
+            self.assertIsInstance(request, RequestObject)
+        self.assertNotEqual(json.loads(requests[0].data)["id"],
+                            json.loads(requests[1].data)["id"])
+
+    def test_json_segments(self):
+        """Test that spliced JSON bodies are serialized as json.dumps does."""
+        model = collections.OrderedDict([
+            ("a", {"b": [1, 2.5, None, True, {"c": u"\u0124\"\\"}, []]}),
+            ("d", {}), ("e", u"f\u2028")])
+        segments = fuzz_datagen.JSONSegments(model)
+        self.assertEqual(json.dumps(model), segments.join())
+        self.assertNotIn(("a", "b", 5), segments.paths)
+        for path in segments.paths:
+            for value in ("x", u"\u00DF\n\"}", 10, None):
+                expected = fuzz_datagen._build_dict_model(model, path, value)
+                self.assertEqual(json.dumps(expected),
+                                 segments.join(path, value))
+
+    def test_xml_segments(self):
+        """Test that spliced XML bodies are serialized as _string_data does."""
+        model = ElementTree.fromstring(
+            u'<a x="1" y="&amp;&#10;"><b>c</b><d>&lt;e</d><f z="\u0124"/>'
+            u'<g>h<i/>j</g></a>')
+        segments = fuzz_datagen.XMLSegments(model)
+        self.assertEqual(RequestObject._string_data(model), segments.join())
+        for location in fuzz_datagen.get_fuzz_locations(model, "ACTION"):
+            for value in ("x", "&lt;&", u"\u00DF\x85\"'\n"):
+                expected = fuzz_datagen._build_model(model, location, value)
+                self.assertEqual(RequestObject._string_data(expected),
+                                 segments.join(location.path, value))
+        # Empty text of an element without children isn't spliced
+        self.assertIsNone(segments.join((0, ), ""))
+        self.assertEqual(
+            RequestObject._string_data(model).replace("<g>h", "<g>"),
+            segments.join((3, ), ""))
+
+    def test_fuzzed_requests_body_prefix(self):
+        """Test that the body prefix is put before each fuzzed body."""
+        data = ElementTree.fromstring("<a><b>c</b></a>")
+        requests = [r[1] for r in fuzz_datagen.fuzz_request(
+            post_req("/api/v1/endpoint", data=data), ["&xxe;"], "data", "ut",
+            body_prefix="<!DOCTYPE a>\n")]
+        self.assertEqual(["<!DOCTYPE a>\n<a><b>&xxe;</b></a>"],
+                         [r.data for r in requests])
+        self.assertEqual(requests[0].data, requests[0].get_copy().data)
+
+    def test_fuzzed_requests_nested_list(self):
+        """Test that values that aren't spliced are serialized whole."""
+        req = post_req("/api/v1/endpoint", data={"a": [["b"], "c"]})
+        requests = [r[1] for r in fuzz_datagen.fuzz_request(
+            req, ["test"], "data", "ut")]
+        self.assertEqual([{"a": ["test", "c"]}, {"a": [["b"], "test"]}],
+                         [json.loads(r.data) for r in requests])
+
+    def test_var_obj_masks(self):
+        """Test that masks select the strings within each variable's limits."""
+        strings = ["12", "test", u"\u0124", "cd /etc; cat passwd", "", "a"]
+        var_objs = [
+            VariableObject("a", val="1", fuzz_types=["int"]),
+            VariableObject("b", val="1", fuzz_types=["ascii", "url"],
+                           min_length=1, max_length=4),
+            VariableObject("c", val="1", fuzz_types=["url", "unknown"]),
+            VariableObject("d", val="1", fuzz=False),
+            VariableObject("e", val="1", min_length=2)]
+        locations = [fuzz_datagen.FuzzLocation("a", "dict", ("a", ), v)
+                     for v in var_objs]
+        locations.append(fuzz_datagen.FuzzLocation("f", "dict", ("f", ),
+                                                   None))
+        masks = fuzz_datagen._get_var_obj_masks(strings, locations)
+        self.assertIsNone(masks[-1])
+        for var_obj, mask in zip(var_objs, masks):
+            self.assertEqual(
+                [fuzz_datagen._check_var_obj_limits(var_obj, stri)
+                 for stri in strings], mask)
+        self.assertEqual([True, True, False, False, False, True], masks[1])
+
     def test_var_obj_limits_fuzz(self):
         var_obj = VariableObject(name="no_fuzz_var", val="test", fuzz=False)
         string = "test"
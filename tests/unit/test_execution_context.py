@@ -0,0 +1,124 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import datetime
+
+import testtools
+
+import syntribos.config
+from syntribos.signal import SignalHolder
+from syntribos.signal import SynSignal
+from syntribos.tests import base
+from syntribos.utils.config_fixture import ConfFixture
+
+syntribos.config.register_opts()
+
+
+class FakeTestCase(base.BaseTestCase):
+    def test_case(self):
+        pass
+
+
+class FakeRequest(object):
+    def __init__(self, url="http://localhost/"):
+        self.method = "GET"
+        self.url = url
+        self.headers = {"Accept": "application/json"}
+        self.params = {}
+        self.data = None
+
+
+class FakeResponse(object):
+    def __init__(self, elapsed):
+        self.elapsed = datetime.timedelta(seconds=elapsed)
+
+
+class FakeClient(object):
+    def __init__(self, elapsed):
+        self.elapsed = list(elapsed)
+        self.sent = []
+
+    def send_request(self, request):
+        self.sent.append(request)
+        return FakeResponse(self.elapsed.pop(0)), SignalHolder()
+
+
+class ExecutionContextUnittest(testtools.TestCase):
+
+    def setUp(self):
+        super(ExecutionContextUnittest, self).setUp()
+        self.init_req = object()
+        self.init_resp = object()
+        init_signals = SignalHolder(SynSignal(slug="INIT", strength=1))
+        self.baseline = base.ExecutionContext(
+            self.init_req, self.init_resp, init_signals)
+        self.addCleanup(setattr, FakeTestCase, "baseline",
+                        FakeTestCase.baseline)
+        FakeTestCase.baseline = self.baseline
+
+    def test_cases_share_baseline(self):
+        """Check that cases share the template's request and response."""
+        case = FakeTestCase("test_case")
+        self.assertIs(self.init_req, case.init_req)
+        self.assertIs(self.init_resp, case.init_resp)
+        self.assertIn("INIT", case.init_signals)
+        self.assertFalse(case.dead)
+
+    def test_cases_do_not_share_state(self):
+        """Check that state written by one case isn't seen by another."""
+        case1 = FakeTestCase("test_case")
+        case2 = FakeTestCase("test_case")
+        case1.failures.append("issue")
+        case1.diff_signals.register(SynSignal(slug="DIFF", strength=1))
+        case1.init_signals.register(SynSignal(slug="CHECK", strength=1))
+        case1.test_resp = object()
+        case1.dead = True
+
+        self.assertEqual([], case2.failures)
+        self.assertNotIn("DIFF", case2.diff_signals)
+        self.assertNotIn("CHECK", case2.init_signals)
+        self.assertNotIn("CHECK", self.baseline.init_signals)
+        self.assertIsNone(case2.test_resp)
+        self.assertFalse(case2.dead)
+
+
+class BaselineCacheUnittest(testtools.TestCase):
+
+    def setUp(self):
+        super(BaselineCacheUnittest, self).setUp()
+        self.conf = self.useFixture(ConfFixture())
+        base.clear_baseline_cache()
+        self.addCleanup(base.clear_baseline_cache)
+        self.addCleanup(setattr, FakeTestCase, "client", FakeTestCase.client)
+
+    def test_baseline_reused(self):
+        """Check that the same baseline request is only sent once."""
+        FakeTestCase.client = FakeClient([0.1, 0.2])
+        first = FakeTestCase.send_baseline_request(FakeRequest())
+        self.assertIs(first, FakeTestCase.send_baseline_request(FakeRequest()))
+        self.assertEqual(1, len(FakeTestCase.client.sent))
+        FakeTestCase.send_baseline_request(FakeRequest("http://localhost/a"))
+        self.assertEqual(2, len(FakeTestCase.client.sent))
+
+        base.clear_baseline_cache()
+        FakeTestCase.client = FakeClient([0.3])
+        FakeTestCase.send_baseline_request(FakeRequest())
+        self.assertEqual(1, len(FakeTestCase.client.sent))
+
+    def test_median_sample(self):
+        """Check that the sample with the median response time is kept."""
+        self.conf.config(baseline_samples=3, group="test")
+        FakeTestCase.client = FakeClient([0.5, 0.1, 0.3])
+        resp, signals = FakeTestCase.send_baseline_request(FakeRequest())
+        self.assertEqual(3, len(FakeTestCase.client.sent))
+        self.assertEqual(0.3, resp.elapsed.total_seconds())
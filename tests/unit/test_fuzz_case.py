@@ -0,0 +1,180 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import datetime
+
+import testtools
+
+import syntribos.config
+from syntribos.result import RecordingTestResult
+from syntribos.runner import Runner
+from syntribos.tests.base import ExecutionContext
+from syntribos.tests.fuzz import base_fuzz
+from syntribos.utils.config_fixture import ConfFixture
+from syntribos.utils import stats
+
+syntribos.config.register_opts()
+
+
+def _fake_fuzz_test_case(seen, fail_in=None):
+    """Returns a fuzz test that records its cases instead of sending them.
+
+    The test raises an exception in `fail_in` ("setUp" or "tearDown") if
+    given, or registers an issue if `fail_in` is "test_case".
+    """
+    class FakeFuzzTestCase(base_fuzz.BaseFuzzTestCase):
+        def setUp(self):
+            if fail_in == "setUp":
+                raise ValueError
+
+        def test_case(self):
+            seen.append((self.fuzz_string, self.param_path, self.request))
+            if fail_in == "test_case":
+                self.failures.append("issue")
+
+        def tearDown(self):
+            if fail_in == "tearDown":
+                raise ValueError
+    return FakeFuzzTestCase
+
+
+class FuzzCaseUnittest(testtools.TestCase):
+
+    def setUp(self):
+        super(FuzzCaseUnittest, self).setUp()
+        self.seen = []
+        self.test_class = _fake_fuzz_test_case(self.seen)
+        self.case = self.test_class.extend_class(
+            "templates/a.template_FAKE_sql.txt_id=1", "' OR 1=1", "id",
+            {"request": "req"})
+
+    def test_no_class_created(self):
+        """Check that fuzz cases are slotted objects, not new classes."""
+        self.assertIsInstance(self.case, base_fuzz.FuzzCase)
+        self.assertFalse(hasattr(self.case, "__dict__"))
+        self.assertEqual("templates_a.template_FAKE_sql.txt_id_1",
+                         self.case.__name__)
+
+    def test_call_returns_test(self):
+        """Check that calling a case returns a test for its request."""
+        test = self.case("run_test_case")
+        self.assertIsInstance(test, self.test_class)
+        self.assertIs(self.case, test.case)
+        self.assertEqual("req", test.request)
+        self.assertIn("templates_a.template_FAKE_sql.txt_id_1", str(test))
+
+    def test_run_test(self):
+        """Check that the runner runs fuzz cases without a TestSuite."""
+        result = RecordingTestResult()
+        Runner.run_test(self.case, result)
+        self.assertEqual([("' OR 1=1", "id", "req")], self.seen)
+        self.assertEqual(["startTest", "addSuccess", "stopTest"],
+                         [method for method, args in result.events])
+
+    def _run(self, fail_in):
+        test_class = _fake_fuzz_test_case(self.seen, fail_in)
+        result = RecordingTestResult()
+        test_class.extend_class("a", "b", "c", {"request": "d"}).run(result)
+        return [method for method, args in result.events]
+
+    def test_failure(self):
+        """Check that issues registered by a case are failures."""
+        self.assertEqual(["startTest", "addFailure", "stopTest"],
+                         self._run("test_case"))
+
+    def test_setup_error(self):
+        """Check that the test isn't run if setUp raises an exception."""
+        self.assertEqual(["startTest", "addError", "stopTest"],
+                         self._run("setUp"))
+        self.assertEqual([], self.seen)
+
+    def test_teardown_error(self):
+        """Check that exceptions in tearDown are errors."""
+        self.assertEqual(["startTest", "addError", "stopTest"],
+                         self._run("tearDown"))
+        self.assertEqual(1, len(self.seen))
+
+
+class _FakeRequest(object):
+    method = "GET"
+    url = "http://localhost/"
+    headers = params = data = None
+
+    def get_prepared_copy(self):
+        return self
+
+
+class _FakeResponse(object):
+
+    def __init__(self, seconds):
+        self.elapsed = datetime.timedelta(seconds=seconds)
+
+
+class _FakeClient(object):
+    """Answers baseline and fuzzed requests, taking the given times."""
+
+    def __init__(self, init_times, test_times):
+        self.init_times = list(init_times)
+        self.test_times = list(test_times)
+
+    def send_request(self, request):
+        return _FakeResponse(self.init_times.pop(0)), []
+
+    def request(self, **kwargs):
+        return _FakeResponse(self.test_times.pop(0)), []
+
+
+class ConfirmTimeDiffUnittest(testtools.TestCase):
+
+    def setUp(self):
+        super(ConfirmTimeDiffUnittest, self).setUp()
+        self.conf = self.useFixture(ConfFixture())
+        stats.reset()
+        self.addCleanup(stats.reset)
+
+    def _confirm(self, init_times, test_times, confirmations):
+        self.conf.config(timing_confirmations=confirmations, group="test")
+        self.client = _FakeClient(init_times, test_times)
+
+        class FakeFuzzTestCase(base_fuzz.BaseFuzzTestCase):
+            client = self.client
+            baseline = ExecutionContext(init_req=_FakeRequest())
+        test = FakeFuzzTestCase.extend_class(
+            "a", "' OR SLEEP(20)", "id", {"request": _FakeRequest()})
+        return test("run_test_case").confirm_time_diff()
+
+    def test_no_confirmations(self):
+        """Check that nothing is sent again by default."""
+        self.assertTrue(self._confirm([0.1], [20], 0))
+        self.assertEqual([0.1], self.client.init_times)
+        self.assertEqual([], stats.get_summary())
+
+    def test_confirmed(self):
+        """Check that a difference repeated every time is confirmed."""
+        self.assertTrue(self._confirm([0.1, 0.2], [20, 30], 2))
+        self.assertEqual([], self.client.test_times)
+        self.assertEqual([("Time differences confirmed", 1),
+                          ("Timing confirmation requests", 4)],
+                         stats.get_summary())
+
+    def test_not_confirmed(self):
+        """Check that confirmation stops at the first fast response."""
+        self.assertFalse(self._confirm([0.1, 0.1, 0.1], [20, 0.2, 20], 3))
+        self.assertEqual([0.1], self.client.init_times)
+        self.assertEqual([("Time differences not confirmed", 1),
+                          ("Timing confirmation requests", 4)],
+                         stats.get_summary())
+
+    def test_slow_baseline(self):
+        """Check that a slow baseline response makes the difference fail."""
+        self.assertFalse(self._confirm([20], [20], 1))
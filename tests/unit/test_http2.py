@@ -0,0 +1,205 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+
+import mock
+import six
+from six.moves import socketserver
+import testtools
+
+from syntribos.bench.server import BenchServer
+from syntribos.clients.http.client import SynHTTPClient
+import syntribos.config
+from syntribos.utils.config_fixture import ConfFixture
+from syntribos.utils import stats
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+except ImportError:
+    h2 = None
+
+if six.PY2:
+    http2 = None
+else:
+    from syntribos.clients.http import http2
+
+syntribos.config.register_opts()
+
+
+class H2Handler(socketserver.BaseRequestHandler):
+    """Answers HTTP/2 requests (with prior knowledge) on one connection
+
+    Responses are held until ``server.hold`` requests have been received,
+    then sent all at once, so clients must send them concurrently.
+    """
+
+    def handle(self):
+        conn = h2.connection.H2Connection(config=h2.config.H2Configuration(
+            client_side=False, header_encoding="utf-8",
+            validate_inbound_headers=False))
+        conn.initiate_connection()
+        self.request.sendall(conn.data_to_send())
+        self.server.connections += 1
+        requests, pending = {}, []
+        while True:
+            data = self.request.recv(65535)
+            if not data:
+                return
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    requests[event.stream_id] = (dict(event.headers), [])
+                elif isinstance(event, h2.events.DataReceived):
+                    requests[event.stream_id][1].append(event.data)
+                    conn.acknowledge_received_data(
+                        event.flow_controlled_length, event.stream_id)
+                elif isinstance(event, h2.events.StreamEnded):
+                    pending.append(event.stream_id)
+            if len(pending) >= self.server.hold:
+                for stream_id in pending:
+                    headers, body = requests.pop(stream_id)
+                    self._respond(conn, stream_id, headers, b"".join(body))
+                pending = []
+            self.request.sendall(conn.data_to_send())
+
+    def _respond(self, conn, stream_id, headers, body):
+        if headers[":method"] == "POST":
+            status, content_type = "201", "text/xml"
+            body = str(len(body)).encode("utf-8")
+        else:
+            status, content_type = "500", "application/json"
+            body = headers[":path"].encode("utf-8")
+        conn.send_headers(stream_id, [
+            (":status", status), ("content-type", content_type),
+            ("set-cookie", "session=1234"),
+            ("x-fuzz", headers.get("x-fuzz", ""))])
+        conn.send_data(stream_id, body, end_stream=True)
+
+
+class H2Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    connections = 0
+    hold = 1
+
+
+@testtools.skipIf(http2 is None or h2 is None,
+                  "The http2 transport requires Python 3 and h2")
+class HTTP2ClientUnittest(testtools.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(HTTP2ClientUnittest, cls).setUpClass()
+        cls.server = H2Server(("127.0.0.1", 0), H2Handler)
+        cls.host = "127.0.0.1:{0}".format(cls.server.server_address[1])
+        cls.url = "http://" + cls.host
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super(HTTP2ClientUnittest, cls).tearDownClass()
+
+    def setUp(self):
+        super(HTTP2ClientUnittest, self).setUp()
+        self.conf = self.useFixture(ConfFixture())
+        self.conf.config(transport="http2", adaptive_concurrency=False,
+                         group="syntribos")
+        self.server.connections = 0
+        self.server.hold = 1
+        # Give each test a new transport, and so new connections
+        self.addCleanup(setattr, http2, "_transport", None)
+        self.addCleanup(lambda: http2._transport and http2._transport.close())
+        http2._transport = None
+        stats.reset()
+        self.addCleanup(stats.reset)
+        self.client = SynHTTPClient()
+
+    def test_response_signals(self):
+        """Check that responses get status code and content type signals."""
+        resp, signals = self.client.request(
+            "GET", self.url + "/x?a=1", headers={"X-Fuzz": "a\tb"})
+        self.assertEqual(500, resp.status_code)
+        self.assertEqual(b"/x?a=1", resp.content)
+        self.assertEqual("1234", resp.cookies["session"])
+        self.assertEqual("a\tb", resp.headers["X-Fuzz"])
+        self.assertIn("HTTP_STATUS_CODE_5XX_500", signals)
+        self.assertIn("HTTP_CONTENT_TYPE_JSON", signals)
+        self.assertIsNotNone(resp.timing.connect)
+
+    def test_post_body(self):
+        """Check that request bodies are sent."""
+        resp, signals = self.client.request(
+            "POST", self.url, data="<a>{0}</a>".format("x" * 100000))
+        self.assertEqual(201, resp.status_code)
+        self.assertEqual(b"100007", resp.content)
+        self.assertIn("HTTP_CONTENT_TYPE_XML", signals)
+
+    def test_limits_body(self):
+        """Check that only the start of bodies over the limit is kept."""
+        self.conf.config(max_response_size=5, group="syntribos")
+        resp, signals = self.client.request("GET", self.url + "/abcdefghij")
+        self.assertEqual(b"/abcd", resp.content)
+        self.assertTrue(resp.body_truncated)
+        self.assertEqual(11, resp.body_length)
+
+    def test_multiplexed(self):
+        """Check that concurrent requests share a single connection."""
+        self.server.hold = 4
+        pending = [self.client.request_async("GET", self.url)
+                   for _ in range(4)]
+        for resp, signals in [f.result(timeout=10) for f in pending]:
+            self.assertEqual(500, resp.status_code)
+        self.assertEqual(1, self.server.connections)
+        summary = dict(stats.get_summary())
+        self.assertEqual(1, summary["HTTP/2 connections ({0})".format(
+            self.host)])
+        self.assertEqual(4, summary[
+            "HTTP/2 peak concurrent streams ({0})".format(self.host)])
+
+    def test_max_streams(self):
+        """Check that requests over the stream limit wait for a stream."""
+        self.conf.config(http2_max_streams=2, group="syntribos")
+        pending = [self.client.request_async("GET", self.url)
+                   for _ in range(6)]
+        for resp, signals in [f.result(timeout=10) for f in pending]:
+            self.assertEqual(500, resp.status_code)
+        self.assertEqual(2, dict(stats.get_summary())[
+            "HTTP/2 peak concurrent streams ({0})".format(self.host)])
+
+    def test_fallback(self):
+        """Check that hosts that don't speak HTTP/2 get HTTP/1.1."""
+        server = BenchServer(vulnerable=False, error_rate=0)
+        server.start()
+        self.addCleanup(server.stop)
+        for _ in range(2):
+            resp, signals = self.client.request("GET", server.url)
+            self.assertEqual(200, resp.status_code)
+            self.assertIn("HTTP_CONTENT_TYPE_JSON", signals)
+        host = server.url.split("//")[1]
+        self.assertEqual(1, dict(stats.get_summary())[
+            "HTTP/2 fallbacks to HTTP/1.1 ({0})".format(host)])
+
+
+@testtools.skipIf(http2 is None, "The http2 transport requires Python 3")
+class HTTP2MissingUnittest(testtools.TestCase):
+
+    def test_requires_h2(self):
+        """Check that the transport says it needs h2 when it's missing."""
+        with mock.patch.object(http2, "h2", None):
+            self.assertRaises(Exception, http2.get_transport)
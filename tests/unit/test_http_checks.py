@@ -18,8 +18,10 @@ import testtools
 
 import syntribos.checks.http as http_checks
 import syntribos.clients.http.client as client
+import syntribos.config
 import syntribos.signal
 
+syntribos.config.register_opts()
 client = client()
 
 
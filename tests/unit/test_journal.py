@@ -0,0 +1,112 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+import tempfile
+
+import testtools
+
+import syntribos
+import syntribos.config
+from syntribos.issue import Issue
+from syntribos.journal import Journal
+from syntribos.journal import JournalingTestResult
+from syntribos.result import IssueTestResult
+from syntribos.signal import SynSignal
+from syntribos.utils.config_fixture import ConfFixture
+
+syntribos.config.register_opts()
+
+
+class FakeParameter(object):
+    method = "GET"
+    location = "url"
+    name = "id"
+    trunc_fuzz_string = "' OR 1=1"
+
+
+class FakeTest(object):
+    case = None
+
+    def __init__(self):
+        self.failureException = Exception
+        issue = Issue(defect_type="fake",
+                      severity=syntribos.MEDIUM,
+                      description="x",
+                      confidence=syntribos.HIGH,
+                      init_signals=[SynSignal(slug="INIT", strength=1)])
+        issue.target = "example.com"
+        issue.path = "/test"
+        issue.impacted_parameter = FakeParameter()
+        issue.content_type = None
+        self.failures = [issue]
+
+    def __str__(self):
+        return "fake"
+
+
+class JournalUnittest(testtools.TestCase):
+
+    def setUp(self):
+        super(JournalUnittest, self).setUp()
+        self.useFixture(ConfFixture())
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.path = os.path.join(tmp_dir, "journal")
+
+    def _run_case(self, journal, index):
+        result = IssueTestResult(None, False, 0)
+        journaling = JournalingTestResult(
+            result, journal, "a.template", "TEST", {FakeTest: (index, "c")})
+        test = FakeTest()
+        journaling.startTest(test)
+        journaling.addFailure(test, ())
+        journaling.stopTest(test)
+        return result
+
+    def test_replay_matches_run(self):
+        """Check that replaying a journal gives the same results."""
+        journal = Journal(self.path)
+        direct = self._run_case(journal, 0)
+        journal.record_finished("a.template", "TEST")
+
+        journal = Journal(self.path, resume=True)
+        self.assertTrue(journal.is_finished("a.template", "TEST"))
+        self.assertIsNone(journal.get_case("a.template", "TEST", 1, "c"))
+        replayed = IssueTestResult(None, False, 0)
+        for shard in journal.get_cases("a.template", "TEST"):
+            replayed.merge_shard(shard)
+        self.assertEqual(direct.failures, replayed.failures)
+        self.assertEqual(direct.stats, replayed.stats)
+        self.assertEqual(1, replayed.testsRun)
+
+    def test_truncated_record(self):
+        """Check that a record cut short by a crash is skipped."""
+        self._run_case(Journal(self.path), 0)
+        with open(self.path, "a") as journal_file:
+            journal_file.write('{"template": "a.template", "te')
+
+        journal = Journal(self.path, resume=True)
+        self.assertIsNotNone(journal.get_case("a.template", "TEST", 0, "c"))
+        self._run_case(journal, 1)
+
+        journal = Journal(self.path, resume=True)
+        self.assertEqual(2, len(journal.get_cases("a.template", "TEST")))
+
+    def test_new_journal(self):
+        """Check that --journal starts over rather than resuming."""
+        self._run_case(Journal(self.path), 0)
+        Journal(self.path)
+        journal = Journal(self.path, resume=True)
+        self.assertEqual([], journal.get_cases("a.template", "TEST"))
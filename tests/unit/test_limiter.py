@@ -0,0 +1,186 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import datetime
+import threading
+
+import mock
+import testtools
+
+import syntribos.checks.http as http_checks
+from syntribos.clients.http import limiter
+from syntribos.clients.http.limiter import AdaptiveLimiter
+from syntribos.clients.http.limiter import TokenBucket
+import syntribos.config
+from syntribos.signal import SignalHolder
+from syntribos.utils import stats
+from syntribos.utils.config_fixture import ConfFixture
+
+syntribos.config.register_opts()
+
+
+class FakeResponse(object):
+    def __init__(self, status_code=200, elapsed=0.1, headers=None):
+        self.status_code = status_code
+        self.reason = "Fake"
+        self.elapsed = datetime.timedelta(seconds=elapsed)
+        self.headers = headers or {}
+
+
+def _signals(response):
+    return SignalHolder(http_checks.check_status_code(response))
+
+
+class AdaptiveLimiterUnittest(testtools.TestCase):
+
+    def setUp(self):
+        super(AdaptiveLimiterUnittest, self).setUp()
+        stats.reset()
+        self.addCleanup(stats.reset)
+        self.limiter = AdaptiveLimiter("example.com", initial=2, maximum=3)
+
+    def _send(self, response):
+        self.limiter.acquire()
+        self.limiter.release(response, _signals(response))
+
+    def test_limits_requests_in_flight(self):
+        """Check that requests over the limit wait for a release."""
+        started = []
+        for i in range(3):
+            self.limiter.submit(lambda i=i: started.append(i))
+        self.assertEqual([0, 1], started)
+        self.limiter.release(FakeResponse(), None)
+        self.assertEqual([0, 1, 2], started)
+
+    def test_additive_increase(self):
+        """Check that the limit grows while responses are fast and OK."""
+        self._send(FakeResponse())
+        self.assertEqual(2.5, self.limiter.limit)
+        for _ in range(10):
+            self._send(FakeResponse())
+        self.assertEqual(3, self.limiter.limit)
+        self.assertIn(("Peak concurrency limit (example.com)", 3),
+                      stats.get_summary())
+
+    def test_no_increase_when_latency_rises(self):
+        """Check that the limit doesn't grow when responses slow down."""
+        self._send(FakeResponse(elapsed=0.1))
+        self._send(FakeResponse(elapsed=1))
+        self.assertEqual(2.5, self.limiter.limit)
+
+    def test_multiplicative_decrease(self):
+        """Check that 5XX responses back off once per round trip."""
+        self.limiter.limit = 3.0
+        self._send(FakeResponse(status_code=200, elapsed=10))
+        self._send(FakeResponse(status_code=503))
+        self._send(FakeResponse(status_code=500))
+        self.assertEqual(1.5, self.limiter.limit)
+        self.assertEqual(1, self.limiter.backoffs)
+        self.assertIn(("Concurrency backoffs (example.com)", 1),
+                      stats.get_summary())
+
+    def test_retry_after(self):
+        """Check that a 429 with Retry-After pauses new requests."""
+        self._send(FakeResponse(status_code=429,
+                                headers={"Retry-After": "1"}))
+        self.assertEqual(1, self.limiter.limit)
+        ready = threading.Event()
+        self.limiter.submit(ready.set)
+        self.assertFalse(ready.is_set())
+        self.assertTrue(ready.wait(5))
+        self.assertIn(("Retry-After pauses (example.com)", 1),
+                      stats.get_summary())
+
+
+class TokenBucketUnittest(testtools.TestCase):
+
+    def setUp(self):
+        super(TokenBucketUnittest, self).setUp()
+        stats.reset()
+        self.addCleanup(stats.reset)
+        self.now = 100.0
+        patcher = mock.patch("time.time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_rate(self):
+        """Check that requests over the burst wait for their turn."""
+        bucket = TokenBucket("example.com", rate=2, burst=2)
+        self.assertEqual([0, 0, 0.5, 1.0],
+                         [bucket.reserve() for _ in range(4)])
+        self.now += 1.5
+        self.assertEqual(0, bucket.reserve())
+        self.assertEqual(0.5, bucket.reserve())
+        self.assertIn(("Rate limited requests (example.com)", 3),
+                      stats.get_summary())
+        self.assertIn(("Longest rate limit wait (example.com)", 1.0),
+                      stats.get_summary())
+
+    def test_refill_capped_at_burst(self):
+        """Check that a quiet period doesn't build up more than the burst."""
+        bucket = TokenBucket("example.com", rate=1, burst=2)
+        self.now += 60
+        self.assertEqual([0, 0, 1.0], [bucket.reserve() for _ in range(3)])
+
+
+class GetLimiterUnittest(testtools.TestCase):
+
+    def setUp(self):
+        super(GetLimiterUnittest, self).setUp()
+        self.conf = self.useFixture(ConfFixture())
+        self.addCleanup(limiter._limiters.clear)
+
+    def test_disabled(self):
+        """Check that there is no limiter unless asked for."""
+        self.assertIsNone(limiter.get_limiter("http://example.com/a"))
+
+    def test_initial_workers(self):
+        """Check that the limit starts at the number of workers."""
+        self.conf.config(workers=8)
+        self.conf.config(adaptive_concurrency=True, group="syntribos")
+        self.assertEqual(
+            8, limiter.get_limiter("http://example.com/a").limit)
+        self.conf.config(initial_concurrency=2, group="syntribos")
+        self.assertEqual(
+            2, limiter.get_limiter("http://example.org/a").limit)
+
+
+class GetBucketUnittest(testtools.TestCase):
+
+    def setUp(self):
+        super(GetBucketUnittest, self).setUp()
+        self.conf = self.useFixture(ConfFixture())
+        self.addCleanup(limiter._buckets.clear)
+
+    def test_disabled(self):
+        """Check that there is no bucket unless a rate limit is set."""
+        self.assertIsNone(limiter.get_bucket("http://example.com/a"))
+
+    def test_host_overrides(self):
+        """Check that per host settings override the defaults."""
+        self.conf.config(rate_limit=5, rate_burst=2,
+                         host_rate_limits={"slow.example.com": "0.5"},
+                         host_rate_bursts={"slow.example.com": "1"},
+                         group="syntribos")
+        bucket = limiter.get_bucket("http://example.com:8080/a")
+        self.assertEqual((5, 2), (bucket.rate, bucket.burst))
+        self.assertIs(bucket, limiter.get_bucket("https://example.com/b"))
+        bucket = limiter.get_bucket("http://slow.example.com/a")
+        self.assertEqual((0.5, 1), (bucket.rate, bucket.burst))
+
+    def test_host_unlimited(self):
+        """Check that a host can be exempted from the default rate limit."""
+        self.conf.config(rate_limit=5,
+                         host_rate_limits={"localhost": "0"},
+                         group="syntribos")
+        self.assertIsNone(limiter.get_bucket("http://localhost/a"))
@@ -0,0 +1,85 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+
+import mock
+import testtools
+
+from syntribos.clients.http import resolver
+import syntribos.config
+from syntribos.utils.config_fixture import ConfFixture
+from syntribos.utils import stats
+
+syntribos.config.register_opts()
+
+
+def _addresses(*ips):
+    return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (ip, 443))
+            for ip in ips]
+
+
+class ResolverUnittest(testtools.TestCase):
+
+    def setUp(self):
+        super(ResolverUnittest, self).setUp()
+        self.conf = self.useFixture(ConfFixture())
+        for cleanup in (resolver.clear, stats.reset):
+            cleanup()
+            self.addCleanup(cleanup)
+        # Round-robin DNS: each resolution returns the addresses rotated
+        self.answers = [_addresses("10.0.0.1", "10.0.0.2"),
+                        _addresses("10.0.0.2", "10.0.0.1")]
+        patcher = mock.patch.object(
+            socket, "getaddrinfo",
+            side_effect=lambda *args: self.answers.pop(0))
+        self.getaddrinfo = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _resolve(self, port=443):
+        return resolver.getaddrinfo("api.example.com", port, 0,
+                                    socket.SOCK_STREAM)
+
+    def test_cache(self):
+        """Check that addresses are reused until they expire."""
+        self.assertEqual(self._resolve(), self._resolve())
+        self.assertEqual(1, self.getaddrinfo.call_count)
+        summary = dict(stats.get_summary())
+        self.assertEqual(1, summary["DNS resolutions"])
+        self.assertEqual(1, summary["DNS cache hits"])
+
+        with mock.patch("timeit.default_timer", return_value=1e12):
+            self.assertEqual("10.0.0.2", self._resolve()[0][4][0])
+        self.assertEqual(2, self.getaddrinfo.call_count)
+
+    def test_no_cache(self):
+        """Check that hosts are resolved each time with a TTL of 0."""
+        self.conf.config(dns_cache_ttl=0, group="syntribos")
+        self.assertNotEqual(self._resolve(), self._resolve())
+        self.assertEqual(2, self.getaddrinfo.call_count)
+
+    def test_pin(self):
+        """Check that hosts stay pinned while they resolve to the pin."""
+        self.conf.config(dns_cache_ttl=0, dns_pin=True, group="syntribos")
+        self.assertEqual(_addresses("10.0.0.1"), self._resolve())
+        self.assertEqual([("10.0.0.1", 80)],
+                         [address[4] for address in self._resolve(80)])
+        self.answers.append(_addresses("10.0.0.3", "10.0.0.2"))
+        self.assertEqual(_addresses("10.0.0.3"), self._resolve())
+        self.assertEqual(1, dict(stats.get_summary())["DNS pins moved"])
+
+    def test_errors_not_cached(self):
+        """Check that hosts that failed to resolve are resolved again."""
+        self.getaddrinfo.side_effect = [socket.gaierror(), self.answers[0]]
+        self.assertRaises(socket.gaierror, self._resolve)
+        self.assertEqual(_addresses("10.0.0.1", "10.0.0.2"), self._resolve())
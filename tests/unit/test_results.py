@@ -58,3 +58,21 @@ class TestIssueTestResult(testtools.TestCase):
         test = FakeTest("success")
         self.issue_result.addSuccess(test)
         self.assertEqual(self.issue_result.stats["successes"], 1)
+
+    def test_merge_shard(self):
+        """Check that merging shards matches adding the failures directly."""
+        direct = IssueTestResult(None, False, 0)
+        direct.addFailure(FakeTest("failure"), ())
+        direct.addFailure(FakeTest("failure"), ())
+        direct.addSuccess(FakeTest("success"))
+
+        worker = IssueTestResult(None, False, 0)
+        worker.addFailure(FakeTest("failure"), ())
+        worker.addSuccess(FakeTest("success"))
+        merged = IssueTestResult(None, False, 0)
+        merged.addFailure(FakeTest("failure"), ())
+        merged.merge_shard(worker.get_shard())
+
+        self.assertEqual(direct.failures, merged.failures)
+        self.assertEqual(direct.stats, merged.stats)
+        self.assertEqual(2, merged.stats["failures"])
@@ -11,15 +11,32 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import threading
+import time
+import unittest
+
+import mock
 import testtools
 
 import syntribos.config
 from syntribos.runner import Runner
 import syntribos.tests
+from syntribos.tests.fuzz.base_fuzz import FuzzCase
+from syntribos.utils.config_fixture import ConfFixture
 
 syntribos.config.register_opts()
 
 
+def _fake_test_case(delay, fail=False):
+    """Returns a TestCase class that sleeps, then optionally fails."""
+    class FakeTestCase(unittest.TestCase):
+        def run_test_case(self):
+            time.sleep(delay)
+            if fail:
+                raise AssertionError
+    return FakeTestCase
+
+
 class RunnerUnittest(testtools.TestCase):
 
     r = Runner()
@@ -129,6 +146,104 @@ class RunnerUnittest(testtools.TestCase):
         """Call Runner.run_given_tests with an empty list for sanity check."""
         self.r.run_given_tests([], "", "")
 
+    def test_parse_error_uses_test_ids(self):
+        """Check that a template that fails to parse uses up its test IDs."""
+        class FakeTest(object):
+            @classmethod
+            def send_init_request(cls, file_path, req_str, meta_vars):
+                raise ValueError
+
+        self.addCleanup(setattr, Runner, "current_test_id",
+                        Runner.current_test_id)
+        first_id = Runner.current_test_id
+        self.r.run_given_tests([("A", FakeTest), ("B", FakeTest)],
+                               "a.template", "")
+        self.assertEqual(first_id + 10, Runner.current_test_id)
+
+    @mock.patch("multiprocessing.Pool")
+    def test_processes_test_ids(self, pool):
+        """Check that templates get the test IDs of a serial run."""
+        pool.return_value.imap.return_value = []
+        self.useFixture(ConfFixture())
+        self.addCleanup(setattr, Runner, "meta_dir_dict",
+                        getattr(Runner, "meta_dir_dict", None))
+        Runner.meta_dir_dict = {}
+        first_id = Runner.current_test_id
+        self.r.run_in_processes(
+            [("A", None), ("B", None)],
+            [("a.template", ""), ("README", ""), ("b.template", "")])
+        units = pool.return_value.imap.call_args[0][1]
+        self.assertEqual([first_id, first_id + 10, first_id + 10],
+                         [unit[0] for unit in units])
+
     def test_dry_run_empty_tests(self):
         """Call Runner.dry_run with empty list for sanity check."""
         self.r.dry_run([], "", "", {})
+
+    def _run_fake_test_cases(self, workers):
+        """Run fake test cases through Runner.run_test_cases."""
+        fixture = self.useFixture(ConfFixture())
+        fixture.config(workers=workers)
+        test_cases = [_fake_test_case(0.05), None,
+                      _fake_test_case(0.01, fail=True), _fake_test_case(0)]
+        result = unittest.TestResult()
+        yielded = list(self.r.run_test_cases(test_cases, result))
+        self.assertEqual(test_cases, yielded)
+        self.assertEqual(3, result.testsRun)
+        self.assertEqual(1, len(result.failures))
+        self.assertIsInstance(result.failures[0][0], test_cases[2])
+
+    def test_run_test_cases_serially(self):
+        """Check that test cases are run and yielded in order."""
+        self._run_fake_test_cases(workers=1)
+
+    def test_run_test_cases_concurrently(self):
+        """Check that concurrent test cases are yielded in order."""
+        self._run_fake_test_cases(workers=4)
+
+    def test_run_test_cases_overlap(self):
+        """Check that test cases run at once, but only a few are queued."""
+        fixture = self.useFixture(ConfFixture())
+        fixture.config(workers=4)
+        started = []
+        lock = threading.Lock()
+        all_started = threading.Event()
+
+        class FakeTestCase(unittest.TestCase):
+            def run_test_case(self):
+                with lock:
+                    started.append(self)
+                    if len(started) == 4:
+                        all_started.set()
+                # Only passes once 4 test cases are running at the same time
+                self.assertTrue(all_started.wait(5))
+
+        result = unittest.TestResult()
+        for count, test in enumerate(
+                self.r.run_test_cases([FakeTestCase] * 20, result), 1):
+            # Cases are only queued up to 2 per worker ahead of the results
+            self.assertLessEqual(len(started), count - 1 + 8)
+        self.assertEqual(20, result.testsRun)
+        self.assertEqual([], result.failures + result.errors)
+
+    def test_run_test_cases_pipelined(self):
+        """Check that async requests are sent ahead of running the checks."""
+        fixture = self.useFixture(ConfFixture())
+        fixture.config(workers=3)
+        fixture.config(transport="asyncio", group="syntribos")
+        test_class = mock.Mock()
+        test_class.client.send_request_async.side_effect = (
+            lambda request: "sent {0}".format(request))
+        cases = [FuzzCase(test_class, "name", "fuzz", "path", i)
+                 for i in range(10)]
+        ran = []
+
+        def _run(case, result, sent=None):
+            sends = test_class.client.send_request_async.call_count
+            ran.append((sent, sends))
+
+        with mock.patch.object(FuzzCase, "run", _run):
+            self.assertEqual(cases, list(self.r.run_test_cases(cases, None)))
+        # Each request is sent up to 3 cases ahead of its checks
+        self.assertEqual(
+            [("sent {0}".format(i), min(i + 3, 10)) for i in range(10)], ran)
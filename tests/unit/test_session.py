@@ -0,0 +1,120 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+import testtools
+
+from syntribos.clients.http import session
+from syntribos.clients.http.client import SynHTTPClient
+import syntribos.config
+from syntribos.utils import stats
+from syntribos.utils.config_fixture import ConfFixture
+
+syntribos.config.register_opts()
+
+
+class FakeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Sets a cookie, and echoes back any cookie sent with the request."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = (self.headers.get("Cookie") or "").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Set-Cookie", "session=1234")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_HEAD = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class SessionUnittest(testtools.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(SessionUnittest, cls).setUpClass()
+        cls.server = FakeServer(("127.0.0.1", 0), FakeHandler)
+        cls.host = "127.0.0.1:{0}".format(cls.server.server_port)
+        cls.url = "http://{0}/".format(cls.host)
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super(SessionUnittest, cls).tearDownClass()
+
+    def setUp(self):
+        super(SessionUnittest, self).setUp()
+        self.conf = self.useFixture(ConfFixture())
+        self.conf.config(adaptive_concurrency=False, group="syntribos")
+        # Start each test with a new session and empty pools
+        self.addCleanup(setattr, session, "_session", None)
+        session._session = None
+        stats.reset()
+        self.addCleanup(stats.reset)
+
+    def test_connections_reused(self):
+        """Check that requests after the first reuse its connection."""
+        for _ in range(3):
+            resp, signals = SynHTTPClient().request("GET", self.url)
+            self.assertEqual(200, resp.status_code)
+        summary = dict(stats.get_summary())
+        self.assertEqual(
+            1, summary["Connection pool misses ({0})".format(self.host)])
+        self.assertEqual(
+            2, summary["Connection pool hits ({0})".format(self.host)])
+
+    def test_cookies_not_kept(self):
+        """Check that cookies set by a response aren't sent again."""
+        resp, _ = SynHTTPClient().request("GET", self.url)
+        self.assertEqual("1234", resp.cookies["session"])
+        resp, _ = SynHTTPClient().request("GET", self.url)
+        self.assertEqual(b"", resp.content)
+        resp, _ = SynHTTPClient().request(
+            "GET", self.url, requestslib_kwargs={"cookies": {"a": "b"}})
+        self.assertEqual(b"a=b", resp.content)
+
+    def test_host_pool_maxsize(self):
+        """Check that per host pool sizes override the default."""
+        self.conf.config(pool_maxsize=3,
+                         host_pool_maxsizes={"127.0.0.1": "7"},
+                         group="syntribos")
+        default = session.get_session().get_adapter("http://localhost/")
+        self.assertEqual(3, default._pool_maxsize)
+        adapter = session.get_session().get_adapter(self.url)
+        self.assertEqual(7, adapter._pool_maxsize)
+        other = session.get_session().get_adapter("http://127.0.0.10/")
+        self.assertIs(default, other)
+
+    def test_prewarm(self):
+        """Check that prewarmed connections are reused by later requests."""
+        session.prewarm(self.url, 2)
+        stats.reset()
+        SynHTTPClient().request("GET", self.url)
+        summary = dict(stats.get_summary())
+        self.assertNotIn("Connection pool misses ({0})".format(self.host),
+                         summary)
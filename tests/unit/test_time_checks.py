@@ -14,8 +14,12 @@
 import testtools
 
 import syntribos.checks.time as time_checks
+from syntribos.clients.http.timing import Timing
+import syntribos.config
 import syntribos.signal
 
+syntribos.config.register_opts()
+
 
 class _FakeSignal(object):
 
@@ -34,9 +38,11 @@ class _FakeElapsedObject(object):
 
 class _FakeRequestObject(object):
 
-    def __init__(self, seconds=10):
+    def __init__(self, seconds=10, ttfb=None):
         self.request = "request"
         self.elapsed = _FakeElapsedObject(seconds)
+        if ttfb is not None:
+            self.timing = Timing(ttfb=int(ttfb * 1e9))
 
 
 class _FakeTestObject(object):
@@ -65,3 +71,56 @@ class TimeCheckUnittest(testtools.TestCase):
     def test_absolute_time(self):
         signal_0 = time_checks.absolute_time(self.test_0)
         self.assertTrue(isinstance(signal_0, syntribos.signal.SynSignal))
+
+    def test_ttfb_basis(self):
+        """Check that only the time to first byte is compared."""
+        # The fuzzed request only took longer to connect
+        test = _FakeTestObject(1, diff=True)
+        test.init_resp.timing = Timing(ttfb=int(0.5e9))
+        test.test_resp.timing = Timing(ttfb=int(0.5e9))
+        self.assertEqual(0.5, time_checks.get_response_time(
+            test.test_resp, "ttfb"))
+        self.assertIsNone(time_checks.ttfb_percentage_difference(test))
+        self.assertIsNone(time_checks.ttfb_absolute_time(test))
+        signal = time_checks.percentage_difference(test)
+        self.assertEqual("elapsed", signal.data["basis"])
+
+    def test_ttfb_fallback(self):
+        """Check that responses without timing fall back to elapsed."""
+        self.assertEqual(1001, time_checks.get_response_time(
+            self.test_1.test_resp, "ttfb"))
+        signal = time_checks.ttfb_percentage_difference(self.test_1)
+        self.assertEqual("elapsed", signal.data["basis"])
+        signal = time_checks.ttfb_absolute_time(self.test_1)
+        self.assertEqual("elapsed", signal.data["basis"])
+
+    def test_ttfb_fallback_one_response(self):
+        """Check that both responses are compared on the same basis."""
+        test = _FakeTestObject(1, diff=True)
+        test.init_resp.timing = Timing(ttfb=int(0.5e9))
+        signal = time_checks.ttfb_percentage_difference(test)
+        self.assertEqual("elapsed", signal.data["basis"])
+        self.assertEqual(1, signal.data["resp1_time"])
+        self.assertTrue(time_checks.is_time_diff_over(
+            test.init_resp, test.test_resp, "ttfb"))
+
+    def test_ttfb_check_names(self):
+        """Check that the TTFB checks don't share names with the others."""
+        test = _FakeTestObject()
+        test.init_signals = syntribos.signal.SignalHolder()
+        test.init_signals.register(time_checks.absolute_time(test))
+        test.test_resp = _FakeRequestObject(1)
+        # The baseline response hasn't been checked by ttfb_abs yet
+        signal = time_checks.ttfb_absolute_time(test)
+        self.assertEqual("TTFB_ABSOLUTE_TIME", signal.check_name)
+        self.assertIs(test.init_resp, signal.data["response"])
+        self.assertIsNone(time_checks.absolute_time(test))
+        signal = time_checks.ttfb_percentage_difference(self.test_1)
+        self.assertEqual("TTFB_TIME_DIFF", signal.check_name)
+
+    def test_is_time_diff_over(self):
+        """Check that only a response slower than the first one is over."""
+        fast, slow = _FakeRequestObject(1), _FakeRequestObject(1000)
+        self.assertTrue(time_checks.is_time_diff_over(fast, slow))
+        self.assertFalse(time_checks.is_time_diff_over(slow, fast))
+        self.assertFalse(time_checks.is_time_diff_over(fast, fast))
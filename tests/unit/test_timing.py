@@ -0,0 +1,97 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import six
+import testtools
+
+from syntribos.bench.server import BenchServer
+from syntribos.clients.http.client import SynHTTPClient
+from syntribos.clients.http.parser import RequestObject
+from syntribos.clients.http import session
+from syntribos.clients.http import timing
+from syntribos.clients.http import wire
+import syntribos.config
+from syntribos.utils.config_fixture import ConfFixture
+
+syntribos.config.register_opts()
+
+LATENCY = 0.05
+
+
+class TimingUnittest(testtools.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TimingUnittest, cls).setUpClass()
+        cls.server = BenchServer(latency=LATENCY, distribution="constant")
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super(TimingUnittest, cls).tearDownClass()
+
+    def setUp(self):
+        super(TimingUnittest, self).setUp()
+        self.conf = self.useFixture(ConfFixture())
+        self.conf.config(adaptive_concurrency=False, group="syntribos")
+        for module, name in ((session, "_session"), (wire, "_pool")):
+            self.addCleanup(setattr, module, name, None)
+            setattr(module, name, None)
+        self.client = SynHTTPClient()
+
+    def _check_timing(self, first, second):
+        self.assertIsNotNone(first.dns)
+        self.assertIsNotNone(first.connect)
+        self.assertIsNone(first.tls)
+        for timed in (first, second):
+            self.assertGreaterEqual(timed.seconds("ttfb"), LATENCY)
+            self.assertIsNotNone(timed.send)
+            self.assertIsNotNone(timed.transfer)
+        # The second request reuses the connection of the first
+        self.assertIsNone(second.dns)
+        self.assertIsNone(second.connect)
+
+    def test_sync(self):
+        """Check that requests sent by the session are timed."""
+        resps = [self.client.request("GET", self.server.url)[0]
+                 for _ in range(2)]
+        self._check_timing(resps[0].timing, resps[1].timing)
+
+    def test_wire(self):
+        """Check that requests sent from wire templates are timed."""
+        request = RequestObject("GET", self.server.url + "/items",
+                                action_field="ACTION",
+                                params={"q": wire.SLOT})
+        request.prepare_request()
+        template = wire.WireTemplate.from_request(request, wire.QUERY)
+        resps = [template.send(template.splice("a"), timeout=10)
+                 for _ in range(2)]
+        self._check_timing(resps[0].timing, resps[1].timing)
+
+    @testtools.skipIf(six.PY2, "The asyncio transport requires Python 3")
+    def test_asyncio(self):
+        """Check that requests sent by the asyncio transport are timed."""
+        self.conf.config(transport="asyncio", group="syntribos")
+        resp, _ = self.client.request("GET", self.server.url)
+        self.assertIsNotNone(resp.timing.dns)
+        self.assertIsNotNone(resp.timing.connect)
+        self.assertGreaterEqual(resp.timing.seconds("ttfb"), LATENCY)
+
+    def test_timing(self):
+        """Check the phases that happened and their durations."""
+        timed = timing.Timing(connect=1500000, ttfb=2000000000)
+        self.assertEqual({"connect": 1500000, "ttfb": 2000000000},
+                         timed.to_dict())
+        self.assertEqual(2.0, timed.seconds("ttfb"))
+        self.assertIsNone(timed.seconds("tls"))
@@ -0,0 +1,103 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import ssl
+
+import mock
+import testtools
+
+from syntribos.clients.http import timing
+from syntribos.clients.http import tls
+import syntribos.config
+from syntribos.utils.config_fixture import ConfFixture
+from syntribos.utils import stats
+
+syntribos.config.register_opts()
+
+
+class FakeSession(object):
+    has_ticket = True
+    id = b"\x01" * 32
+
+
+class FakeSSLSocket(object):
+    def __init__(self, context, reused=False):
+        self.context = context
+        self.server_hostname = "api.example.com"
+        self.session_reused = reused
+        self.session = FakeSession()
+
+
+@testtools.skipUnless(tls.HAS_SESSIONS, "TLS sessions require Python 3.6")
+class ResumingSSLContextUnittest(testtools.TestCase):
+
+    def setUp(self):
+        super(ResumingSSLContextUnittest, self).setUp()
+        self.conf = self.useFixture(ConfFixture())
+        stats.reset()
+        self.addCleanup(stats.reset)
+        self.context = tls.create_context()
+
+    def _wrap(self):
+        with mock.patch.object(ssl.SSLContext, "wrap_socket") as wrap:
+            self.context.wrap_socket(None, server_hostname="api.example.com")
+        return wrap.call_args[1].get("session")
+
+    def test_create_context(self):
+        """Check that contexts only verify certificates when asked to."""
+        self.assertEqual(ssl.CERT_NONE, self.context.verify_mode)
+        self.assertFalse(self.context.check_hostname)
+        self.assertEqual(ssl.CERT_REQUIRED,
+                         tls.create_context(True).verify_mode)
+
+    def test_resumes_saved_session(self):
+        """Check that the last session to a host is offered to it."""
+        self.assertIsNone(self._wrap())
+        sock = FakeSSLSocket(self.context)
+        tls.save_session(sock)
+        self.assertIs(sock.session, self._wrap())
+        tls.save_session(FakeSSLSocket(self.context, reused=True))
+        self.assertEqual(
+            [("TLS full handshakes (api.example.com)", 1),
+             ("TLS sessions resumed (api.example.com)", 1)],
+            stats.get_summary())
+
+    def test_resumption_disabled(self):
+        """Check that no session is offered with tls_resumption off."""
+        self.conf.config(tls_resumption=False, group="syntribos")
+        tls.save_session(FakeSSLSocket(self.context))
+        self.assertIsNone(self._wrap())
+
+    def test_other_contexts_ignored(self):
+        """Check that sockets from other contexts are left alone."""
+        tls.save_session(FakeSSLSocket(ssl.create_default_context()))
+        self.assertEqual([], stats.get_summary())
+
+
+class ResumingHTTPSConnectionUnittest(testtools.TestCase):
+
+    def _connect(self, **kwargs):
+        conn = tls.ResumingHTTPSConnection("localhost", 443, **kwargs)
+        with mock.patch.object(timing.TimingHTTPSConnection, "connect"):
+            conn.connect()
+        return conn
+
+    def test_unverified_share_context(self):
+        """Check that unverified connections share the process' context."""
+        conn = self._connect(cert_reqs="CERT_NONE")
+        self.assertIs(tls.get_context(), conn.ssl_context)
+
+    def test_verified_own_context(self):
+        """Check that verified connections keep urllib3's own context."""
+        self.assertIsNone(
+            self._connect(cert_reqs="CERT_REQUIRED").ssl_context)
@@ -0,0 +1,217 @@
+# Copyright 2016 Rackspace
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import threading
+
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+import testtools
+
+from syntribos.clients.http.client import SynHTTPClient
+from syntribos.clients.http.parser import RequestObject
+from syntribos.clients.http import wire
+import syntribos.config
+from syntribos.utils import stats
+from syntribos.utils.config_fixture import ConfFixture
+
+syntribos.config.register_opts()
+
+PAYLOADS = ["' OR 1=1 --", 'a"b\\c', u"café ☃", "<a href=#>",
+            "100% & a=b?c", ""]
+
+
+class EchoHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Echoes back the path, headers and body of each request."""
+
+    protocol_version = "HTTP/1.1"
+    moved = 0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if self.path.startswith("/v1/moved"):
+            EchoHandler.moved += 1
+            self.rfile.read(length)
+            self.send_response(307)
+            self.send_header("Location", "/v1/items")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps({
+            "path": self.path,
+            "trace": self.headers.get("X-Trace"),
+            "body": self.rfile.read(length).decode("iso-8859-1")
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class WireTemplateUnittest(testtools.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(WireTemplateUnittest, cls).setUpClass()
+        cls.server = FakeServer(("127.0.0.1", 0), EchoHandler)
+        cls.url = "http://127.0.0.1:{0}/v1/items".format(
+            cls.server.server_port)
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super(WireTemplateUnittest, cls).tearDownClass()
+
+    def setUp(self):
+        super(WireTemplateUnittest, self).setUp()
+        self.conf = self.useFixture(ConfFixture())
+        self.conf.config(adaptive_concurrency=False, group="syntribos")
+        self.addCleanup(setattr, wire, "_pool", None)
+        wire._pool = None
+        stats.reset()
+        self.addCleanup(stats.reset)
+        self.client = SynHTTPClient()
+
+    def _request(self, location, value, url=None):
+        params = {"limit": "10"}
+        headers = {"Content-Type": "application/json", "X-Trace": "foo"}
+        data = {"name": "widget", "meta": {"size": 3}}
+        if location == wire.QUERY:
+            params["q"] = value
+        elif location == wire.HEADER:
+            headers["X-Trace"] = value
+        elif location == wire.JSON:
+            data["meta"]["color"] = value
+        request = RequestObject("POST", url or self.url, action_field="ACTION",
+                                headers=headers, params=params, data=data)
+        if location == wire.RAW:
+            request.data = "name={0}&size=3".format(value)
+        request.prepare_request()
+        return request
+
+    def _check_location(self, location, payloads=PAYLOADS):
+        template = wire.WireTemplate.from_request(
+            self._request(location, wire.SLOT), location)
+        self.assertIsNotNone(template)
+        for payload in payloads:
+            expected, _ = self.client.send_request(
+                self._request(location, payload))
+            resp, signals = self.client.send_wire_request(
+                template, payload, self._request(location, payload))
+            self.assertEqual(expected.json(), resp.json())
+            self.assertEqual(expected.request.url, resp.request.url)
+            self.assertEqual(expected.request.body, resp.request.body)
+            self.assertEqual(expected.request.headers, resp.request.headers)
+        summary = dict(stats.get_summary())
+        self.assertEqual(len(payloads),
+                         summary["Requests sent from wire templates"])
+
+    def test_json_body(self):
+        """Check that payloads in JSON bodies are sent as requests would."""
+        self._check_location(wire.JSON)
+
+    def test_raw_body(self):
+        """Check that payloads in other bodies are sent as requests would."""
+        self._check_location(wire.RAW)
+
+    def test_query(self):
+        """Check that payloads in the query are sent as requests would."""
+        self._check_location(wire.QUERY)
+
+    def test_header(self):
+        """Check that payloads in headers are sent as requests would."""
+        self._check_location(wire.HEADER, ["' OR 1=1 --", "<a href=#>"])
+
+    def test_unsupported_payloads(self):
+        """Check that payloads requests would change or reject fall back."""
+        template = wire.WireTemplate.from_request(
+            self._request(wire.HEADER, wire.SLOT), wire.HEADER)
+        self.assertIsNone(template.splice("a\r\nX-Injected: 1"))
+        self.assertIsNone(template.splice(" leading space"))
+        self.assertIsNone(template.splice(u"☃"))
+        self.assertIsNone(template.splice("ACTION"))
+        self.assertIsNotNone(template.splice("' OR 1=1 --"))
+
+    def test_bytes_payloads(self):
+        """Check that payloads read from files as bytes are spliced too."""
+        for location in (wire.JSON, wire.RAW, wire.QUERY, wire.HEADER):
+            template = wire.WireTemplate.from_request(
+                self._request(location, wire.SLOT), location)
+            for payload in ["' OR 1=1 --", "<a href=#>"]:
+                spliced = template.splice(payload.encode("utf-8"))
+                self.assertIsNotNone(spliced)
+                self.assertEqual(template.splice(payload), spliced)
+
+    def test_redirect(self):
+        """Check that redirects are followed without resending payloads."""
+        url = self.url.replace("items", "moved")
+        template = wire.WireTemplate.from_request(
+            self._request(wire.JSON, wire.SLOT, url), wire.JSON)
+        EchoHandler.moved = 0
+        resp, signals = self.client.send_wire_request(
+            template, "' OR 1=1 --", self._request(wire.JSON, "' OR 1=1 --",
+                                                   url))
+        self.assertEqual(1, EchoHandler.moved)
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual("/v1/items", resp.json()["path"])
+        self.assertIn("' OR 1=1 --", resp.json()["body"])
+        self.assertEqual([307], [r.status_code for r in resp.history])
+        self.assertEqual(1, dict(stats.get_summary())[
+            "Requests sent from wire templates"])
+
+    def test_slot_in_wrong_location(self):
+        """Check that a request is only a template if the slot is found."""
+        self.assertIsNone(wire.WireTemplate.from_request(
+            self._request(wire.QUERY, wire.SLOT), wire.HEADER))
+        self.assertIsNone(wire.WireTemplate.from_request(
+            self._request(wire.JSON, "x"), wire.JSON))
+
+    def test_connections_reused(self):
+        """Check that requests after the first reuse its connection."""
+        template = wire.WireTemplate.from_request(
+            self._request(wire.JSON, wire.SLOT), wire.JSON)
+        for payload in PAYLOADS:
+            template.send(template.splice(payload), timeout=10)
+        summary = dict(stats.get_summary())
+        host = "127.0.0.1:{0}".format(self.server.server_port)
+        self.assertEqual(
+            1, summary["Connection pool misses ({0})".format(host)])
+        self.assertEqual(len(PAYLOADS) - 1,
+                         summary["Connection pool hits ({0})".format(host)])
+
+    def test_send_buffers(self):
+        """Check that buffers are all sent, even if sendmsg sends part."""
+        class FakeSocket(object):
+            def __init__(self):
+                self.sent = b""
+
+            def sendmsg(self, buffers):
+                # Send at most 3 bytes at a time
+                data = b"".join(bytes(buf) for buf in buffers)[:3]
+                self.sent += data
+                return len(data)
+
+        sock = wire._PooledSocket(FakeSocket())
+        wire._send_buffers(sock, (b"abcd", b"", b"efg", b"h"))
+        self.assertEqual(b"abcdefgh", sock.sock.sent)